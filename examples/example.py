@@ -5,9 +5,9 @@ from pyicane import pyicane
 
 def main():
     census = pyicane.TimeSeries.get('census-series-1900-2001')
-    data = census.data_as_dataframe()
-    noja = data[data['Municipios'] == unicode(' 39047 - Noja')]
-    arnuero = data[data['Municipios'] == unicode(' 39006 - Arnuero')]
+    noja = census.slice({unicode('Municipios'): unicode(' 39047 - Noja')})
+    arnuero = census.slice({unicode('Municipios'):
+                            unicode(' 39006 - Arnuero')})
     noja_plot = noja.plot()
     arnuero.plot(ax=noja_plot,
                  title='Population evolution in Noja vs Arnuero')
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Parallel conversion of many cached data resources into data frames.
+
+Flattening data resources and building their data frames is pure CPU work, \
+serialized by the GIL in a single process. build_frames() farms it out to a \
+pool of processes that decode JSON bodies, e.g. from a ResponseCache, and \
+send every data frame back as an Arrow IPC stream: a single buffer whose \
+columns are read without unpickling any Python object. With a spool \
+directory on a memory file system, such as /dev/shm, streams are written to \
+files that the parent process memory-maps instead of receiving them through \
+a pipe. Requires the pyarrow package::
+
+    cache = ResponseCache()
+    for result in build_frames(cache_bodies(cache, urls), max_workers=8):
+        frames[result.item] = result.value
+
+"""
+from __future__ import absolute_import
+
+import logging
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import pyarrow as pa
+except ImportError:  # only needed to build frames in batch
+    pa = None
+
+from pyicane import pyicane
+from pyicane.decoders import get_decoder
+from pyicane.export import frame_table, table_frame
+
+LOGGER = logging.getLogger(__name__)
+
+
+def cache_bodies(cache, urls):
+    """Read the bodies of cached responses, fresh or not.
+
+    Args:
+      cache (pyicane.cache.ResponseCache): response cache.
+      urls (iterable): absolute URLs of data resources.
+
+    Yields:
+      (url, body) tuples; URLs that are not cached are skipped.
+
+    """
+    for url in urls:
+        entry = cache.get(url)
+        if entry is not None:
+            yield url, entry.body
+
+
+def frame_stream(body, multi_index=False, decoder='auto', spool=None):
+    """Convert a JSON data resource into an Arrow IPC stream of its data \
+       frame. Run by the worker processes of build_frames().
+
+    Args:
+      body (str): JSON data resource.
+      multi_index (boolean, optional): see pyicane.data_frame().
+      decoder (str, optional): JSON decoder name. Defaults to 'auto'.
+      spool (str, optional): directory where the stream is written to a \
+                             file. Defaults to None, i.e. in memory.
+
+    Returns:
+      the stream (str), or the path of its file if spool is given. The file \
+      is removed if the stream cannot be written.
+
+    """
+    frame = pyicane.data_frame(get_decoder(decoder).loads(body), multi_index)
+    table = frame_table(frame)
+    if spool is None:
+        sink = pa.BufferOutputStream()
+        write_table(sink, table)
+        return sink.getvalue().to_pybytes()
+    handle, path = tempfile.mkstemp('.arrow', dir=spool)
+    os.close(handle)
+    try:
+        with pa.OSFile(path, 'wb') as sink:
+            write_table(sink, table)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def write_table(sink, table):
+    """Write an Arrow table to a sink as an IPC stream."""
+    writer = pa.RecordBatchStreamWriter(sink, table.schema)
+    writer.write_table(table)
+    writer.close()
+
+
+def read_stream(stream, spool=None):
+    """Data frame of a stream returned by frame_stream(). Spool files are \
+       memory-mapped, copied once into the data frame and removed.
+
+    Args:
+      stream (str): the stream, or the path of its file if spool is given.
+      spool (str, optional): spool directory of frame_stream().
+
+    Returns:
+      Python Pandas Dataframe.
+
+    """
+    if spool is None:
+        return table_frame(pa.ipc.open_stream(
+            pa.py_buffer(stream)).read_all())
+    try:
+        with pa.memory_map(stream) as source:
+            return table_frame(pa.ipc.open_stream(source).read_all())
+    finally:
+        os.remove(stream)
+
+
+def discard(future, spool):
+    """Cancel a frame_stream() call whose stream will not be read, or wait \
+       for it and remove its spool file."""
+    if future.cancel() or spool is None:
+        return
+    try:
+        path = future.result()
+    except Exception:  # pylint: disable=W0703
+        return  # failed calls leave no spool file
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def build_frames(bodies, max_workers=None, multi_index=False,
+                 decoder='auto', spool=None):
+    """Convert many JSON data resources into data frames in a pool of \
+       processes. At most twice as many resources as workers are in flight, \
+       so memory does not grow with the number of resources.
+
+    Args:
+      bodies (iterable): (key, JSON body) tuples, e.g. from cache_bodies(), \
+                         or a dict of JSON bodies by key.
+      max_workers (int, optional): number of processes. Defaults to the \
+                                   number of CPUs.
+      multi_index (boolean, optional): see pyicane.data_frame(). Defaults \
+                                       to False.
+      decoder (str, optional): JSON decoder name (see pyicane.decoders). \
+                               Defaults to 'auto'.
+      spool (str, optional): directory, ideally on a memory file system \
+                             such as /dev/shm, where frames are exchanged as \
+                             memory-mapped files. Defaults to None, i.e. \
+                             through the pipes of the pool.
+
+    Yields:
+      Result objects (see pyicane.fetch_many()) with the key as item and \
+      the data frame as value, in the order of bodies. Errors are captured \
+      per resource.
+
+    Raises:
+      ImportError: pyarrow is not installed.
+
+    """
+    if pa is None:
+        raise ImportError('pyarrow is required by build_frames')
+    get_decoder(decoder)  # fail early on unknown decoders
+    if isinstance(bodies, dict):
+        bodies = bodies.items()
+    bodies = iter(bodies)
+    window = 2 * (max_workers or multiprocessing.cpu_count())
+    pending = deque()
+    with ProcessPoolExecutor(max_workers) as executor:
+        try:
+            while True:
+                for key, body in bodies:
+                    pending.append((key, executor.submit(
+                        frame_stream, body, multi_index, decoder, spool)))
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    return
+                key, future = pending.popleft()
+                try:
+                    value = read_stream(future.result(), spool)
+                except Exception, error:  # pylint: disable=W0703
+                    LOGGER.warning('build_frames: ' + repr(key) + ' ' +
+                                   repr(error))
+                    yield pyicane.Result(key, error=error)
+                else:
+                    yield pyicane.Result(key, value)
+        finally:  # e.g. the consumer stopped iterating
+            while pending:
+                discard(pending.popleft()[1], spool)
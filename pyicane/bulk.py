@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Bulk, concurrent downloads of ICANE's time series.
+
+Requests spend most of their time waiting for the network, so many of them \
+can be kept in flight at once. pyicane targets Python 2, which lacks \
+asyncio, so concurrency is provided by pyicane.fetch_many(), whose threads \
+share the pooled session of a pyicane.Client; results are yielded as soon as \
+they complete and errors are captured per item.
+
+"""
+from __future__ import absolute_import
+
+from pyicane import pyicane
+
+
+class AsyncClient(object):
+    """Concurrent counterpart of the TimeSeries retrieval methods.
+
+    Attributes:
+      client (pyicane.Client): client whose pooled session is shared by \
+                               every request.
+      max_in_flight (int): maximum number of concurrent requests.
+
+    """
+
+    def __init__(self, client=None, max_in_flight=8):
+        """Build a concurrent client.
+
+        Args:
+          client (pyicane.Client, optional): client whose session is shared. \
+                                             Defaults to the module client.
+          max_in_flight (int, optional): maximum number of concurrent \
+                                         requests. It should not exceed the \
+                                         pool_maxsize of the client, or \
+                                         connections will not be reused. \
+                                         Defaults to 8.
+
+        """
+        self.client = client if client is not None else pyicane.get_client()
+        self.max_in_flight = max_in_flight
+
+    def as_completed(self, function, items):
+        """Apply function to every item concurrently.
+
+        Args:
+          function (callable): function taking a single item.
+          items (iterable): items to be processed.
+
+        Yields:
+          Result objects (see pyicane.fetch_many()), in completion order.
+
+        """
+        return pyicane.fetch_many(function, items, self.max_in_flight,
+                                  ordered=False)
+
+    def get(self, uri_tag):
+        """Retrieve a TimeSeries by its uri_tag through the shared client.
+
+        Args:
+          uri_tag (string): uri_tag (ie, label) of the TimeSeries.
+
+        Returns:
+          Python TimeSeries object.
+
+        """
+        return pyicane.TimeSeries(self.client.request(
+            pyicane.TimeSeries.label_ + '/' + str(uri_tag)))
+
+    def data_frame(self, uri_tag):
+        """Retrieve the data of a TimeSeries as a pandas.DataFrame object.
+
+        Args:
+          uri_tag (string): uri_tag (ie, label) of the TimeSeries.
+
+        Returns:
+          Python Pandas Dataframe.
+
+        """
+        time_series = self.get(uri_tag)
+        return pyicane.data_frame(self.client.request(
+            time_series.apiUris[3].uri))  # third element is icane json
+
+    def get_many(self, uri_tags):
+        """Retrieve many TimeSeries concurrently.
+
+        Args:
+          uri_tags (iterable): uri_tags (ie, labels) of the TimeSeries.
+
+        Yields:
+          Result objects with uri_tags as items and TimeSeries as values, \
+          in completion order; failed lookups carry their exception instead.
+
+        """
+        return self.as_completed(self.get, uri_tags)
+
+    def data_frames(self, uri_tags):
+        """Retrieve the data of many TimeSeries concurrently.
+
+        Args:
+          uri_tags (iterable): uri_tags (ie, labels) of the TimeSeries.
+
+        Yields:
+          Result objects with uri_tags as items and Python Pandas \
+          Dataframes as values, in completion order; failed downloads carry \
+          their exception instead.
+
+        """
+        return self.as_completed(self.data_frame, uri_tags)
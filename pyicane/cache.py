@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""Persistent on-disk cache of ICANE's API responses.
+
+Responses are stored in a SQLite database together with their ETag and \
+Last-Modified validators. Fresh entries are served without any network \
+access; stale ones are revalidated with a conditional request, so that \
+unchanged resources are not downloaded again. The cache is bounded in size \
+and evicts least recently used entries first.
+
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.pyicane', 'cache.sqlite')
+
+# Time to live, in seconds, of the responses of each entity. Catalog entities
+# hardly ever change, whereas 'data' and 'metadata' last-updated dates must
+# always be requested since they are the watermarks of the whole cache.
+DAY = 24 * 60 * 60
+TTL = {'data': 0,
+       'metadata': 0,
+       'class': 7 * DAY,
+       'classes': 7 * DAY,
+       'node-type': 7 * DAY,
+       'node-types': 7 * DAY,
+       'periodicity': 7 * DAY,
+       'periodicities': 7 * DAY,
+       'reference-area': 7 * DAY,
+       'reference-areas': 7 * DAY,
+       'unit-of-measure': DAY,
+       'units-of-measure': DAY,
+       'data-provider': DAY,
+       'data-providers': DAY,
+       'source': DAY,
+       'sources': DAY,
+       'link-type': 7 * DAY,
+       'link-types': 7 * DAY}
+
+
+class CacheEntry(object):
+    """A cached response.
+
+    Attributes:
+      url (str): requested URL.
+      body (str): raw response body.
+      etag (str): ETag header of the response, if any.
+      last_modified (str): Last-Modified header of the response, if any.
+      stored (float): time of the last download or revalidation.
+      ttl (int): time to live of the entry, in seconds.
+
+    """
+
+    __slots__ = ('url', 'body', 'etag', 'last_modified', 'stored', 'ttl')
+
+    def __init__(self, url, body, etag, last_modified, stored, ttl):
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored = stored
+        self.ttl = ttl
+
+    def is_fresh(self, now=None):
+        """Check whether the entry can be served without revalidation."""
+        if now is None:
+            now = time.time()
+        return now - self.stored < self.ttl
+
+    def validators(self):
+        """Build conditional request headers for this entry.
+
+        Returns:
+          headers (dict): If-None-Match and If-Modified-Since headers.
+
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache(object):
+    """Size-bounded LRU cache of raw responses persisted in SQLite.
+
+    Attributes:
+      path (str): path of the SQLite database file.
+      max_size (int): maximum size in bytes of all cached bodies.
+      ttl (dict): time to live in seconds keyed by entity label, that is, \
+                  the first segment of the path relative to the API base URL.
+      default_ttl (int): time to live of entries without a specific one.
+      stats (dict): 'hits', 'misses', 'revalidated' and 'evicted' counters.
+
+    """
+
+    def __init__(self, path=CACHE_PATH, max_size=100 * 1024 * 1024, ttl=None,
+                 default_ttl=60 * 60):
+        """Open (or create) a cache database.
+
+        Args:
+          path (str, optional): database file; ':memory:' keeps the cache \
+                                in memory. Defaults to CACHE_PATH.
+          max_size (int, optional): maximum size in bytes of all cached \
+                                    bodies. Defaults to 100 MiB.
+          ttl (dict, optional): time to live in seconds by entity label; \
+                                overrides the module TTL defaults.
+          default_ttl (int, optional): time to live in seconds of any other \
+                                       response. Defaults to one hour.
+
+        """
+        self.path = path
+        self.max_size = max_size
+        self.ttl = dict(TTL)
+        if ttl:
+            self.ttl.update(ttl)
+        self.default_ttl = default_ttl
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'evicted': 0}
+        self.lock = threading.RLock()
+        directory = os.path.dirname(path)
+        if path != ':memory:' and directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.text_factory = str
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS response ('
+                'url TEXT PRIMARY KEY, body BLOB, etag TEXT, '
+                'last_modified TEXT, stored REAL, accessed REAL, '
+                'ttl INTEGER, size INTEGER)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS response_accessed '
+                'ON response (accessed)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS watermark ('
+                'name TEXT PRIMARY KEY, millis INTEGER)')
+
+    def ttl_for(self, label):
+        """Time to live of the responses of a given entity.
+
+        Args:
+          label (str): entity label, e.g. 'node-type'. None for resources \
+                       outside the metadata API.
+
+        Returns:
+          ttl (int): seconds.
+
+        """
+        return self.ttl.get(label, self.default_ttl)
+
+    def get(self, url):
+        """Look up a cached response, fresh or not.
+
+        Args:
+          url (str): requested URL.
+
+        Returns:
+          entry (CacheEntry): the cached response or None.
+
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT url, body, etag, last_modified, stored, ttl '
+                'FROM response WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            with self.connection:
+                self.connection.execute(
+                    'UPDATE response SET accessed = ? WHERE url = ?',
+                    (time.time(), url))
+            self.stats['hits'] += 1
+            return CacheEntry(row[0], str(row[1]), *row[2:])
+
+    def put(self, url, body, etag=None, last_modified=None, ttl=None):
+        """Store a response, evicting least recently used entries if the \
+           cache grows beyond its maximum size. Responses with a zero time \
+           to live are not stored.
+
+        Args:
+          url (str): requested URL.
+          body (str): raw response body.
+          etag (str, optional): ETag header of the response.
+          last_modified (str, optional): Last-Modified header of the response.
+          ttl (int, optional): time to live in seconds. Defaults to \
+                               default_ttl.
+
+        """
+        if ttl is None:
+            ttl = self.default_ttl
+        if ttl <= 0 or len(body) > self.max_size:
+            return
+        now = time.time()
+        with self.lock:
+            with self.connection:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO response VALUES '
+                    '(?, ?, ?, ?, ?, ?, ?, ?)',
+                    (url, sqlite3.Binary(body), etag, last_modified, now, now,
+                     ttl, len(body)))
+            self.evict()
+
+    def touch(self, url):
+        """Mark an entry as fresh after a successful revalidation.
+
+        Args:
+          url (str): requested URL.
+
+        """
+        now = time.time()
+        with self.lock:
+            with self.connection:
+                self.connection.execute(
+                    'UPDATE response SET stored = ?, accessed = ? '
+                    'WHERE url = ?', (now, now, url))
+            self.stats['revalidated'] += 1
+
+    def size(self):
+        """Total size in bytes of the cached bodies."""
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM response').fetchone()[0]
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COUNT(*) FROM response').fetchone()[0]
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in \
+           max_size."""
+        with self.lock:
+            excess = self.size() - self.max_size
+            if excess <= 0:
+                return
+            urls = []
+            for url, size in self.connection.execute(
+                    'SELECT url, size FROM response ORDER BY accessed'):
+                urls.append((url,))
+                excess -= size
+                if excess <= 0:
+                    break
+            with self.connection:
+                self.connection.executemany(
+                    'DELETE FROM response WHERE url = ?', urls)
+            self.stats['evicted'] += len(urls)
+
+    def invalidate(self, prefix=''):
+        """Mark entries as stale, so that they are revalidated on next use. \
+           Entries are kept: unchanged resources will not be downloaded \
+           again.
+
+        Args:
+          prefix (str, optional): only entries whose URL starts with prefix \
+                                  are invalidated. Defaults to every entry.
+
+        Returns:
+          count (int): number of invalidated entries.
+
+        """
+        with self.lock:
+            with self.connection:
+                cursor = self.connection.execute(
+                    'UPDATE response SET stored = 0 WHERE substr(url, 1, ?) '
+                    '= ?', (len(prefix), prefix))
+            return cursor.rowcount
+
+    def clear(self):
+        """Remove every entry and watermark."""
+        with self.lock:
+            with self.connection:
+                self.connection.execute('DELETE FROM response')
+                self.connection.execute('DELETE FROM watermark')
+
+    def watermark(self, name):
+        """Stored last-updated date of a given API.
+
+        Args:
+          name (str): 'data' or 'metadata'.
+
+        Returns:
+          millis (int): last-updated date in milliseconds or None.
+
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT millis FROM watermark WHERE name = ?',
+                (name,)).fetchone()
+        return row[0] if row else None
+
+    def update_watermark(self, name, millis):
+        """Compare the last-updated date of an API with the stored one and, \
+           if it has changed, invalidate every entry. Time-series metadata \
+           embeds data update dates, so both APIs invalidate the whole cache; \
+           revalidation keeps unchanged responses from being downloaded.
+
+        Args:
+          name (str): 'data' or 'metadata'.
+          millis (int): current last-updated date in milliseconds.
+
+        Returns:
+          invalidated (boolean): True if the stored watermark was outdated.
+
+        """
+        with self.lock:
+            stored = self.watermark(name)
+            if stored == millis:
+                return False
+            if stored is not None:
+                self.invalidate()
+            with self.connection:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO watermark VALUES (?, ?)',
+                    (name, millis))
+            return stored is not None
+
+    def close(self):
+        """Close the database."""
+        with self.lock:
+            self.connection.close()
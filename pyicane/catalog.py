@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""Concurrent crawler of ICANE's catalog.
+
+The catalog hierarchy (Category, Section, Subsection, DataSet and the \
+TimeSeries trees below every data set) is walked breadth-first by a pool of \
+threads, so many listings are requested at once. Discovered TimeSeries are \
+streamed to the caller as soon as their listing completes.
+
+"""
+from __future__ import absolute_import
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+from pyicane import pyicane
+
+LOGGER = logging.getLogger(__name__)
+
+# Depth of every level of the catalog; TimeSeries trees below data sets go
+# on from TIME_SERIES_DEPTH.
+CATEGORY_DEPTH = 0
+SECTION_DEPTH = 1
+SUBSECTION_DEPTH = 2
+DATA_SET_DEPTH = 3
+TIME_SERIES_DEPTH = 4
+
+
+class Catalog(object):
+    """Breadth-first, concurrent crawler of ICANE's catalog.
+
+    Work items are plain lists so that pending work can be checkpointed as \
+    JSON and resumed later:
+
+    - ['categories', category_uri_tags]: list categories and sections.
+    - ['subsections', section, categories]: list subsections of a section.
+    - ['data-sets', category, section, subsection]: list data sets.
+    - ['time-series', category, section, subsection, data_set]: list the \
+      TimeSeries trees of a data set.
+
+    Attributes:
+      max_workers (int): number of concurrent requests.
+      max_depth (int): deepest level crawled and yielded; see the *_DEPTH \
+                       module constants.
+      node_types (set): uri_tags of the node types to be yielded.
+      checkpoint (str): path of the checkpoint file.
+      errors (list): (work item, exception) tuples of failed work items.
+
+    """
+
+    def __init__(self, max_workers=8, max_depth=None, node_types=None,
+                 checkpoint=None, checkpoint_every=10):
+        """Configure a crawler.
+
+        Args:
+          max_workers (int, optional): number of concurrent requests. \
+                                       Defaults to 8.
+          max_depth (int, optional): deepest level to be crawled, e.g. \
+                                     DATA_SET_DEPTH to list data sets only. \
+                                     Defaults to None, i.e. unlimited.
+          node_types (iterable, optional): node type uri_tags to be yielded, \
+                                           e.g. ['time-series']. The whole \
+                                           hierarchy is crawled anyway. \
+                                           Defaults to None, i.e. all.
+          checkpoint (str, optional): path of a JSON file where progress is \
+                                      saved. If it exists, the crawl resumes \
+                                      from it. Defaults to None.
+          checkpoint_every (int, optional): number of completed work items \
+                                            between checkpoints. Defaults to \
+                                            10.
+
+        """
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self.node_types = set(node_types) if node_types is not None else None
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.errors = []
+
+    def within_depth(self, depth):
+        """Check whether a level is to be crawled."""
+        return self.max_depth is None or depth <= self.max_depth
+
+    def expand(self, item):
+        """Process a work item. Listings that do not exist, such as a \
+           section without data in a given category, are empty.
+
+        Args:
+          item (list): work item.
+
+        Returns:
+          (items, nodes) tuple: list of new work items and list of \
+                                (depth, TimeSeries) tuples discovered.
+
+        """
+        try:
+            return self.list(item)
+        except requests.exceptions.HTTPError, exception:
+            if exception.response.status_code != 404:
+                raise
+            return [], []
+
+    def list(self, item):
+        """Request the listing of a work item (see expand())."""
+        kind = item[0]
+        items = []
+        nodes = []
+        if kind == 'categories':
+            categories = [category.uriTag for category in
+                          pyicane.Category.find_all()
+                          if item[1] is None or category.uriTag in item[1]]
+            if self.within_depth(SUBSECTION_DEPTH):
+                for section in pyicane.Section.find_all():
+                    items.append(['subsections', section.uriTag, categories])
+        elif kind == 'subsections':
+            section, categories = item[1], item[2]
+            if self.within_depth(DATA_SET_DEPTH):
+                for subsection in pyicane.Section.get(section).\
+                        get_subsections():
+                    for category in categories:
+                        items.append(['data-sets', category, section,
+                                      subsection.uriTag])
+        elif kind == 'data-sets':
+            for data_set in pyicane.TimeSeries.find_all_datasets(*item[1:]):
+                nodes.append((DATA_SET_DEPTH, data_set))
+                if self.within_depth(TIME_SERIES_DEPTH):
+                    items.append(['time-series'] + item[1:] +
+                                 [data_set.uriTag])
+        elif kind == 'time-series':
+            stack = [(TIME_SERIES_DEPTH, node) for node in
+                     reversed(pyicane.TimeSeries.find_all(*item[1:]))]
+            while stack:  # walk the trees, parents first
+                depth, node = stack.pop()
+                nodes.append((depth, node))
+                if self.within_depth(depth + 1):
+                    children = node['children'] if 'children' in node \
+                        else None
+                    stack.extend((depth + 1, child) for child in
+                                 reversed(children or []))
+        return items, nodes
+
+    def load(self):
+        """Load a checkpoint.
+
+        Returns:
+          (items, seen) tuple: pending work items and seen node keys, or \
+                               (None, set()) if there is no checkpoint.
+
+        """
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return None, set()
+        with open(self.checkpoint) as checkpoint:
+            state = json.load(checkpoint)
+        LOGGER.info('Resuming crawl with ' + str(len(state['pending'])) +
+                    ' pending work items')
+        return state['pending'], set(state['seen'])
+
+    def save(self, items, seen):
+        """Atomically save a checkpoint.
+
+        Args:
+          items (list): pending work items.
+          seen (set): keys of the nodes already yielded.
+
+        """
+        temporary = self.checkpoint + '.tmp'
+        with open(temporary, 'w') as checkpoint:
+            json.dump({'pending': items, 'seen': sorted(seen)}, checkpoint)
+        pyicane.replace_file(temporary, self.checkpoint)
+
+    def crawl(self, category_uri_tags=None):
+        """Walk the catalog, yielding TimeSeries as they are discovered. \
+           Every node is yielded once, even if it is listed under several \
+           categories. After an interruption, a crawl with the same \
+           checkpoint resumes from the last saved work items; nodes yielded \
+           after that checkpoint may be yielded again. The checkpoint is \
+           removed when the crawl completes without errors.
+
+        Args:
+          category_uri_tags (iterable, optional): uri_tags of the categories \
+                                                  to be crawled. Defaults to \
+                                                  None, i.e. all.
+
+        Yields:
+          TimeSeries objects (data sets and nodes below them).
+
+        """
+        pending, seen = self.load()
+        if pending is None:
+            pending = [['categories', list(category_uri_tags)
+                        if category_uri_tags is not None else None]]
+        self.errors = []
+        completed = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = dict((executor.submit(self.expand, item), item)
+                           for item in pending)
+            while futures:
+                done = wait(futures, return_when=FIRST_COMPLETED)[0]
+                for future in done:
+                    item = futures.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        LOGGER.warning('crawl: ' + repr(item) + ' ' +
+                                       repr(error))
+                        self.errors.append((item, error))
+                        continue
+                    items, nodes = future.result()
+                    for child in items:
+                        futures[executor.submit(self.expand, child)] = child
+                    for depth, node in nodes:
+                        key = str(node['id'] if 'id' in node
+                                  else node['uriTag'])
+                        if key in seen or not self.within_depth(depth):
+                            continue
+                        seen.add(key)
+                        if self.node_types is None or \
+                                node.nodeType.uriTag in self.node_types:
+                            yield node
+                    completed += 1
+                    if self.checkpoint is not None and \
+                            completed % self.checkpoint_every == 0:
+                        self.save(list(futures.values()) +
+                                  [failed for failed, _ in self.errors],
+                                  seen)
+        if self.checkpoint is not None:
+            if self.errors:
+                self.save([failed for failed, _ in self.errors], seen)
+            elif os.path.exists(self.checkpoint):
+                os.remove(self.checkpoint)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Pluggable JSON decoders of ICANE's API responses.
+
+Data resources must be decoded into mappings that keep the order of their \
+keys, since it is the order of the dimension labels. The stdlib decoder \
+builds collections.OrderedDict objects, which is slow on Python 2, where \
+OrderedDict is implemented in Python. The other decoders build \
+OrderedObject mappings instead, which are filled at C speed from the \
+decoded key/value pairs::
+
+    client = pyicane.Client(decoder='simplejson')
+
+"""
+from __future__ import absolute_import
+
+import json
+from collections import OrderedDict
+
+try:
+    import simplejson
+except ImportError:  # optional decoder
+    simplejson = None
+
+
+class OrderedObject(dict):
+    """Decoded JSON object keeping the order of its keys. It is a dict, \
+       built at C speed from a list of pairs, plus a list with the order of \
+       its keys, which Python-level iteration and mutation methods follow."""
+
+    __slots__ = ('_keys',)
+
+    def __init__(self, pairs=()):
+        pairs = list(pairs.items() if isinstance(pairs, dict) else pairs)
+        dict.__init__(self, pairs)
+        self._keys = [pair[0] for pair in pairs]
+        if len(self._keys) != dict.__len__(self):  # duplicated keys
+            seen = set()
+            self._keys = [key for key in self._keys
+                          if not (key in seen or seen.add(key))]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __reversed__(self):
+        return reversed(self._keys)
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._keys.append(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._keys.remove(key)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.items())
+
+    def __reduce__(self):
+        return self.__class__, (self.items(),)
+
+    def iterkeys(self):
+        return iter(self._keys)
+
+    def itervalues(self):
+        return (dict.__getitem__(self, key) for key in self._keys)
+
+    def iteritems(self):
+        return ((key, dict.__getitem__(self, key)) for key in self._keys)
+
+    def keys(self):
+        return list(self._keys)
+
+    def values(self):
+        return [dict.__getitem__(self, key) for key in self._keys]
+
+    def items(self):
+        return [(key, dict.__getitem__(self, key)) for key in self._keys]
+
+    def pop(self, key, *default):
+        if key in self:
+            self._keys.remove(key)
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        if not self._keys:
+            raise KeyError('popitem(): dictionary is empty')
+        key = self._keys.pop()
+        return key, dict.pop(self, key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in OrderedDict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        dict.clear(self)
+        self._keys = []
+
+    def copy(self):
+        return self.__class__(self.items())
+
+
+class Decoder(object):
+    """A named JSON decoder.
+
+    Attributes:
+      name (str): decoder name.
+      loads (callable): function decoding a JSON string into objects \
+                        keeping the order of keys.
+
+    """
+
+    __slots__ = ('name', 'loads')
+
+    def __init__(self, name, loads):
+        self.name = name
+        self.loads = loads
+
+    def __repr__(self):
+        return 'Decoder(%r)' % self.name
+
+
+def build_decoders():
+    """Build the decoders whose packages are installed, by name."""
+    decoders = {
+        'json': Decoder('json', lambda body: json.loads(
+            body, object_pairs_hook=OrderedDict)),
+        'json-fast': Decoder('json-fast', lambda body: json.loads(
+            body, object_pairs_hook=OrderedObject))}
+    if simplejson is not None:
+        decoders['simplejson'] = Decoder(
+            'simplejson', lambda body: simplejson.loads(
+                body, object_pairs_hook=OrderedObject))
+    return decoders
+
+
+DECODERS = build_decoders()
+
+# Preferred decoders, fastest first, when choosing automatically.
+PREFERENCE = ('simplejson', 'json-fast', 'json')
+
+
+def available():
+    """List the installed decoders.
+
+    Returns:
+      Python list of decoder names, fastest first.
+
+    """
+    return [name for name in PREFERENCE if name in DECODERS]
+
+
+def get_decoder(name='json'):
+    """Return a decoder by name.
+
+    Args:
+      name (str, optional): decoder name, or 'auto' for the fastest one \
+                            available. Defaults to 'json', i.e. the stdlib \
+                            decoder building OrderedDict objects.
+
+    Returns:
+      decoder (Decoder): the decoder.
+
+    Raises:
+      ValueError: the decoder is unknown or not installed.
+
+    """
+    if name == 'auto':
+        name = available()[0]
+    decoder = DECODERS.get(name)
+    if decoder is None:
+        raise ValueError('Decoder not available: ' + repr(name))
+    return decoder
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Export of ICANE's time series to Apache Arrow and Parquet files.
+
+The data of every time series is written twice: to an Arrow IPC file, \
+'arrow/<uri_tag>.arrow', which is memory-mapped when read back and copied \
+once into a data frame, and to a partition of its own, \
+'data/uriTag=<uri_tag>/data.parquet', so that other tools can read 'data' \
+as a single Parquet dataset partitioned by uriTag. \
+Dimension columns are dictionary-encoded. Metadata digests are written to \
+a single Parquet table, 'metadata.parquet'. Requires the pyarrow package.
+
+"""
+from __future__ import absolute_import
+
+import json
+import os
+from collections import OrderedDict
+
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed to export data
+    pa = None
+    pq = None
+
+from pyicane import pyicane
+
+STORE_PATH = os.path.join(os.path.expanduser('~'), '.pyicane', 'arrow')
+
+# Key of the schema metadata where the index of the data frame is saved.
+SCHEMA_KEY = b'pyicane'
+
+
+def frame_table(frame):
+    """Convert a data frame into an Arrow table whose dimension columns, \
+       index levels included, are dictionary-encoded.
+
+    Args:
+      frame (pandas.DataFrame): data frame, e.g. from data_as_dataframe().
+
+    Returns:
+      pyarrow.Table object.
+
+    """
+    index = [name for name in frame.index.names if name is not None]
+    if index:
+        frame = frame.reset_index()
+    frame = pd.DataFrame(OrderedDict(
+        (name, column if name == 'Valor' or hasattr(column, 'cat')
+         else column.astype('category'))
+        for name, column in frame.iteritems()), columns=frame.columns)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SCHEMA_KEY] = json.dumps({'index': index})
+    return table.replace_schema_metadata(metadata)
+
+
+def table_frame(table):
+    """Convert an Arrow table written by frame_table() back into a data \
+       frame with the same index.
+
+    Args:
+      table (pyarrow.Table): Arrow table.
+
+    Returns:
+      Python Pandas Dataframe.
+
+    """
+    frame = table.to_pandas()
+    index = json.loads((table.schema.metadata or {}).get(SCHEMA_KEY,
+                                                         '{"index": []}'))
+    index = index['index']
+    if not index:
+        return frame
+    if len(index) == 1:
+        frame.index = pd.Index(frame.pop(index[0]).astype(object).values,
+                               name=index[0])
+        return frame
+    return frame.set_index(index)
+
+
+class ArrowStore(object):
+    """Directory of Arrow and Parquet files with time series data and \
+       metadata.
+
+    Attributes:
+      path (str): store directory.
+
+    """
+
+    def __init__(self, path=STORE_PATH):
+        """Open (or create) a store.
+
+        Args:
+          path (str, optional): store directory. Defaults to STORE_PATH.
+
+        Raises:
+          ImportError: pyarrow is not installed.
+
+        """
+        if pa is None:
+            raise ImportError('pyarrow is required by ArrowStore')
+        self.path = path
+        for directory in ('arrow', 'data'):
+            if not os.path.isdir(os.path.join(path, directory)):
+                os.makedirs(os.path.join(path, directory))
+
+    def arrow_path(self, uri_tag):
+        """Path of the Arrow file of a time series."""
+        return os.path.join(self.path, 'arrow', uri_tag + '.arrow')
+
+    def partition(self, uri_tag):
+        """Directory of the Parquet partition of a time series."""
+        return os.path.join(self.path, 'data', 'uriTag=' + uri_tag)
+
+    def uri_tags(self):
+        """List the uri_tags of the stored time series."""
+        return sorted(name[:-len('.arrow')] for name in
+                      os.listdir(os.path.join(self.path, 'arrow'))
+                      if name.endswith('.arrow'))
+
+    def __contains__(self, uri_tag):
+        return os.path.exists(self.arrow_path(uri_tag))
+
+    def write_data(self, uri_tag, frame):
+        """Write (or replace) the data of a time series. Files are written \
+           aside and renamed, so that readers never see partial files.
+
+        Args:
+          uri_tag (str): uri_tag (ie, label) of the time series.
+          frame (pandas.DataFrame): data frame, e.g. from \
+                                    data_as_dataframe().
+
+        """
+        table = frame_table(frame)
+        arrow = self.arrow_path(uri_tag)
+        with pa.OSFile(arrow + '.tmp', 'wb') as sink:
+            writer = pa.RecordBatchFileWriter(sink, table.schema)
+            writer.write_table(table)
+            writer.close()
+        pyicane.replace_file(arrow + '.tmp', arrow)
+        partition = self.partition(uri_tag)
+        if not os.path.isdir(partition):
+            os.makedirs(partition)
+        parquet = os.path.join(partition, 'data.parquet')
+        pq.write_table(table, parquet + '.tmp')
+        pyicane.replace_file(parquet + '.tmp', parquet)
+
+    def read_data(self, uri_tag):
+        """Read the data of a time series from its memory-mapped Arrow file. \
+           The file is mapped rather than read into a buffer, but building \
+           the data frame copies every column out of the mapping once.
+
+        Args:
+          uri_tag (str): uri_tag (ie, label) of the time series.
+
+        Returns:
+          Python Pandas Dataframe.
+
+        Raises:
+          KeyError: the time series is not in the store.
+
+        """
+        if uri_tag not in self:
+            raise KeyError(uri_tag)
+        with pa.memory_map(self.arrow_path(uri_tag)) as source:
+            return table_frame(pa.ipc.open_file(source).read_all())
+
+    def write_metadata(self, digests):
+        """Write (or replace) the metadata table.
+
+        Args:
+          digests (iterable): NodeDigest objects with epoch milliseconds, \
+                              e.g. from flatten_metadata(data, True) or \
+                              node_digest_model(node, True). DATE_COLUMNS \
+                              are written as timestamps.
+
+        """
+        frame = pyicane.digests_to_dataframe(digests)
+        for name in pyicane.DATE_COLUMNS:
+            frame[name] = pyicane.millis_to_dates(frame[name])
+        path = os.path.join(self.path, 'metadata.parquet')
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False),
+                       path + '.tmp')
+        pyicane.replace_file(path + '.tmp', path)
+
+    def read_metadata(self):
+        """Read the metadata table.
+
+        Returns:
+          Python Pandas Dataframe with NODE_DIGEST_COLUMNS columns; \
+          DATE_COLUMNS are datetime64 columns (UTC).
+
+        """
+        return pq.read_table(os.path.join(self.path,
+                                          'metadata.parquet')).to_pandas()
+
+    def export(self, time_series, max_workers=8):
+        """Download and write the data of many time series concurrently, \
+           and write the metadata digests of all of them.
+
+        Args:
+          time_series (iterable): TimeSeries objects, e.g. from a catalog \
+                                  crawl or a metadata index search. Nodes \
+                                  other than time series are only part of \
+                                  the metadata.
+          max_workers (int, optional): number of concurrent requests. \
+                                       Defaults to 8.
+
+        Returns:
+          Python list of Result objects with the uri_tags of the exported \
+          time series (see pyicane.fetch_many()).
+
+        """
+        nodes = list(time_series)
+
+        def export(node):
+            """Download and write the data of a time series."""
+            self.write_data(node.uriTag, node.data_as_dataframe())
+            return node.uriTag
+
+        series = [node for node in nodes
+                  if node.nodeType.uriTag == 'time-series']
+        results = list(pyicane.fetch_many(export, series, max_workers))
+        self.write_metadata(pyicane.node_digest_model(node, timestamps=True)
+                            for node in nodes)
+        return results
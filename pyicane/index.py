@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""Local, offline index of ICANE's time-series metadata.
+
+Nodes, e.g. the TimeSeries yielded by pyicane.catalog.Catalog.crawl(), are \
+stored in a SQLite database with a full-text (FTS4) index over their title, \
+description, topics, automatized topics and measure titles, and are looked \
+up by id or uriTag through primary key and unique indexes. Queries are \
+answered in milliseconds without any HTTP request.
+
+"""
+from __future__ import absolute_import
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from pyicane import pyicane
+
+INDEX_PATH = os.path.join(os.path.expanduser('~'), '.pyicane', 'index.sqlite')
+
+# Full-text indexed fields, in FTS column order.
+FIELDS = ('title', 'description', 'topics', 'automatizedTopics', 'measures')
+
+
+def node_text(node, field):
+    """Text of a node field to be indexed.
+
+    Args:
+      node (dict): TimeSeries node.
+      field (str): one of FIELDS.
+
+    Returns:
+      text (unicode): indexed text, empty if the field is missing.
+
+    """
+    if field == 'measures':
+        measures = node['measures'] if 'measures' in node else None
+        return u' '.join(measure['title'] for measure in measures or [])
+    value = node[field] if field in node else None
+    return unicode(value) if value is not None else u''
+
+
+class MetadataIndex(object):
+    """SQLite-backed metadata index of TimeSeries nodes.
+
+    Attributes:
+      path (str): path of the SQLite database file.
+
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        """Open (or create) an index.
+
+        Args:
+          path (str, optional): database file; ':memory:' keeps the index in \
+                                memory. Defaults to INDEX_PATH.
+
+        """
+        self.path = path
+        self.lock = threading.RLock()
+        directory = os.path.dirname(path)
+        if path != ':memory:' and directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS node ('
+                'id INTEGER PRIMARY KEY, uri_tag TEXT UNIQUE, '
+                'node_type TEXT, json TEXT)')
+            self.connection.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS node_text USING fts4(' +
+                ', '.join(FIELDS) + ', tokenize=unicode61)')
+
+    def add(self, nodes):
+        """Add or replace nodes. Children are not indexed with their \
+           parents: add them as nodes of their own, as crawls yield them.
+
+        Args:
+          nodes (iterable): TimeSeries nodes.
+
+        Returns:
+          count (int): number of added nodes.
+
+        """
+        count = 0
+        with self.lock:
+            with self.connection:
+                for node in nodes:
+                    record = OrderedDict((key, value) for key, value in
+                                         dict.iteritems(node)
+                                         if key != 'children')
+                    moved = self.connection.execute(
+                        'SELECT id FROM node WHERE uri_tag = ? AND id != ?',
+                        (node['uriTag'], node['id'])).fetchone()
+                    if moved is not None:  # uriTag reused under a new id
+                        self.connection.execute(
+                            'DELETE FROM node WHERE id = ?', moved)
+                        self.connection.execute(
+                            'DELETE FROM node_text WHERE docid = ?', moved)
+                    self.connection.execute(
+                        'INSERT OR REPLACE INTO node VALUES (?, ?, ?, ?)',
+                        (node['id'], node['uriTag'],
+                         node['nodeType']['uriTag'], json.dumps(record)))
+                    self.connection.execute(
+                        'DELETE FROM node_text WHERE docid = ?',
+                        (node['id'],))
+                    self.connection.execute(
+                        'INSERT INTO node_text (docid, ' + ', '.join(FIELDS) +
+                        ') VALUES (?, ?, ?, ?, ?, ?)',
+                        [node['id']] + [node_text(node, field)
+                                        for field in FIELDS])
+                    count += 1
+        return count
+
+    def remove(self, node_id):
+        """Remove a node.
+
+        Args:
+          node_id (int): node id.
+
+        """
+        with self.lock:
+            with self.connection:
+                self.connection.execute('DELETE FROM node WHERE id = ?',
+                                        (node_id,))
+                self.connection.execute(
+                    'DELETE FROM node_text WHERE docid = ?', (node_id,))
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COUNT(*) FROM node').fetchone()[0]
+
+    def node(self, row):
+        """Convert a stored JSON record into a TimeSeries object."""
+        return pyicane.TimeSeries(json.loads(row[0],
+                                             object_pairs_hook=OrderedDict))
+
+    def get(self, node_id):
+        """Look up a node by its id.
+
+        Args:
+          node_id (int): node id.
+
+        Returns:
+          TimeSeries object or None.
+
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT json FROM node WHERE id = ?', (node_id,)).fetchone()
+        return self.node(row) if row else None
+
+    def get_by_uri_tag(self, uri_tag):
+        """Look up a node by its uriTag.
+
+        Args:
+          uri_tag (str): node uri_tag.
+
+        Returns:
+          TimeSeries object or None.
+
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT json FROM node WHERE uri_tag = ?',
+                (uri_tag,)).fetchone()
+        return self.node(row) if row else None
+
+    def search(self, query, field=None, node_type=None, limit=None):
+        """Full-text search of nodes.
+
+        Args:
+          query (str): FTS4 query, e.g. 'paro', 'paro OR empleo' or 'emple*'.
+          field (str, optional): restrict the search to one of FIELDS. \
+                                 Defaults to None, i.e. every field.
+          node_type (str, optional): node type uri_tag of the results, e.g. \
+                                     'time-series'. Defaults to None.
+          limit (int, optional): maximum number of results.
+
+        Returns:
+          Python list of TimeSeries objects, by id.
+
+        Raises:
+          ValueError: unknown field.
+
+        """
+        if field is None:
+            column = 'node_text'
+        elif field in FIELDS:
+            column = field
+        else:
+            raise ValueError('Unknown field: ' + repr(field))
+        sql = ('SELECT node.json FROM node_text JOIN node '
+               'ON node.id = node_text.docid WHERE node_text.' + column +
+               ' MATCH ?')
+        parameters = [query]
+        if node_type is not None:
+            sql += ' AND node.node_type = ?'
+            parameters.append(node_type)
+        sql += ' ORDER BY node.id'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+        with self.lock:
+            rows = self.connection.execute(sql, parameters).fetchall()
+        return [self.node(row) for row in rows]
+
+    def close(self):
+        """Close the database."""
+        with self.lock:
+            self.connection.close()
+
+
+_INDEX = None
+
+
+def get_index():
+    """Return the index used by TimeSeries.search(), opening the default one \
+       at INDEX_PATH on first use.
+
+    Returns:
+      index (MetadataIndex): the module index.
+
+    """
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = MetadataIndex()
+    return _INDEX
+
+
+def set_index(index):
+    """Replace the index used by TimeSeries.search().
+
+    Args:
+      index (MetadataIndex): the new module index. If None, the default one \
+                             will be opened on next use.
+
+    """
+    global _INDEX
+    _INDEX = index
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""Instrumentation hooks of pyicane's processing stages.
+
+Every stage of a call, from the HTTP request to the data frame, runs inside \
+a span. Hooks registered with add_hook() are notified before and after \
+every span, together with the stage name and information such as the URL, \
+bytes or rows processed. Stages are:
+
+- 'request': download of a response body (url, bytes).
+- 'parse': JSON deserialization of a response body (url, bytes).
+- 'entity': conversion of a deserialized response into an entity (entity).
+- 'flatten': conversion of a data resource into columns (rows).
+- 'dataframe': construction of a data frame (rows).
+
+Without hooks, which is the default, spans do nothing but check for them. \
+Metrics is a hook aggregating timers, byte and row counters per stage that \
+can be exported in the Prometheus text format::
+
+    metrics = instrumentation.add_hook(instrumentation.Metrics())
+    ...
+    print metrics.prometheus()
+
+"""
+
+import logging
+import threading
+from timeit import default_timer
+
+LOGGER = logging.getLogger(__name__)
+
+STAGES = ('request', 'parse', 'entity', 'flatten', 'dataframe')
+
+# Upper bounds, in seconds, of the duration histogram buckets.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Registered hooks. The list is replaced, never modified, so that spans can
+# iterate over it without locking.
+HOOKS = ()
+_LOCK = threading.Lock()
+
+
+class Hook(object):
+    """Base class of instrumentation hooks; both methods do nothing."""
+
+    def before(self, stage, info):
+        """Called when a stage starts.
+
+        Args:
+          stage (str): stage name, see STAGES.
+          info (dict): stage information; it may be completed by the stage.
+
+        """
+        pass
+
+    def after(self, stage, info, seconds, error):
+        """Called when a stage ends.
+
+        Args:
+          stage (str): stage name, see STAGES.
+          info (dict): stage information, e.g. 'url', 'bytes' or 'rows'.
+          seconds (float): duration of the stage.
+          error (Exception): exception raised by the stage, if any.
+
+        """
+        pass
+
+
+class CallbackHook(Hook):
+    """Hook calling plain functions with the arguments of Hook methods."""
+
+    def __init__(self, before=None, after=None):
+        """Build a hook from callbacks.
+
+        Args:
+          before (callable, optional): called as before(stage, info).
+          after (callable, optional): called as \
+                                      after(stage, info, seconds, error).
+
+        """
+        self.before_callback = before
+        self.after_callback = after
+
+    def before(self, stage, info):
+        if self.before_callback is not None:
+            self.before_callback(stage, info)
+
+    def after(self, stage, info, seconds, error):
+        if self.after_callback is not None:
+            self.after_callback(stage, info, seconds, error)
+
+
+class StageMetrics(object):
+    """Aggregated metrics of a stage.
+
+    Attributes:
+      count (int): number of spans.
+      errors (int): number of spans raising an exception.
+      seconds (float): total duration.
+      buckets (list): number of spans not longer than every BUCKETS bound.
+      bytes (int): total bytes processed.
+      rows (int): total rows processed.
+
+    """
+
+    __slots__ = ('count', 'errors', 'seconds', 'buckets', 'bytes', 'rows')
+
+    def __init__(self, bounds):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(bounds)
+        self.bytes = 0
+        self.rows = 0
+
+
+class Metrics(Hook):
+    """Hook aggregating duration histograms and byte and row counters per \
+       stage.
+
+    Attributes:
+      bounds (tuple): upper bounds of the histogram buckets, in seconds.
+      stages (dict): StageMetrics objects by stage name.
+
+    """
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = tuple(bounds)
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def after(self, stage, info, seconds, error):
+        with self.lock:
+            metrics = self.stages.get(stage)
+            if metrics is None:
+                metrics = self.stages[stage] = StageMetrics(self.bounds)
+            metrics.count += 1
+            metrics.seconds += seconds
+            if error is not None:
+                metrics.errors += 1
+            for i, bound in enumerate(self.bounds):
+                if seconds <= bound:
+                    metrics.buckets[i] += 1
+            metrics.bytes += info.get('bytes', 0)
+            metrics.rows += info.get('rows', 0)
+
+    def snapshot(self):
+        """Report the aggregated metrics.
+
+        Returns:
+          metrics (dict): dicts with 'count', 'errors', 'seconds', 'bytes' \
+                          and 'rows' by stage name.
+
+        """
+        with self.lock:
+            return dict((stage, {'count': metrics.count,
+                                 'errors': metrics.errors,
+                                 'seconds': metrics.seconds,
+                                 'bytes': metrics.bytes,
+                                 'rows': metrics.rows})
+                        for stage, metrics in self.stages.items())
+
+    def prometheus(self, prefix='pyicane'):
+        """Export the aggregated metrics in the Prometheus text format.
+
+        Args:
+          prefix (str, optional): metric name prefix. Defaults to 'pyicane'.
+
+        Returns:
+          text (str): exposition text.
+
+        """
+        with self.lock:
+            stages = sorted(self.stages.items())
+            lines = ['# HELP %s_stage_seconds Duration of pyicane stages.' %
+                     prefix,
+                     '# TYPE %s_stage_seconds histogram' % prefix]
+            for stage, metrics in stages:
+                for bound, count in zip(self.bounds, metrics.buckets):
+                    lines.append('%s_stage_seconds_bucket{stage="%s",'
+                                 'le="%s"} %d' % (prefix, stage, repr(bound),
+                                                  count))
+                lines.append('%s_stage_seconds_bucket{stage="%s",le="+Inf"} '
+                             '%d' % (prefix, stage, metrics.count))
+                lines.append('%s_stage_seconds_sum{stage="%s"} %s' %
+                             (prefix, stage, repr(metrics.seconds)))
+                lines.append('%s_stage_seconds_count{stage="%s"} %d' %
+                             (prefix, stage, metrics.count))
+            for name, help_ in (('errors', 'Stages raising an exception.'),
+                                ('bytes', 'Bytes processed by stages.'),
+                                ('rows', 'Rows processed by stages.')):
+                lines.append('# HELP %s_stage_%s_total %s' % (prefix, name,
+                                                              help_))
+                lines.append('# TYPE %s_stage_%s_total counter' % (prefix,
+                                                                   name))
+                for stage, metrics in stages:
+                    lines.append('%s_stage_%s_total{stage="%s"} %d' %
+                                 (prefix, name, stage,
+                                  getattr(metrics, name)))
+        return '\n'.join(lines) + '\n'
+
+
+class Span(object):
+    """Context manager notifying hooks around a stage. Entering it returns \
+       the stage information, which the stage may complete."""
+
+    __slots__ = ('stage', 'info', 'hooks', 'start')
+
+    def __init__(self, stage, info, hooks):
+        self.stage = stage
+        self.info = info
+        self.hooks = hooks
+        self.start = None
+
+    def __enter__(self):
+        for hook in self.hooks:
+            try:
+                hook.before(self.stage, self.info)
+            except Exception:  # pylint: disable=W0703
+                LOGGER.exception('instrumentation hook failed')
+        self.start = default_timer()
+        return self.info
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = default_timer() - self.start
+        for hook in self.hooks:
+            try:
+                hook.after(self.stage, self.info, seconds, exc_value)
+            except Exception:  # pylint: disable=W0703
+                LOGGER.exception('instrumentation hook failed')
+        return False
+
+
+class NullSpan(object):
+    """Span used while no hook is registered; it does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(stage, **info):
+    """Build the span of a stage.
+
+    Args:
+      stage (str): stage name, see STAGES.
+      **info: stage information, e.g. url.
+
+    Returns:
+      a context manager; NULL_SPAN if there are no hooks.
+
+    """
+    hooks = HOOKS
+    if not hooks:
+        return NULL_SPAN
+    return Span(stage, info, hooks)
+
+
+def add_hook(hook):
+    """Register a hook.
+
+    Args:
+      hook (Hook): hook to be notified of every stage.
+
+    Returns:
+      hook (Hook): the registered hook.
+
+    """
+    global HOOKS
+    with _LOCK:
+        HOOKS = HOOKS + (hook,)
+    return hook
+
+
+def remove_hook(hook):
+    """Unregister a hook, if registered."""
+    global HOOKS
+    with _LOCK:
+        HOOKS = tuple(registered for registered in HOOKS
+                      if registered is not hook)
@@ -12,24 +12,487 @@ License (see LICENSE file).
 
 .. [1] http://pandas.pydata.org for Python Data Analysis Library information
 """
+from __future__ import absolute_import
 
 import requests
 import logging
 import inspect
+import os
+import sys
+import threading
 from datetime import datetime
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from array import array
+from StringIO import StringIO
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_categorical_dtype, union_categoricals
 import abc
+try:
+    import ijson
+except ImportError:  # only needed to stream data
+    ijson = None
+
+from pyicane import instrumentation
+from pyicane.decoders import get_decoder
 
 BASE_URL = 'http://www.icane.es/metadata/api/'
 logging.basicConfig(level=logging.INFO)
 LOGGER = logging.getLogger(__name__)
 
 
+class PoolingHTTPAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter keeping track of connection pool usage. urllib3 pools \
+       count the requests they serve and the connections they open; since \
+       pools may be discarded when the pool manager is full, their counters \
+       are accumulated before disposal so that no statistics are lost.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.disposed_requests = 0
+        self.disposed_connections = 0
+        super(PoolingHTTPAdapter, self).__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(PoolingHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        pools = self.poolmanager.pools
+        dispose = pools.dispose_func
+
+        def dispose_func(pool):
+            """Accumulate pool counters before closing it."""
+            self.disposed_requests += pool.num_requests
+            self.disposed_connections += pool.num_connections
+            if dispose is not None:
+                dispose(pool)
+
+        pools.dispose_func = dispose_func
+
+    def pool_stats(self):
+        """Collect usage counters from live and disposed pools.
+
+        Returns:
+          stats (dict): number of 'pools', 'requests' served and \
+                        'connections' opened.
+
+        """
+        pools = self.poolmanager.pools
+        live_pools = []
+        for key in pools.keys():
+            try:
+                live_pools.append(pools[key])
+            except KeyError:  # evicted while iterating
+                pass
+        return {'pools': len(live_pools),
+                'requests': self.disposed_requests +
+                sum(pool.num_requests for pool in live_pools),
+                'connections': self.disposed_connections +
+                sum(pool.num_connections for pool in live_pools)}
+
+
+class Flight(object):
+    """A request in flight, whose outcome is shared by every caller.
+
+    Attributes:
+      done (threading.Event): set when the request completes.
+      value: value returned by the request.
+      exc_info (tuple): sys.exc_info() of the request, if it failed.
+
+    """
+
+    __slots__ = ('done', 'value', 'exc_info')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    """Coalesce concurrent calls with the same key: the first caller runs \
+       the call and the others wait for it and share its outcome, value or \
+       exception. Results are not kept once the call completes.
+
+    Attributes:
+      stats (dict): number of 'calls', 'flights' actually run and calls \
+                    'coalesced' into a flight already running.
+
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.stats = {'calls': 0, 'flights': 0, 'coalesced': 0}
+
+    def run(self, key, function):
+        """Run function, unless a call with the same key is in flight, in \
+           which case its outcome is waited for and shared.
+
+        Args:
+          key: hashable key of the call, e.g. a URL.
+          function (callable): function without arguments.
+
+        Returns:
+          value returned by function.
+
+        Raises:
+          Exception: the exception raised by function.
+
+        """
+        with self.lock:
+            self.stats['calls'] += 1
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.stats['flights'] += 1
+            else:
+                self.stats['coalesced'] += 1
+        if leader:
+            try:
+                flight.value = function()
+            except BaseException:  # shared with every waiting caller
+                flight.exc_info = sys.exc_info()
+            finally:
+                with self.lock:
+                    del self.flights[key]
+                flight.done.set()
+        else:
+            flight.done.wait()
+        if flight.exc_info is not None:
+            raise flight.exc_info[0], flight.exc_info[1], flight.exc_info[2]
+        return flight.value
+
+
+class Client(object):
+    """HTTP client sending requests to ICANE's API through a pooled, \
+       keep-alive requests.Session, so that TCP connections are reused \
+       between calls instead of being opened for every request.
+
+    Attributes:
+      base_url (str): URL prepended to relative paths.
+      session (requests.Session): pooled session used for every request.
+      cache (pyicane.cache.ResponseCache): response cache, if any.
+      flights (SingleFlight): coalescer of concurrent requests for the same \
+                              URL, if enabled; see its stats.
+      retry (pyicane.transport.RetryPolicy): retry policy, if any.
+      rate_limiter (pyicane.transport.TokenBucket): rate limiter, if any.
+      decoder (pyicane.decoders.Decoder): JSON decoder of responses.
+      registry (boolean): if True, reference entities are looked up in the \
+                          module registry (see pyicane.registry).
+
+    """
+
+    def __init__(self, base_url=BASE_URL, pool_connections=10,
+                 pool_maxsize=10, pool_block=False, keep_alive=True,
+                 cache=None, single_flight=True, retry=None,
+                 rate_limiter=None, decoder='json', registry=True):
+        """Build a client and its pooled session.
+
+        Args:
+          base_url (str, optional): URL prepended to relative paths. \
+                                    Defaults to BASE_URL.
+          pool_connections (int, optional): number of per-host connection \
+                                            pools to keep. Defaults to 10.
+          pool_maxsize (int, optional): maximum number of connections kept \
+                                        alive per host. Defaults to 10.
+          pool_block (boolean, optional): if True, no more than pool_maxsize \
+                                          connections per host are opened \
+                                          at once and callers wait for a \
+                                          free one. Defaults to False.
+          keep_alive (boolean, optional): if False, connections are closed \
+                                          after every request. Defaults to \
+                                          True.
+          cache (pyicane.cache.ResponseCache, optional): cache where \
+              responses are stored and revalidated. Defaults to None.
+          single_flight (boolean, optional): if True, concurrent requests \
+                                             for the same URL wait for a \
+                                             single download and share its \
+                                             body, decoded once per \
+                                             caller. Defaults to True.
+          retry (pyicane.transport.RetryPolicy, optional): policy retrying \
+              transient failures. Defaults to None, i.e. no retries.
+          rate_limiter (pyicane.transport.TokenBucket, optional): limiter \
+              every request waits for. Defaults to None.
+          decoder (str, optional): name of the JSON decoder of responses, \
+                                   or 'auto' for the fastest one installed \
+                                   (see pyicane.decoders). Defaults to \
+                                   'json', i.e. the stdlib decoder.
+          registry (boolean, optional): if True, get() and find_all() of \
+                                        reference classes such as NodeType \
+                                        are answered by the module registry \
+                                        (see pyicane.registry), which loads \
+                                        each class with a single request. \
+                                        Defaults to True.
+
+        Raises:
+          ValueError: the decoder is not available.
+
+        """
+        self.base_url = base_url
+        self.decoder = get_decoder(decoder)
+        self.cache = cache
+        self.flights = SingleFlight() if single_flight else None
+        self.retry = retry
+        self.rate_limiter = rate_limiter
+        self.registry = registry
+        self.session = requests.Session()
+        self.session.headers['Accept'] = 'application/json'
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+        self.adapter = PoolingHTTPAdapter(pool_connections=pool_connections,
+                                          pool_maxsize=pool_maxsize,
+                                          pool_block=pool_block)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+    def url(self, path):
+        """Build the absolute URL to be requested for a given path. If no \
+           "http://" or "https://" protocol is specified, base_url is used.
+
+        Args:
+          path (str): The URI to be requested.
+
+        Returns:
+          url (str): absolute URL.
+
+        """
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return self.base_url + path
+
+    def label(self, url):
+        """Entity label of a URL, i.e. the first segment of its path relative \
+           to base_url, used to choose the cache time to live.
+
+        Args:
+          url (str): absolute URL.
+
+        Returns:
+          label (str): entity label, e.g. 'node-type', or None if the URL is \
+                       not under base_url.
+
+        """
+        if not url.startswith(self.base_url):
+            return None
+        return url[len(self.base_url):].split('?')[0].split('/')[0]
+
+    def send(self, url, **kwargs):
+        """Send a GET request through the session, waiting for the rate \
+           limiter and retrying transient failures if configured.
+
+        Args:
+          url (str): absolute URL.
+          **kwargs: keyword arguments of requests.Session.get().
+
+        Returns:
+          response (requests.Response): HTTP response.
+
+        """
+        def attempt():
+            """Send a single request."""
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            return self.session.get(url, **kwargs)
+
+        if self.retry is None:
+            return attempt()
+        return self.retry.run(attempt)
+
+    def fetch(self, url):
+        """Download the raw body of a URL. If a cache is configured, fresh \
+           cached responses are returned as they are and stale ones are \
+           revalidated with a conditional request.
+
+        Args:
+          url (str): absolute URL.
+
+        Returns:
+          body (str): raw response body.
+
+        Raises:
+          HTTPError: the HTTP error returned by the requested server.
+
+        """
+        if self.cache is None:
+            response = self.send(url)
+            response.raise_for_status()
+            return response.content
+        ttl = self.cache.ttl_for(self.label(url))
+        entry = self.cache.get(url) if ttl > 0 else None
+        if entry is not None and entry.is_fresh():
+            return entry.body
+        headers = entry.validators() if entry is not None else {}
+        response = self.send(url, headers=headers)
+        if entry is not None and response.status_code == 304:
+            self.cache.touch(url)
+            return entry.body
+        response.raise_for_status()
+        self.cache.put(url, response.content,
+                       response.headers.get('ETag'),
+                       response.headers.get('Last-Modified'), ttl)
+        return response.content
+
+    def validate_cache(self):
+        """Compare ICANE's data and metadata last-updated dates with the \
+           watermarks stored in the cache and invalidate it in bulk if \
+           anything has changed since they were stored.
+
+        Returns:
+          invalidated (boolean): True if cached responses were invalidated.
+
+        """
+        if self.cache is None:
+            return False
+        invalidated = False
+        for mixin in (Data, Metadata):
+            millis = int(str(self.request(mixin.label_ + '/' +
+                                          'last-updated')))
+            invalidated = self.cache.update_watermark(mixin.label_,
+                                                      millis) or invalidated
+        return invalidated
+
+    def download(self, url):
+        """Download the raw body of a URL (see fetch()), timing it."""
+        with instrumentation.span('request', url=url) as info:
+            body = self.fetch(url)
+            info['bytes'] = len(body)
+        return body
+
+    def decode(self, url, body):
+        """Deserialize the raw body of a URL, timing it."""
+        with instrumentation.span('parse', url=url, bytes=len(body)):
+            return self.decoder.loads(body)
+
+    def load(self, url):
+        """Download and deserialize a URL."""
+        return self.decode(url, self.download(url))
+
+    def request(self, path):
+        """Send a request to a given URL accepting JSON format and return a \
+           deserialized Python object. Concurrent requests for the same URL \
+           are coalesced into one if single_flight is enabled; the raw body \
+           is shared, but every caller decodes its own object.
+
+        Args:
+          path (str): The URI to be requested.
+
+        Returns:
+          response: Deserialized JSON Python object.
+
+        Raises:
+          HTTPError: the HTTP error returned by the requested server.
+          InvalidURL: an invalid URL has been requested.
+          Exception: generic exception.
+
+        """
+        url = self.url(path)
+        try:
+            if self.flights is None:
+                return self.load(url)
+            return self.decode(url, self.flights.run(
+                url, lambda: self.download(url)))
+        except requests.exceptions.HTTPError, exception:
+            LOGGER.error((inspect.stack()[0][3]) + ': HTTPError = ' +
+                         str(exception.response.status_code) + ' ' +
+                         str(exception.response.reason) + ' ' + str(path))
+            raise
+        except requests.exceptions.InvalidURL, exception:
+            LOGGER.error('URLError = ' + str(exception) + ' ' + str(path))
+            raise
+        except Exception:
+            import traceback
+            LOGGER.error('Generic exception: ' + traceback.format_exc())
+            raise
+
+    def stream(self, path):
+        """Send a request to a given URL accepting JSON format and return the \
+           undecoded response body as a file-like object, to be parsed as it \
+           is read from the socket. Fresh cached responses are served from \
+           the cache, but streamed responses are not stored in it. The \
+           returned object must be closed once read.
+
+        Args:
+          path (str): The URI to be requested.
+
+        Returns:
+          stream (file): file-like object with the response body.
+
+        Raises:
+          HTTPError: the HTTP error returned by the requested server.
+
+        """
+        url = self.url(path)
+        if self.cache is not None:
+            entry = self.cache.get(url)
+            if entry is not None and entry.is_fresh():
+                return StringIO(entry.body)
+        try:
+            response = self.send(url, stream=True)
+            response.raise_for_status()
+        except requests.exceptions.HTTPError, exception:
+            LOGGER.error((inspect.stack()[0][3]) + ': HTTPError = ' +
+                         str(exception.response.status_code) + ' ' +
+                         str(exception.response.reason) + ' ' + str(path))
+            raise
+        response.raw.decode_content = True
+        return response.raw
+
+    def pool_stats(self):
+        """Report connection reuse statistics.
+
+        Returns:
+          stats (dict): number of 'pools', 'requests' served, 'connections' \
+                        opened and 'reused' connections, i.e. requests that \
+                        did not need a new connection.
+
+        """
+        stats = self.adapter.pool_stats()
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        return stats
+
+    def close(self):
+        """Close the session and every pooled connection."""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+_CLIENT = None
+
+
+def get_client():
+    """Return the client used by module functions and entity classes, \
+       building a default one on first use.
+
+    Returns:
+      client (Client): the module client.
+
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = Client()
+    return _CLIENT
+
+
+def set_client(client):
+    """Replace the client used by module functions and entity classes.
+
+    Args:
+      client (Client): the new module client. If None, a default one will \
+                       be built on next use.
+
+    """
+    global _CLIENT
+    _CLIENT = client
+
+
 def request(path):
     """Send a request to a given URL accepting JSON format and return a \
        deserialized Python object. If no "http://" protocol is specified, \
-       BASE_URL is used in the request.
+       BASE_URL is used in the request. Requests are sent through the \
+       pooled session of the module client (see get_client()).
 
     Args:
       path (str): The URI to be requested.
@@ -43,28 +506,152 @@ def request(path):
       Exception: generic exception.
 
     """
-    headers = {'Accept': 'application/json'}
+    return get_client().request(path)
+
+
+def replace_file(source, destination):
+    """Rename source to destination, replacing it if it exists. os.rename() \
+       fails on Windows if the destination exists, so it is removed first \
+       there, at the cost of atomicity.
+
+    Args:
+      source (str): path of the file to be renamed, e.g. a temporary one.
+      destination (str): path of the file to be replaced.
+
+    """
+    if os.name == 'nt' and os.path.exists(destination):
+        os.remove(destination)
+    os.rename(source, destination)
+
+
+class Result(object):
+    """Outcome of a single item of a batch run by fetch_many().
+
+    Attributes:
+      item: the processed item.
+      value: value returned for the item, None if an error was raised.
+      error (Exception): exception raised for the item, None on success.
+
+    """
+
+    __slots__ = ('item', 'value', 'error')
+
+    def __init__(self, item, value=None, error=None):
+        self.item = item
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        """True if no error was raised for the item."""
+        return self.error is None
+
+    def __repr__(self):
+        return 'Result(%r, %r, %r)' % (self.item, self.value, self.error)
+
+
+def fetch_many(function, items, max_workers=8, ordered=True):
+    """Apply function to every item in a pool of threads. Threads share the \
+       pooled session of the module client, so many requests can be waited \
+       for at once. Errors are captured per item and do not abort the batch.
+
+    Args:
+      function (callable): function taking a single item, e.g. \
+                           TimeSeries.get or Category.get.
+      items (iterable): items to be processed, e.g. uri_tags.
+      max_workers (int, optional): number of threads. It should not exceed \
+                                   the pool_maxsize of the module client, or \
+                                   connections will not be reused. Defaults \
+                                   to 8.
+      ordered (boolean, optional): if True, results are yielded in the order \
+                                   of items; otherwise, as they complete. \
+                                   Defaults to True.
+
+    Yields:
+      Result objects. At most 2 * max_workers items are in flight, and \
+      results are not kept once yielded, so memory does not grow with the \
+      number of items. If the generator is closed early, pending items are \
+      cancelled without waiting for the running ones.
+
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    items = iter(items)
+    window = 2 * max_workers
+    pending = OrderedDict()  # future: item, in submission order
     try:
-        if path.startswith("http://"):
-            requested_object = requests.get(path, headers=headers)
-        else:
-            requested_object = requests.get(BASE_URL + path, headers=headers)
-        requested_object.raise_for_status()
-    except requests.exceptions.HTTPError, exception:
-        LOGGER.error((inspect.stack()[0][3]) + ': HTTPError = ' +
-                     str(exception.response.status_code) + ' ' +
-                     str(exception.response.reason) + ' ' + str(path))
-        raise
-    except requests.exceptions.InvalidURL, exception:
-        LOGGER.error('URLError = ' + str(exception.reason) + ' ' + str(path))
-        raise
-    except Exception:
-        import traceback
-        LOGGER.error('Generic exception: ' + traceback.format_exc())
-        raise
-    else:
-        response = requested_object.json(object_pairs_hook=OrderedDict)
-        return response
+        while True:
+            for item in items:
+                pending[executor.submit(function, item)] = item
+                if len(pending) >= window:
+                    break
+            if not pending:
+                return
+            if ordered:
+                future = next(iter(pending))
+            else:
+                future = next(iter(wait(pending,
+                                        return_when=FIRST_COMPLETED)[0]))
+            item = pending.pop(future)
+            error = future.exception()
+            if error is not None:
+                LOGGER.warning('fetch_many: ' + repr(item) + ' ' +
+                               repr(error))
+                result = Result(item, error=error)
+            else:
+                result = Result(item, future.result())
+            del future  # so that the consumer owns the only reference
+            yield result
+            del result
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+# Columns of a node digest, in node_digest_model() order.
+NODE_DIGEST_COLUMNS = ('id', 'title', 'nodeType', 'active', 'acronym', 'uri',
+                       'metadataUri', 'resourceUri', 'documentation',
+                       'methodology', 'mapScope', 'referenceResources',
+                       'description', 'theme', 'language', 'publisher',
+                       'license', 'topics', 'automatizedTopics', 'uriTag',
+                       'uriTagEs', 'initialPeriodDescription',
+                       'finalPeriodDescription', 'dataUpdate', 'dateCreated',
+                       'lastUpdated', 'subsection', 'section', 'category',
+                       'dataset', 'periodicty', 'referenceArea', 'sources',
+                       'measures', 'apiUris')
+
+# Node types whose children are not flattened.
+LEAF_NODE_TYPES = frozenset(['time-series', 'non-olap-native', 'document'])
+
+# Columns of a node digest holding dates, as epoch milliseconds in the API.
+DATE_COLUMNS = ('dataUpdate', 'dateCreated', 'lastUpdated')
+
+
+class NodeDigest(namedtuple('NodeDigest', NODE_DIGEST_COLUMNS)):
+    """Relevant metadata fields of a node, as returned by \
+       node_digest_model(). A compact tuple indexable both by position and \
+       by NODE_DIGEST_COLUMNS name."""
+
+    __slots__ = ()
+
+
+def digests_to_dataframe(digests):
+    """Convert node digests into a pandas.DataFrame object, building its \
+       columns directly.
+
+    Args:
+      digests (iterable): NodeDigest objects, e.g. from flatten_metadata().
+
+    Returns:
+      Python Pandas Dataframe with NODE_DIGEST_COLUMNS columns.
+
+    """
+    columns = zip(*digests)
+    if not columns:
+        return pd.DataFrame(columns=NODE_DIGEST_COLUMNS)
+    with instrumentation.span('dataframe', rows=len(columns[0])):
+        return pd.DataFrame(OrderedDict(zip(NODE_DIGEST_COLUMNS, columns)),
+                            columns=NODE_DIGEST_COLUMNS)
 
 
 def acronym(node):
@@ -75,23 +662,35 @@ def acronym(node):
         return ''
 
 
-def node_digest_model(node):
+def format_millis(millis):
+    """Format epoch milliseconds as a dd/mm/YYYY date in local time."""
+    return datetime.fromtimestamp(int(str(millis)[0:-3])).strftime('%d/%m/%Y')
+
+
+def node_digest_model(node, timestamps=False):
     """Extracts plain relevant metadata fields only. Relevant metadata has \
        been selected by ICANE's technical staff.
 
     Args:
       node(dict): a dictionary generated by the ''request()'' function \
                   containing nested TimeSeries objects.
+      timestamps (boolean, optional): if True, DATE_COLUMNS are kept as \
+                                      epoch milliseconds (None if missing) \
+                                      instead of being formatted as \
+                                      dd/mm/YYYY. Defaults to False.
     Returns:
-      List of relevant time-series metadata fields with the intention of \
-      using them to populate a CSV row.
+      NodeDigest of relevant time-series metadata fields with the intention \
+      of using them to populate a CSV row.
 
     """
 
-    if node.dataUpdate is None:
-        data_update = '0000'
+    if timestamps:
+        dates = (node.dataUpdate, node.dateCreated, node.lastUpdated)
     else:
-        data_update = node.dataUpdate
+        dates = (format_millis('0000' if node.dataUpdate is None
+                               else node.dataUpdate),
+                 format_millis(node.dateCreated),
+                 format_millis(node.lastUpdated))
 
     if node.dataSet is None:
         dataset_title = ''
@@ -110,82 +709,212 @@ def node_digest_model(node):
     else:
         sources_label = node.sources[0].label
 
-    return [node.id, node.title, node.nodeType.title, node.active,
-            acronym(node), node.uri, node.metadataUri, node.resourceUri,
-            node.documentation,
-            node.methodology,
-            node.mapScope, node.referenceResources,
-            node.description, node.theme, node.language,
-            node.publisher, node.license, node.topics,
-            node.automatizedTopics, node.uriTag, node.uriTagEs,
-            node.initialPeriodDescription,
-            node.finalPeriodDescription,
-            datetime.fromtimestamp(int(str(data_update)[0:-3])).
-            strftime('%d/%m/%Y'),
-            datetime.fromtimestamp(int(str(node.dateCreated)[0:-3])).
-            strftime('%d/%m/%Y'),
-            datetime.fromtimestamp(int(str(node.lastUpdated)[0:-3])).
-            strftime('%d/%m/%Y'),
-            node.subsection.title,
-            node.subsection.section.title,
-            node.category.title, dataset_title,
-            periodicity_title,
-            reference_area_title, sources_label,
-            str(', '.join([': '.join((x.title.encode('utf-8'),
-                                      x.unit.encode('utf-8'))) for x in
-                           node.measures])),
-            str([', '.join((x.uri, '')) for x in node.apiUris])]
-
-
-def flatten_metadata(data):
+    return NodeDigest(
+        node.id, node.title, node.nodeType.title, node.active,
+        acronym(node), node.uri, node.metadataUri, node.resourceUri,
+        node.documentation,
+        node.methodology,
+        node.mapScope, node.referenceResources,
+        node.description, node.theme, node.language,
+        node.publisher, node.license, node.topics,
+        node.automatizedTopics, node.uriTag, node.uriTagEs,
+        node.initialPeriodDescription,
+        node.finalPeriodDescription,
+        dates[0], dates[1], dates[2],
+        node.subsection.title,
+        node.subsection.section.title,
+        node.category.title, dataset_title,
+        periodicity_title,
+        reference_area_title, sources_label,
+        str(', '.join([': '.join((x.title.encode('utf-8'),
+                                  x.unit.encode('utf-8'))) for x in
+                       node.measures])),
+        str([', '.join((x.uri, '')) for x in node.apiUris]))
+
+
+def node_filter(node_types=None, active=None, periodicities=None,
+                since=None, until=None, date='lastUpdated'):
+    """Build a predicate matching nodes that meet every given condition, \
+       e.g. to select or prune nodes in flatten_metadata().
+
+    Args:
+      node_types (iterable, optional): node type uri_tags, e.g. \
+                                       ['time-series'].
+      active (boolean, optional): value of the active flag.
+      periodicities (iterable, optional): periodicity uri_tags, e.g. \
+                                          ['quarterly']. Nodes without \
+                                          periodicity do not match.
+      since (int, optional): earliest date, in milliseconds, inclusive.
+      until (int, optional): latest date, in milliseconds, exclusive.
+      date (str, optional): date compared with since and until, one of \
+                            DATE_COLUMNS. Nodes without it do not match. \
+                            Defaults to 'lastUpdated'.
+
+    Returns:
+      predicate (callable): function of a node returning a boolean.
+
+    Raises:
+      ValueError: date is not one of DATE_COLUMNS.
+
+    """
+    if date not in DATE_COLUMNS:
+        raise ValueError('Not a date column: ' + repr(date))
+    if node_types is not None:
+        node_types = frozenset(node_types)
+    if periodicities is not None:
+        periodicities = frozenset(periodicities)
+
+    def predicate(node):
+        """Whether a node meets every condition."""
+        if node_types is not None and \
+                node.nodeType.uriTag not in node_types:
+            return False
+        if active is not None and node.active != active:
+            return False
+        if periodicities is not None and \
+                (node.periodicity is None or
+                 node.periodicity.uriTag not in periodicities):
+            return False
+        if since is not None or until is not None:
+            millis = node[date]
+            if millis is None or (since is not None and millis < since) or \
+                    (until is not None and millis >= until):
+                return False
+        return True
+
+    return predicate
+
+
+def flatten_metadata(data, timestamps=False, where=None, prune=None,
+                     columns=None):
     """Flatten a nested dict or list of nested dicts generated from a \
-       deserialized JSON object provided by ICANE's Restful metadata API.
+       deserialized JSON object provided by ICANE's Restful metadata API. \
+       Nodes are visited depth-first, parents before their children, with \
+       an explicit stack; children of 'time-series', 'non-olap-native' and \
+       'document' nodes are not visited.
 
     Args:
       data (dict): a dictionary or list of dictionaries containing nested \
                    TimeSeries objects.
+      timestamps (boolean, optional): if True, dates are kept as epoch \
+                                      milliseconds (see \
+                                      node_digest_model()). Defaults to False.
+      where (callable, optional): predicate of the nodes to be digested; \
+                                  the others are visited but not digested. \
+                                  See node_filter(). Defaults to None.
+      prune (callable, optional): predicate of the nodes to be skipped \
+                                  together with their whole subtrees, e.g. \
+                                  node_filter(active=False). Defaults to \
+                                  None.
+      columns (list, optional): NODE_DIGEST_COLUMNS names to be yielded, \
+                                in order. Defaults to None, i.e. all of \
+                                them.
     Yields:
-      Python List of node_digest_model elements: A list with the most \
-                                                 relevant metadata for a \
-                                                 given node or list of nodes \
-                                                 with node type equal to \
-                                                 'time-series', 'document' or \
-                                                 'olap-native' in flattened \
-                                                 format.
-    """
-    if isinstance(data, list):
-        for node in data:
-            if node.nodeType.uriTag in ['time-series',
-                                        'non-olap-native',
-                                        'document']:  # leaf node
-                yield node_digest_model(node)
+      NodeDigest of every visited node, or a tuple of the selected columns.
 
+    Raises:
+      ValueError: a column is not one of NODE_DIGEST_COLUMNS.
+
+    """
+    indexes = None
+    if columns is not None:
+        indexes = [NODE_DIGEST_COLUMNS.index(column) for column in columns]
+    stack = [data] if isinstance(data, dict) else list(reversed(data))
+    while stack:
+        node = stack.pop()
+        if prune is not None and prune(node):
+            continue
+        if where is None or where(node):
+            digest = node_digest_model(node, timestamps)
+            if indexes is None:
+                yield digest
             else:
-                yield node_digest_model(node)
-                for child in flatten_metadata(node.children):
-                    yield child
-    elif isinstance(data, dict):
-        if data.nodeType.uriTag in ['time-series',
-                                    'non-olap-native',
-                                    'document']:  # leaf node
-            yield node_digest_model(data)
+                yield tuple(digest[index] for index in indexes)
+        if node.nodeType.uriTag not in LEAF_NODE_TYPES:
+            stack.extend(reversed(node.children))
 
-        else:
-            yield node_digest_model(data)
-            for child in flatten_metadata(data.children):
-                yield child
+
+def millis_to_dates(millis, parse_dates=True):
+    """Convert a column of epoch milliseconds in a single vectorized pass.
+
+    Args:
+      millis (sequence): epoch milliseconds; None if missing.
+      parse_dates (boolean, optional): if True, dates are converted to \
+                                       datetime64 (UTC, NaT if missing); \
+                                       otherwise to dd/mm/YYYY strings in \
+                                       local time, as node_digest_model() \
+                                       formats them. Defaults to True.
+
+    Returns:
+      numpy array of datetime64 values or strings.
+
+    """
+    millis = pd.to_numeric(np.array(millis, dtype=object), errors='coerce')
+    if parse_dates:
+        return pd.to_datetime(millis, unit='ms').values
+    seconds = np.nan_to_num(millis).astype(np.int64) // 1000
+    # nodes share few distinct dates, so only those are formatted
+    uniques, inverse = np.unique(seconds, return_inverse=True)
+    formatted = np.array([datetime.fromtimestamp(second).strftime('%d/%m/%Y')
+                          for second in uniques], dtype=object)
+    return formatted[inverse]
+
+
+def metadata_frame(data, parse_dates=True, where=None, prune=None,
+                   columns=None):
+    """Build the metadata digest data frame of a node or list of nodes in \
+       bulk: nodes are digested keeping their raw epoch milliseconds, which \
+       are converted column by column instead of node by node.
+
+    Args:
+      data (dict): a dictionary or list of dictionaries containing nested \
+                   TimeSeries objects.
+      parse_dates (boolean, optional): if True, DATE_COLUMNS are datetime64 \
+                                       columns (UTC); if False, they hold \
+                                       dd/mm/YYYY strings, as \
+                                       digests_to_dataframe() builds them. \
+                                       Defaults to True.
+      where (callable, optional): predicate of the nodes to be digested \
+                                  (see flatten_metadata()).
+      prune (callable, optional): predicate of the subtrees to be skipped \
+                                  (see flatten_metadata()).
+      columns (list, optional): NODE_DIGEST_COLUMNS names of the data \
+                                frame. Defaults to None, i.e. all of them.
+
+    Returns:
+      Python Pandas Dataframe with the selected columns.
+
+    Raises:
+      ValueError: columns is empty or a column is not one of \
+                  NODE_DIGEST_COLUMNS.
+
+    """
+    names = tuple(columns) if columns is not None else NODE_DIGEST_COLUMNS
+    if not names:
+        raise ValueError('At least one column must be selected')
+    values = zip(*flatten_metadata(data, True, where, prune, columns))
+    if not values:
+        values = [()] * len(names)
+    values = OrderedDict(zip(names, values))
+    for name in DATE_COLUMNS:
+        if name in values:
+            values[name] = millis_to_dates(values[name], parse_dates)
+    with instrumentation.span('dataframe', rows=len(values[names[0]])):
+        return pd.DataFrame(values, columns=names)
 
 
 def flatten_data(data, record=None):
     """Flatten a nested dict generated from a deserialized JSON object \
-       provided by ICANE's Restful data API.
+       provided by ICANE's Restful data API. The nested dict is walked \
+       with an explicit stack of iterators, one per dimension, so rows are \
+       streamed as they are found and memory is bounded by the depth of the \
+       data cube instead of its size.
 
     Args:
       data (dict): a dictionary generated by the ''request()'' function with \
                    ICANE's API time-series data.
-      record (list, optional): list of values representing a row. \
-                                It's used within the recursive calls to the \
-                                method. Defaults to None.
+      record (list, optional): list of values prepended to every row when \
+                               flattening a nested level. Defaults to None.
 
     Yields:
       row (list): A list representing a row in a flattened matrix.
@@ -193,23 +922,732 @@ def flatten_data(data, record=None):
     """
 
     if data.get('data'):  # first level
+        data = data['data']
         record = []
-        for j in list(flatten_data(data['data'], record)):
-            yield j
-    else:  # other levels
-        for k in list(data):
-            if isinstance(data[k], dict):
-                record.append(k)
-                for i in list(flatten_data(data[k], record)):
-                    yield i
-            else:  # last level
-
-                row = list(record)
-                row.append(k)
-                row.append(data[k])
-                yield row
-        if len(record) != 0:
-            record.pop()
+    record = list(record) if record else []
+    stack = [data.iteritems()]
+    while stack:
+        for key, value in stack[-1]:
+            if isinstance(value, dict):  # next level
+                record.append(key)
+                stack.append(value.iteritems())
+                break
+            row = list(record)  # last level
+            row.append(key)
+            row.append(value)
+            yield row
+        else:  # level exhausted
+            stack.pop()
+            if stack:
+                record.pop()
+
+
+def count_data_rows(data, depth=None):
+    """Count the rows of a nested dict provided by ICANE's Restful data API, \
+       without flattening it.
+
+    Args:
+      data (dict): the nested 'data' dict of a data resource.
+      depth (int, optional): number of dimensions, i.e. headers, of the \
+                             data. If given, dicts at the last level are \
+                             counted without looking at their values. \
+                             Defaults to None.
+
+    Returns:
+      count (int): number of rows of the flattened matrix.
+
+    """
+    count = 0
+    stack = [(data, 1)]
+    while stack:
+        node, level = stack.pop()
+        if level == depth:
+            count += len(node)
+            continue
+        for value in node.itervalues():
+            if isinstance(value, dict):
+                stack.append((value, level + 1))
+            else:
+                count += 1
+    return count
+
+
+def label_matcher(condition):
+    """Build a predicate of the labels of a dimension from a condition.
+
+    Args:
+      condition: a label, an iterable of labels (years may be given as \
+                 ints), a slice of labels with both ends included, e.g. \
+                 slice(1990, 2000) (labels are compared as numbers if the \
+                 ends are, and those that are not numbers never match), or \
+                 a predicate of labels.
+
+    Returns:
+      predicate (callable): function of a label returning a boolean.
+
+    Raises:
+      ValueError: the condition is a slice with a step.
+
+    """
+    if isinstance(condition, slice):
+        start, stop = condition.start, condition.stop
+        if condition.step is not None:
+            raise ValueError('Label slices do not have steps: ' +
+                             repr(condition))
+        end = start if start is not None else stop
+        convert = type(end) if isinstance(end, (int, long, float)) else None
+
+        def in_range(label):
+            """Whether a label is within the slice."""
+            if convert is not None:
+                try:
+                    label = convert(label)
+                except ValueError:
+                    return False
+            return (start is None or label >= start) and \
+                (stop is None or label <= stop)
+
+        return in_range
+    if callable(condition):
+        return condition
+    if isinstance(condition, basestring):
+        condition = [condition]
+    return frozenset(unicode(label) if isinstance(label, (int, long))
+                     else label for label in condition).__contains__
+
+
+def slice_data(resource, where):
+    """Select the rows of a deserialized data resource whose labels meet a \
+       condition per dimension, walking only the matching branches of its \
+       nested dict. Branches below the last filtered dimension are shared \
+       with the resource, not copied.
+
+    Args:
+      resource (dict): a dictionary generated by the ''request()'' function \
+                       with ICANE's API time-series data.
+      where (dict): conditions by header, e.g. \
+                    {u'Municipios': u' 39047 - Noja', \
+                    u'Año': slice(1990, 2000)}; see label_matcher().
+
+    Returns:
+      resource (OrderedDict): data resource with the selected rows only. \
+                              Rows lacking a filtered dimension are dropped.
+
+    Raises:
+      ValueError: a header of the conditions is not in the resource.
+
+    """
+    headers = list(resource['headers'])
+    matchers = [None] * len(headers)
+    for header, condition in where.items():
+        if header not in headers:
+            raise ValueError('Not a header of the data: ' + repr(header))
+        matchers[headers.index(header)] = label_matcher(condition)
+    deepest = max([level for level, matcher in enumerate(matchers)
+                   if matcher is not None] or [-1])
+
+    def walk(node, level):
+        """Matching branches of a level of the nested dict."""
+        matcher = matchers[level]
+        sliced = OrderedDict()
+        for key, value in node.iteritems():
+            if matcher is not None and not matcher(key):
+                continue
+            if level < deepest:
+                if not isinstance(value, dict):  # row lacks a dimension
+                    continue
+                value = walk(value, level + 1)
+                if not value:
+                    continue
+            sliced[key] = value
+        return sliced
+
+    sliced = OrderedDict(resource.items())
+    if deepest >= 0:
+        sliced['data'] = walk(resource['data'], 0)
+    return sliced
+
+
+# Types of values stored as float64 by data_columns(); None becomes NaN.
+NUMBER_TYPES = frozenset([int, long, float, type(None)])
+
+
+def data_columns(resource):
+    """Convert a deserialized JSON object provided by ICANE's Restful data \
+       API into columns: dimension labels are encoded as categorical codes \
+       and values are stored in a float64 array, both preallocated from the \
+       number of rows of the data cube, so no per-row objects are built.
+
+    Args:
+      resource (dict): a dictionary generated by the ''request()'' function \
+                       with ICANE's API time-series data.
+
+    Returns:
+      (dimensions, values) tuple: list of pandas.Categorical objects, one \
+                                  per header, and numpy array of values. \
+                                  Values fall back to object dtype if the \
+                                  data contains non numeric values.
+
+    Raises:
+      ValueError: the data is nested deeper than its headers.
+
+    """
+    headers = list(resource['headers'])
+    last = len(headers) - 1
+    data = resource['data']
+    rows = count_data_rows(data, len(headers))
+    codes = np.empty((len(headers), rows), dtype=np.int32)
+    codes.fill(-1)
+    values = np.empty(rows, dtype=np.float64)
+    lookups = [{} for _ in headers]
+
+    def encode(level, labels):
+        """Codes of the given labels of a dimension, in order of appearance."""
+        lookup = lookups[level]
+        label_codes = map(lookup.get, labels)
+        if None in label_codes:
+            for i, label in enumerate(labels):
+                if label_codes[i] is None:
+                    label_codes[i] = lookup.setdefault(label, len(lookup))
+        return label_codes
+
+    def store(values, start, items):
+        """Store values, switching to object dtype if they are not numbers, \
+           so that strings and booleans are kept as they are instead of \
+           being cast to float."""
+        if values.dtype != object and not all(type(item) in NUMBER_TYPES
+                                              for item in items):
+            if any(isinstance(item, dict) for item in items):
+                raise ValueError('Data is nested deeper than its headers: ' +
+                                 repr(headers))
+            values = values.astype(object)
+        values[start:start + len(items)] = items
+        return values
+
+    starts = []  # (code, first row) of the labels being walked
+    stack = [data.iteritems()] if last > 0 else []
+    row = 0
+    while stack:
+        level = len(stack) - 1
+        for key, value in stack[-1]:
+            code = encode(level, (key,))[0]
+            if isinstance(value, dict) and level + 1 == last:  # last level
+                labels = list(value)
+                size = len(labels)
+                codes[level, row:row + size] = code
+                codes[last, row:row + size] = encode(last, labels)
+                values = store(values, row, map(value.__getitem__, labels))
+                row += size
+            elif isinstance(value, dict):  # next level
+                starts.append((code, row))
+                stack.append(value.iteritems())
+                break
+            else:  # shallower row
+                codes[level, row] = code
+                values = store(values, row, [value])
+                row += 1
+        else:  # level exhausted
+            stack.pop()
+            if starts:
+                code, start = starts.pop()
+                codes[len(stack) - 1, start:row] = code
+    if last == 0:
+        labels = list(data)
+        codes[0] = encode(0, labels)
+        values = store(values, 0, map(data.__getitem__, labels))
+    dimensions = [pd.Categorical.from_codes(codes[i],
+                                            sorted(lookups[i],
+                                                   key=lookups[i].get))
+                  for i in range(len(headers))]
+    return dimensions, values
+
+
+def stream_data_columns(stream):
+    """Incrementally parse a JSON data resource provided by ICANE's Restful \
+       data API from a file-like object, encoding rows into columns as they \
+       arrive. Neither the JSON text nor the nested dict are ever held in \
+       memory: only the growing columns are. Requires the ijson package.
+
+    Args:
+      stream (file): file-like object with the JSON data resource, e.g. the \
+                     one returned by ''Client.stream()''.
+
+    Returns:
+      (headers, dimensions, values) tuple: list of headers, list of \
+                                           pandas.Categorical objects, one \
+                                           per header, and numpy array of \
+                                           values.
+
+    Raises:
+      ImportError: ijson is not installed.
+
+    """
+    if ijson is None:
+        raise ImportError('Streaming data requires the ijson package')
+    headers = []
+    codes = []  # array of codes per dimension
+    lookups = []
+    values = array('d')
+    path = []  # codes of the labels being walked
+    rows = 0
+    depth = 0  # nesting of JSON objects
+    section = None
+    for event, value in ijson.basic_parse(stream):
+        if event == 'map_key':
+            if depth == 1:
+                section = value
+            elif section == 'data':
+                level = depth - 2
+                del path[level:]
+                if level == len(lookups):  # new dimension
+                    lookups.append({})
+                    codes.append(array('i', [-1]) * rows)
+                lookup = lookups[level]
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(lookup)
+                path.append(code)
+        elif event == 'start_map':
+            depth += 1
+        elif event == 'end_map':
+            depth -= 1
+        elif section == 'headers' and depth == 1:
+            if event == 'string':
+                headers.append(value)
+        elif section == 'data' and depth >= 2:  # last level
+            for level, column in enumerate(codes):
+                column.append(path[level] if level < len(path) else -1)
+            if event == 'number':
+                value = float(value)
+            elif event == 'null':
+                value = np.nan
+            elif isinstance(values, array):
+                values = list(values)
+            values.append(value)
+            rows += 1
+    if len(codes) > len(headers):
+        raise ValueError('Data is nested deeper than its headers: ' +
+                         repr(headers))
+    while len(codes) < len(headers):
+        lookups.append({})
+        codes.append(array('i', [-1]) * rows)
+    dimensions = [pd.Categorical.from_codes(
+        np.frombuffer(column, dtype=np.int32) if rows else
+        np.empty(0, dtype=np.int32),
+        sorted(lookup, key=lookup.get))
+        for column, lookup in zip(codes, lookups)]
+    if isinstance(values, array):
+        values = np.frombuffer(values, dtype=np.float64) if rows else \
+            np.empty(0, dtype=np.float64)
+    else:
+        values = np.array(values, dtype=object)
+    return headers, dimensions, values
+
+
+def columns_data_frame(headers, dimensions, values, multi_index=False):
+    """Build a pandas.DataFrame object from data columns. Default index will \
+       be the temporal dimension if exists; if not, the municipality \
+       dimension will be chosen. The rest of dimensions are categorical \
+       columns.
+
+    Args:
+      headers (list): dimension names.
+      dimensions (list): pandas.Categorical objects, one per header.
+      values (numpy.ndarray): values.
+      multi_index (boolean, optional): if True, every dimension is a level \
+                                       of a MultiIndex and 'Valor' is the \
+                                       only column. Defaults to False.
+
+    Returns:
+      Python Pandas Dataframe.
+
+    """
+    if multi_index:
+        return pd.DataFrame({unicode('Valor'): values},
+                            index=pd.MultiIndex.from_arrays(dimensions,
+                                                            names=headers))
+    index = None
+    for element in headers:
+        if element.encode('utf-8') in ['Año', 'Trimestre', 'Mes']:
+            index = element
+        elif element == 'Municipios' and index is None:
+            index = element
+    columns = OrderedDict()
+    for header, dimension in zip(headers, dimensions):
+        if header != index:
+            columns[header] = dimension
+    columns[unicode('Valor')] = values
+    if index is None:
+        return pd.DataFrame(columns, columns=list(columns))
+    dimension = dimensions[headers.index(index)]
+    return pd.DataFrame(columns, columns=list(columns),
+                        index=pd.Index(np.asarray(dimension), name=index))
+
+
+def data_frame(resource, multi_index=False, where=None):
+    """Convert a deserialized JSON object provided by ICANE's Restful data \
+       API into a pandas.DataFrame object. Default index will be the \
+       temporal dimension if exists; if not, the municipality dimension will \
+       be chosen. The rest of dimensions are categorical columns.
+
+    Args:
+      resource (dict): a dictionary generated by the ''request()'' function \
+                       with ICANE's API time-series data.
+      multi_index (boolean, optional): if True, every dimension is a level \
+                                       of a MultiIndex and 'Valor' is the \
+                                       only column. Defaults to False.
+      where (dict, optional): conditions by header selecting the rows to be \
+                              flattened (see slice_data()). Defaults to \
+                              None, i.e. every row.
+
+    Returns:
+      Python Pandas Dataframe.
+
+    """
+    with instrumentation.span('flatten') as info:
+        if where:
+            resource = slice_data(resource, where)
+        dimensions, values = data_columns(resource)
+        info['rows'] = len(values)
+    with instrumentation.span('dataframe', rows=len(values)):
+        return columns_data_frame(list(resource['headers']), dimensions,
+                                  values, multi_index)
+
+
+def stream_data_frame(stream, multi_index=False):
+    """Incrementally parse a JSON data resource provided by ICANE's Restful \
+       data API into a pandas.DataFrame object (see data_frame()). Requires \
+       the ijson package.
+
+    Args:
+      stream (file): file-like object with the JSON data resource.
+      multi_index (boolean, optional): if True, every dimension is a level \
+                                       of a MultiIndex and 'Valor' is the \
+                                       only column. Defaults to False.
+
+    Returns:
+      Python Pandas Dataframe.
+
+    """
+    with instrumentation.span('flatten') as info:
+        headers, dimensions, values = stream_data_columns(stream)
+        info['rows'] = len(values)
+    with instrumentation.span('dataframe', rows=len(values)):
+        return columns_data_frame(headers, dimensions, values, multi_index)
+
+
+class DataDelta(object):
+    """Outcome of merging a new data resource into a data frame.
+
+    Attributes:
+      frame (pandas.DataFrame): the merged data frame.
+      changed (pandas.DataFrame): rows added or whose value changed, laid \
+                                  out as the merged data frame.
+      removed (pandas.MultiIndex): dimension paths, i.e. labels in headers \
+                                   order, of the rows no longer in the data.
+
+    """
+
+    __slots__ = ('frame', 'changed', 'removed')
+
+    def __init__(self, frame, changed, removed):
+        self.frame = frame
+        self.changed = changed
+        self.removed = removed
+
+    @property
+    def empty(self):
+        """True if no row was added, changed or removed."""
+        return len(self.changed) == 0 and len(self.removed) == 0
+
+    def __repr__(self):
+        return 'DataDelta(%d changed, %d removed)' % (len(self.changed),
+                                                      len(self.removed))
+
+
+def frame_paths(frame, headers):
+    """Dimension paths of the rows of a data frame built by data_frame().
+
+    Args:
+      frame (pandas.DataFrame): data frame, with or without multi_index.
+      headers (list): dimension names, outermost first.
+
+    Returns:
+      pandas.MultiIndex of the labels of every row, in headers order.
+
+    """
+    if isinstance(frame.index, pd.MultiIndex):
+        return frame.index.reorder_levels(headers)
+    return pd.MultiIndex.from_arrays(
+        [frame.index if header == frame.index.name else frame[header]
+         for header in headers], names=headers)
+
+
+def label_codes(level, dimension):
+    """Codes of the labels of some rows among old labels; labels new to \
+       them get codes after the old ones.
+
+    Args:
+      level (pandas.Index): old labels.
+      dimension (pandas.Categorical): labels of the rows.
+
+    Returns:
+      (codes, unseen) tuple: numpy array of the code of every row, -1 if \
+                             missing, and pandas.Index of the new labels, \
+                             in code order.
+
+    """
+    mapping = level.get_indexer(dimension.categories)
+    unseen = mapping < 0
+    if not unseen.any() and \
+            (mapping == np.arange(len(mapping))).all():  # same labels
+        return dimension.codes, dimension.categories[unseen]
+    mapping[unseen] = len(level) + np.arange(unseen.sum())
+    return (np.append(mapping, -1).astype(np.int32)[dimension.codes],
+            dimension.categories[unseen])
+
+
+def path_positions(codes, levels, dimensions):
+    """Positions of new rows among old ones with the same dimension path. \
+       Labels of every dimension are mapped to the codes of the old ones, \
+       so that paths are matched as integers instead of tuples of labels: \
+       through a lookup table if there are few possible paths, otherwise \
+       through a hash table.
+
+    Args:
+      codes (list): arrays of old label codes, one per dimension.
+      levels (list): pandas.Index objects of old labels, one per dimension.
+      dimensions (list): pandas.Categorical objects of the new rows.
+
+    Returns:
+      numpy array of the position of every new row in the old ones, -1 if \
+      its path is new.
+
+    """
+    new_codes = [label_codes(level, dimension)
+                 for level, dimension in zip(levels, dimensions)]
+    sizes = [len(level) + len(unseen) + 1  # -1 codes, i.e. no label
+             for level, (_, unseen) in zip(levels, new_codes)]
+    radix = np.prod(sizes, dtype=float)
+    if radix >= 2 ** 63:
+        raise ValueError('Too many dimension paths to be matched')
+    dtype = np.int32 if radix < 2 ** 31 else np.int64
+    old_keys = np.zeros(len(codes[0]) if codes else 0, dtype=dtype)
+    new_keys = np.zeros(len(dimensions[0]) if dimensions else 0,
+                        dtype=dtype)
+    for size, old_codes, (path_codes, _) in zip(sizes, codes, new_codes):
+        for keys, key_codes in ((old_keys, old_codes),
+                                (new_keys, path_codes)):
+            keys *= size  # in place, without temporary key arrays
+            keys += key_codes
+            keys += 1
+    if radix <= 4 * (len(old_keys) + len(new_keys)):
+        table = np.full(int(radix), -1, dtype=dtype)
+        table[old_keys] = np.arange(len(old_keys), dtype=dtype)
+        return table[new_keys]
+    return pd.Index(old_keys.astype(np.int64)).get_indexer(new_keys)
+
+
+def append_labels(codes, level, rows, dimension):
+    """Codes of some old rows followed by those of new ones.
+
+    Args:
+      codes (numpy.ndarray): old label codes.
+      level (pandas.Index): old labels.
+      rows (numpy.ndarray): positions of the old rows to be kept; None \
+                            keeps every row.
+      dimension (pandas.Categorical): labels of the new rows.
+
+    Returns:
+      (codes, level) tuple: numpy array of label codes and pandas.Index of \
+                            the old labels followed by the new ones.
+
+    """
+    new_codes, unseen = label_codes(level, dimension)
+    level = level.append(unseen)
+    if len(level) < np.iinfo(codes.dtype).max:  # keep narrow codes
+        new_codes = new_codes.astype(codes.dtype)
+    return (np.concatenate([codes if rows is None else codes[rows],
+                            new_codes]), level)
+
+
+def frame_headers(frame):
+    """Dimension names of a data frame built by data_frame()."""
+    return [name for name in frame.index.names if name is not None] + \
+        [name for name in frame.columns if name != unicode('Valor')]
+
+
+def same_values(old, new):
+    """Elementwise equality of two value arrays; missing values are equal."""
+    same = np.asarray(old == new, dtype=bool)
+    return same | (pd.isnull(old) & pd.isnull(new))
+
+
+def merge_data_frame(frame, resource, where=None):
+    """Merge a new version of a data resource into a data frame built from \
+       a previous one: rows are matched by dimension path, values that \
+       changed are updated, new rows are appended and missing ones dropped. \
+       The old data frame is copied once, with values written by position \
+       and only new labels appended. If its dimensions are no longer those \
+       of the data resource, or are not categorical, it is rebuilt instead. \
+       The delta is returned too, so that caches and stores can be patched \
+       instead of reloaded.
+
+    Args:
+      frame (pandas.DataFrame): data frame built by data_frame(), with or \
+                                without multi_index. It is not modified.
+      resource (dict): new version of the data resource.
+      where (dict, optional): conditions the data frame was sliced with \
+                              (see slice_data()). Defaults to None.
+
+    Returns:
+      delta (DataDelta): merged data frame, changed rows and removed paths.
+
+    """
+    with instrumentation.span('flatten') as info:
+        if where:
+            resource = slice_data(resource, where)
+        dimensions, values = data_columns(resource)
+        info['rows'] = len(values)
+    return merge_columns(frame, list(resource['headers']), dimensions,
+                         values)
+
+
+def merge_columns(frame, headers, dimensions, values):
+    """Merge the data columns of a new version of a data resource into a \
+       data frame built from a previous one (see merge_data_frame()).
+
+    Args:
+      frame (pandas.DataFrame): data frame built by data_frame(), with or \
+                                without multi_index. It is not modified.
+      headers (list): dimension names.
+      dimensions (list): pandas.Categorical objects, one per header.
+      values (numpy.ndarray): values.
+
+    Returns:
+      delta (DataDelta): merged data frame, changed rows and removed paths.
+
+    """
+    multi_index = isinstance(frame.index, pd.MultiIndex)
+    if sorted(frame_headers(frame)) != sorted(headers):
+        with instrumentation.span('dataframe', rows=len(values)):
+            merged = columns_data_frame(headers, dimensions, values,
+                                        multi_index)
+        return DataDelta(merged, merged,
+                         frame_paths(frame, frame_headers(frame)))
+    old_values = frame[unicode('Valor')].values
+    paths = frame_paths(frame, headers)
+    levels = [pd.Index(np.asarray(level)) for level in paths.levels]
+    positions = path_positions(paths.codes, levels, dimensions)
+    known = positions >= 0
+    changed = np.ones(len(values), dtype=bool)
+    changed[known] = ~same_values(old_values[positions[known]],
+                                  values[known])
+    kept = np.zeros(len(frame), dtype=bool)
+    kept[positions[known]] = True
+    removed = paths[~kept]
+    updated = changed & known
+    added = ~known
+    if (changed.any() or not kept.all()) and \
+            all(is_categorical_dtype(frame[name])
+                for name in frame.columns if name != unicode('Valor')):
+        # position of every new row in the merged data frame: kept rows
+        # move up over the removed ones and added rows go last
+        if kept.all():
+            merged_positions = positions.copy()
+        else:
+            merged_positions = np.zeros(len(values), dtype=np.int64)
+            merged_positions[known] = (np.cumsum(kept) - 1)[positions[known]]
+        merged_positions[added] = kept.sum() + np.arange(added.sum())
+        with instrumentation.span('dataframe', rows=len(values)):
+            merged = patch_data_frame(frame, headers, dimensions, values,
+                                      kept, merged_positions, updated,
+                                      added)
+            delta = merged.iloc[merged_positions[changed]].copy()
+        return DataDelta(merged, delta, removed)
+    with instrumentation.span('dataframe', rows=int(changed.sum())):
+        delta = columns_data_frame(
+            headers, [dimension[changed].remove_unused_categories()
+                      for dimension in dimensions],
+            values[changed], multi_index)
+    if not changed.any() and kept.all():
+        return DataDelta(frame, delta, removed)
+    column = old_values.copy()
+    if values.dtype == object:
+        column = column.astype(object)
+    column[positions[updated]] = values[updated]
+    # old rows keep their order and new ones are appended, with the union
+    # of old and new labels as categories
+    merged_dimensions = [union_categoricals(
+        [pd.Categorical.from_codes(np.asarray(codes)[kept], level),
+         dimension[added]])
+        for codes, level, dimension in zip(paths.codes, levels, dimensions)]
+    with instrumentation.span('dataframe', rows=len(values)):
+        merged = columns_data_frame(
+            headers, merged_dimensions,
+            np.concatenate([column[kept], values[added]]), multi_index)
+    return DataDelta(merged, delta, removed)
+
+
+def patch_data_frame(frame, headers, dimensions, values, kept,
+                     merged_positions, updated, added):
+    """Copy the kept rows of a data frame built by data_frame() once, \
+       write the updated values by position and append the added rows \
+       (see merge_data_frame()).
+
+    Args:
+      frame (pandas.DataFrame): old data frame with categorical columns.
+      headers (list): dimension names.
+      dimensions (list): pandas.Categorical objects of the new rows.
+      values (numpy.ndarray): values of the new rows.
+      kept (numpy.ndarray): mask of the old rows still in the data.
+      merged_positions (numpy.ndarray): position of every new row in the \
+                                        merged data frame.
+      updated (numpy.ndarray): mask of the new rows whose value changed.
+      added (numpy.ndarray): mask of the new rows whose path is new.
+
+    Returns:
+      Python Pandas Dataframe.
+
+    """
+    rows = None if kept.all() else np.flatnonzero(kept)
+    old_values = frame[unicode('Valor')].values
+    merged_values = np.concatenate([
+        old_values if rows is None else old_values[rows],
+        values[added]]).astype(np.result_type(old_values, values),
+                               copy=False)
+    merged_values[merged_positions[updated]] = values[updated]
+    new_labels = dict((header, dimension[added])
+                      for header, dimension in zip(headers, dimensions))
+    index = frame.index
+    if isinstance(index, pd.MultiIndex):
+        codes, index_levels = zip(*[append_labels(
+            np.asarray(level_codes), pd.Index(np.asarray(level)), rows,
+            new_labels[name])
+            for level_codes, level, name in zip(index.codes, index.levels,
+                                                index.names)])
+        index = pd.MultiIndex(levels=index_levels, codes=codes,
+                              names=index.names, verify_integrity=False)
+    elif index.name in new_labels:
+        index = pd.Index(np.concatenate([
+            index.values if rows is None else index.values[rows],
+            np.asarray(new_labels[index.name])]), name=index.name,
+            dtype=object)
+    else:
+        index = pd.RangeIndex(len(merged_values))
+    # columns are set one by one: building the data frame from a dict of
+    # columns copies the categorical ones element by element
+    merged = pd.DataFrame(index=index)
+    for name in frame.columns:
+        if name == unicode('Valor'):
+            merged[name] = merged_values
+        else:
+            labels = frame[name].values
+            codes, categories = append_labels(
+                labels.codes, labels.categories, rows, new_labels[name])
+            merged[name] = pd.Categorical.from_codes(codes, categories)
+    return merged
+
 
 def add_query_string_params(node_type=None, inactive=None):
     """Add query string params to a string representing part of a URI.
@@ -290,36 +1728,118 @@ def add_path_params(section_uri_tag=None, subsection_uri_tag=None,
     return path
 
 
+# Lock of the conversions of lazy entities, which are rare and short.
+LAZY_LOCK = threading.Lock()
+
+
+class lookup(object):  # pylint: disable=C0103
+    """Decorator of entity class methods named after a dict method, such as \
+       TimeSeries.get(uri_tag). Accessed on a class, the class method is \
+       bound to it; accessed on an entity, the dict method of BaseEntity is \
+       returned instead, so entities keep their dict semantics.
+
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.__doc__ = function.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self.function.__get__(owner, type(owner))
+        return BaseEntity.__dict__[self.function.__name__].__get__(instance,
+                                                                   owner)
+
+
+class dictmethod(object):  # pylint: disable=C0103
+    """Decorator of BaseEntity dict methods shadowing lookups of mixins \
+       later in the MRO, such as BaseMixin.get(uri_tag). Accessed on an \
+       entity, the dict method is bound to it; accessed on a class, the \
+       lookup is returned instead.
+
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.__doc__ = function.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is not None:
+            return self.function.__get__(instance, owner)
+        mro = owner.__mro__
+        for cls in mro[mro.index(BaseEntity) + 1:]:
+            if self.function.__name__ in cls.__dict__:
+                return cls.__dict__[self.function.__name__].__get__(None,
+                                                                    owner)
+        return self.function.__get__(None, owner)
+
+
 class BaseEntity(dict):
     """Abstract class to convert deserialized JSON into a Python object. Basic\
         skeleton for almost all the module classes.
 
+    Nested dicts and dicts within lists are converted into instances of the \
+    same class. By default they are converted eagerly on construction; in \
+    lazy mode they are converted on first access, by attribute or key, and \
+    memoized, so that large responses such as TimeSeries.find_all() trees \
+    are not duplicated into a parallel object graph when only a few of \
+    their fields are read.
+
+    Entities keep the semantics of dict, whatever their mode: get() on an \
+    entity reads a key, while get() on a class, e.g. TimeSeries.get(), \
+    retrieves an entity from the API (see lookup).
+
     Attributes:
       label_ (str): singular label of the converted entity. Ex: "category"
       plabel_ (str): plural label of the converted entity. Ex: "categories"
+      lazy_ (boolean): default conversion mode of the class. Defaults to \
+                       False.
 
     """
 
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, dict_):
+    lazy_ = False
+    _lazy = False
+    _wrapped = frozenset()
+
+    def __init__(self, dict_, lazy=None):
         """Decode JSON to a Python object.
            See http://peedlecode.com/posts/python-json/
 
         Args:
           dict_ (dict): dictionary that results from deserialized JSON object.
+          lazy (boolean, optional): if True, nested dicts are converted on \
+                                    first access. Defaults to the lazy_ \
+                                    class attribute.
 
         """
 
+        with instrumentation.span('entity', entity=self.__class__.__name__):
+            self._convert(dict_, lazy)
+
+    @classmethod
+    def _nested(cls, dict_, lazy=None):
+        """Convert a nested dict, bypassing the instrumentation of \
+           __init__() so that only whole conversions are timed."""
+        entity = cls.__new__(cls)
+        entity._convert(dict_, lazy)  # pylint: disable=W0212
+        return entity
+
+    def _convert(self, dict_, lazy):
+        """Store dict_ items, converting nested dicts unless lazy."""
         super(BaseEntity, self).__init__(dict_)
-        for key in self:
-            items = self[key]
+        if self.lazy_ if lazy is None else lazy:
+            self._lazy = True
+            self._wrapped = set()  # keys whose values are already converted
+            return
+        for key, items in dict.iteritems(self):
             if isinstance(items, list):
                 for idx, item in enumerate(items):
                     if isinstance(item, dict):
-                        items[idx] = self.__class__(item)
+                        items[idx] = self._nested(item)
             elif isinstance(items, dict):
-                self[key] = self.__class__(items)
+                dict.__setitem__(self, key, self._nested(items))
 
     def __getattr__(self, key):
         """Get dictionary key as attribute. Overriden method.
@@ -334,6 +1854,83 @@ class BaseEntity(dict):
 
         return self[key]
 
+    def __getitem__(self, key):
+        """Get dictionary key, converting its value first in lazy mode.
+
+        Args:
+          key (string): key of the dictionary.
+
+        Returns:
+          self[key](string): key associated value.
+
+        """
+
+        value = dict.__getitem__(self, key)
+        if not self._lazy or key in self._wrapped:
+            return value
+        with LAZY_LOCK:  # convert once even if read by several threads
+            value = dict.__getitem__(self, key)
+            if key in self._wrapped:
+                return value
+            if isinstance(value, list):
+                for idx, item in enumerate(value):
+                    if isinstance(item, dict) and not isinstance(item,
+                                                                 BaseEntity):
+                        value[idx] = self._nested(item, lazy=True)
+            elif isinstance(value, dict) and not isinstance(value,
+                                                            BaseEntity):
+                value = self._nested(value, lazy=True)
+                dict.__setitem__(self, key, value)
+            self._wrapped.add(key)
+        return value
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        if self._lazy:
+            self._wrapped.discard(key)
+
+    def itervalues(self):
+        if not self._lazy:
+            return dict.itervalues(self)
+        return (self[key] for key in self)
+
+    def iteritems(self):
+        if not self._lazy:
+            return dict.iteritems(self)
+        return ((key, self[key]) for key in self)
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+    @dictmethod
+    def get(self, key, default=None):
+        if not self._lazy:
+            return dict.get(self, key, default)
+        return self[key] if key in self else default
+
+    def pop(self, key, *default):
+        if not self._lazy or key not in self:
+            return dict.pop(self, key, *default)
+        value = self[key]
+        dict.__delitem__(self, key)
+        self._wrapped.discard(key)
+        return value
+
+    def setdefault(self, key, default=None):
+        if not self._lazy:
+            return dict.setdefault(self, key, default)
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self):
+        if not self._lazy:
+            return dict.copy(self)
+        return dict(self.iteritems())
+
 
 class BaseMixin(dict):
     """Mixin abstract class with attributes and methods shared by most of the \
@@ -344,16 +1941,32 @@ class BaseMixin(dict):
                     Defaults to None in the parent class.
       plabel_ (str): plural label of the converted entity. Ex: "categories". \
                      Defaults to None in the parent class.
+      reference_ (boolean): if True, the class is a small reference class \
+                            whose entities are looked up in the module \
+                            registry when the client allows it (see \
+                            Client). Defaults to False in the parent class.
 
     """
     __metaclass__ = abc.ABCMeta
 
     label_ = None
     plabel_ = None
+    reference_ = False
 
     @classmethod
+    def registry(cls):
+        """Module registry answering the lookups of the class, or None if \
+           it is not a reference class or the client does not use it."""
+        if not cls.reference_ or not get_client().registry:
+            return None
+        from pyicane.registry import get_registry
+        return get_registry()
+
+    @lookup
     def get(cls, uri_tag):
-        """Retrieve an entity by its uri_tag.
+        """Retrieve an entity by its uri_tag. Entities of reference classes \
+           are shared objects from the module registry; ids and uri_tags \
+           missing from it are requested to the API.
         Args:
          uri_tag (string): the uri_tag (ie. label) of the entity.
 
@@ -363,11 +1976,18 @@ class BaseMixin(dict):
 
         """
 
+        registry = cls.registry()
+        if registry is not None:
+            try:
+                return registry.get(cls, uri_tag)
+            except KeyError:
+                pass
         return cls(request(cls.label_ + '/' + str(uri_tag)))
 
     @classmethod
     def find_all(cls):
-        """Retrieve all available entities of the class.
+        """Retrieve all available entities of the class, from the module \
+           registry for reference classes.
         Args:
          None
 
@@ -377,11 +1997,45 @@ class BaseMixin(dict):
 
         """
 
+        registry = cls.registry()
+        if registry is not None:
+            return registry.find_all(cls)
+        return cls.request_all()
+
+    @classmethod
+    def request_all(cls):
+        """Request all available entities of the class to the API.
+        Args:
+         None
+
+        Returns:
+         List of Python objects from the entity class.
+
+        """
+
         entities = []
         for entity in request(cls.plabel_):
             entities.append(cls(entity))
         return entities
 
+    @classmethod
+    def get_many(cls, uri_tags, max_workers=8, ordered=True):
+        """Retrieve many entities concurrently by their uri_tags.
+        Args:
+         uri_tags (iterable): the uri_tags (ie. labels) of the entities.
+         max_workers (int, optional): number of threads. Defaults to 8.
+         ordered (boolean, optional): if True, results are yielded in the \
+                                      order of uri_tags; otherwise, as they \
+                                      complete. Defaults to True.
+
+        Yields:
+         Result objects whose values are Python objects from the entity \
+         class; failed lookups carry their exception instead.
+
+        """
+
+        return fetch_many(cls.get, uri_tags, max_workers, ordered)
+
 
 class DataMixin(dict):
     """Mixin abstract class with attributes and methods shared by data-type \
@@ -407,9 +2061,7 @@ class DataMixin(dict):
 
         """
 
-        return datetime.fromtimestamp(
-            int(str((request(str(cls.label_) + '/' + 'last-updated')))[0:-3]))\
-            .strftime('%d/%m/%Y')
+        return format_millis(request(str(cls.label_) + '/' + 'last-updated'))
 
     @classmethod
     def get_last_updated_millis(cls):
@@ -439,7 +2091,7 @@ class Class(BaseEntity):
     label_ = 'class'
     plabel_ = 'classes'
 
-    @classmethod
+    @lookup
     def get(cls, class_name, lang):
         """Retrieve the description of a class or entity by its name.
             Args:
@@ -485,6 +2137,7 @@ class DataProvider(BaseEntity, BaseMixin):
 
     label_ = 'data-provider'
     plabel_ = 'data-providers'
+    reference_ = True
 
 
 class DataSet(BaseEntity, BaseMixin):
@@ -532,6 +2185,7 @@ class NodeType(BaseEntity, BaseMixin):
 
     label_ = 'node-type'
     plabel_ = 'node-types'
+    reference_ = True
 
 
 class Periodicity(BaseEntity, BaseMixin):
@@ -540,6 +2194,7 @@ class Periodicity(BaseEntity, BaseMixin):
 
     label_ = 'periodicity'
     plabel_ = 'periodicities'
+    reference_ = True
 
 
 class ReferenceArea(BaseEntity, BaseMixin):
@@ -549,6 +2204,7 @@ class ReferenceArea(BaseEntity, BaseMixin):
 
     label_ = 'reference-area'
     plabel_ = 'reference-areas'
+    reference_ = True
 
 
 class Section(BaseEntity, BaseMixin):
@@ -596,6 +2252,7 @@ class Source(BaseEntity, BaseMixin):
 
     label_ = 'source'
     plabel_ = 'sources'
+    reference_ = True
 
 
 class Subsection(BaseEntity, BaseMixin):
@@ -627,66 +2284,164 @@ class TimeSeries(BaseEntity):
     label_ = 'time-series'
     plabel_ = 'time-series-list'
 
-    @classmethod
+    @lookup
     def get(cls, uri_tag, inactive=None):
         return cls(request(cls.label_ + '/' + str(uri_tag) +
                            add_query_string_params(inactive=inactive)))
 
-    def data_as_dataframe(self):
+    @classmethod
+    def get_many(cls, uri_tags, inactive=None, max_workers=8, ordered=True):
+        """Retrieve many nodes or TimeSeries concurrently by their uri_tags.
+            Args:
+             uri_tags (iterable): uri_tags (ie, labels) of the nodes.
+             inactive(boolean, optional): if True, inactive nodes are also \
+                 returned. Defaults to None.
+             max_workers (int, optional): number of threads. Defaults to 8.
+             ordered (boolean, optional): if True, results are yielded in \
+                 the order of uri_tags; otherwise, as they complete. \
+                 Defaults to True.
+
+            Yields:
+             Result objects whose values are TimeSeries objects; failed \
+             lookups carry their exception instead.
+
+        """
+        return fetch_many(lambda uri_tag: cls.get(uri_tag, inactive),
+                          uri_tags, max_workers, ordered)
+
+    def data_as_dataframe(self, multi_index=False, stream=False,
+                          where=None):
         """Convert TimeSeries data into pandas.DataFrame object. Default \
            index will be the temporal dimension if exists; if not, \
            the municipality dimension will be chosen.
 
+            Args:
+             multi_index (boolean, optional): if True, every dimension is a \
+                 level of a MultiIndex. Defaults to False.
+             stream (boolean, optional): if True, data is parsed as it is \
+                 downloaded, so that peak memory is proportional to the \
+                 resulting dataframe. Requires the ijson package. Defaults \
+                 to False.
+             where (dict, optional): labels, label sets or slices by \
+                 header; only the matching branches of the data are \
+                 flattened (see slice_data()). Defaults to None.
+
             Returns:
             Python Pandas Dataframe.
+
+            Raises:
+             ValueError: where is given together with stream.
         """
 
-        resource = request(self.apiUris[3].uri)  # third element is icane json
-        data = pd.DataFrame(list(flatten_data(resource)))
-        headers = list(resource['headers'])
-        headers.append(unicode('Valor'))
-        data.columns = headers
-        time_series = pd.DataFrame()
-        for element in headers:
-            if element.encode('utf-8') in ['Año', 'Trimestre', 'Mes']:
-                time_series = data.set_index([unicode(element)])
-            elif element == 'Municipios':
-                index = 'Municipios'
-        if time_series.empty:
-            time_series = data.set_index(index)
-        return time_series
-
-    def metadata_as_dataframe(self):
+        uri = self.apiUris[3].uri  # third element is icane json
+        if stream and where:
+            raise ValueError('Streamed data cannot be sliced')
+        if not stream:
+            return data_frame(request(uri), multi_index, where)
+        response = get_client().stream(uri)
+        try:
+            return stream_data_frame(response, multi_index)
+        finally:
+            response.close()
+
+    def update_dataframe(self, frame, where=None):
+        """Download TimeSeries data again and merge it into a data frame \
+           previously built by data_as_dataframe(), returning the delta \
+           (see merge_data_frame()).
+
+            Args:
+             frame (pandas.DataFrame): previous data frame.
+             where (dict, optional): conditions the data frame was sliced \
+                 with. Defaults to None.
+
+            Returns:
+             DataDelta object with the merged frame, the changed rows and \
+             the removed dimension paths.
+        """
+        return merge_data_frame(frame, request(self.apiUris[3].uri), where)
+
+    def slice(self, where, multi_index=False):
+        """Convert the rows of TimeSeries data matching some conditions \
+           into a pandas.DataFrame object, e.g. \
+           time_series.slice({u'Año': slice(1990, 2000)}).
+
+            Args:
+             where (dict): labels, label sets or slices by header (see \
+                 slice_data()).
+             multi_index (boolean, optional): if True, every dimension is a \
+                 level of a MultiIndex. Defaults to False.
+
+            Returns:
+            Python Pandas Dataframe.
+        """
+        return self.data_as_dataframe(multi_index, where=where)
+
+    def metadata_as_dataframe(self, parse_dates=True, where=None,
+                              prune=None, columns=None):
         """Convert TimeSeries metadata digest into pandas.DataFrame object.
+            Args:
+             parse_dates (boolean, optional): if True, dataUpdate, \
+                 dateCreated and lastUpdated are datetime64 columns; if \
+                 False, they hold dd/mm/YYYY strings. Defaults to True.
+             where (callable, optional): predicate of the nodes to be \
+                 digested, e.g. node_filter(node_types=['time-series']).
+             prune (callable, optional): predicate of the subtrees to be \
+                 skipped, e.g. node_filter(active=False).
+             columns (list, optional): NODE_DIGEST_COLUMNS names of the \
+                 data frame. Defaults to None, i.e. all of them.
 
             Returns:
             Python Pandas Dataframe.
         """
-        table = []
-        for node in flatten_metadata(self):
-            table.append(node)
-        metadata = pd.DataFrame(table, columns=['id', 'title', 'nodeType',
-                                                'active', 'acronym', 'uri',
-                                                'metadataUri', 'resourceUri',
-                                                'documentation',
-                                                'methodology',
-                                                'mapScope',
-                                                'referenceResources',
-                                                'description', 'theme',
-                                                'language', 'publisher',
-                                                'license', 'topics',
-                                                'automatizedTopics',
-                                                'uriTag', 'uriTagEs',
-                                                'initialPeriodDescription',
-                                                'finalPeriodDescription',
-                                                'dataUpdate', 'dateCreated',
-                                                'lastUpdated', 'subsection',
-                                                'section', 'category',
-                                                'dataset', 'periodicty',
-                                                'referenceArea',
-                                                'sources', 'measures',
-                                                'apiUris'])
-        return metadata
+        return metadata_frame(self, parse_dates, where, prune, columns)
+
+    @classmethod
+    def search(cls, query, field=None, node_type=None, limit=None,
+               index=None):
+        """Search nodes and TimeSeries in a local metadata index, without \
+           any request to the API. The index is filled with \
+           pyicane.index.MetadataIndex.add(), e.g. from a catalog crawl.
+            Args:
+             query (string): full-text query, e.g. 'paro' or 'emple*'.
+             field (string, optional): restrict the search to 'title', \
+                 'description', 'topics', 'automatizedTopics' or \
+                 'measures'. Defaults to None, i.e. every field.
+             node_type (string, optional): node type uri_tag of the \
+                 results, e.g. 'time-series'. Defaults to None.
+             limit (int, optional): maximum number of results.
+             index (MetadataIndex, optional): index to be searched. \
+                 Defaults to pyicane.index.get_index().
+
+            Returns:
+             Python list of TimeSeries objects.
+
+        """
+        from pyicane.index import get_index
+        if index is None:
+            index = get_index()
+        return index.search(query, field, node_type, limit)
+
+    @classmethod
+    def from_store(cls, uri_tag, store=None):
+        """Read the data of a TimeSeries from a local store, without any \
+           request to the API. Stores are memory-mapped, so only the pages \
+           that are accessed are loaded.
+            Args:
+             uri_tag (string): uri_tag (ie, label) of the TimeSeries.
+             store (ArrowStore or SeriesStore, optional): store to be read, \
+                 see pyicane.export.ArrowStore.export() and \
+                 pyicane.store.SeriesStore.write_series(). Defaults to the \
+                 Arrow store at pyicane.export.STORE_PATH, which requires \
+                 the pyarrow package.
+
+            Returns:
+             Python Pandas Dataframe.
+
+        """
+        from pyicane.export import ArrowStore
+        if store is None:
+            store = ArrowStore()
+        return store.read_data(uri_tag)
 
     @classmethod
     def get_parent(cls, uri_tag):
@@ -809,7 +2564,7 @@ class TimeSeries(BaseEntity):
             time_series_array = request(cls.plabel_ + '?data_updated=' +
                                         data_updated)
         elif metadata_updated:
-            time_series_array = request(cls.plabel_ + '?data_updated=' +
+            time_series_array = request(cls.plabel_ + '?metadata_updated=' +
                                         metadata_updated)
         for time_series in time_series_array:
             time_series_list.append(TimeSeries(time_series))
@@ -863,3 +2618,4 @@ class UnitOfMeasure(BaseEntity, BaseMixin):
 
     label_ = 'unit-of-measure'
     plabel_ = 'units-of-measure'
+    reference_ = True
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""In-process registry of ICANE's reference entities.
+
+Reference classes such as NodeType or Periodicity hold a few dozen entities \
+that hardly ever change, yet every get() is an HTTP request. The registry \
+loads each class once with a single request and answers lookups by id or \
+uriTag from memory until the class is refreshed, explicitly or when its time \
+to live expires. Their get() and find_all() class methods go through the \
+module registry unless the module client is built with registry=False.
+
+"""
+from __future__ import absolute_import
+
+import threading
+import time
+
+from pyicane import pyicane
+
+REFERENCE_CLASSES = (pyicane.NodeType, pyicane.Periodicity,
+                     pyicane.ReferenceArea, pyicane.UnitOfMeasure,
+                     pyicane.DataProvider, pyicane.Source)
+
+
+class Table(object):
+    """Entities of a reference class, indexed by id and uriTag.
+
+    Attributes:
+      entities (list): entities, in request_all() order.
+      by_id (dict): entities by id.
+      by_uri_tag (dict): entities by uriTag.
+      loaded (float): time of the request_all() request.
+
+    """
+
+    __slots__ = ('entities', 'by_id', 'by_uri_tag', 'loaded')
+
+    def __init__(self, entities, loaded):
+        self.entities = entities
+        self.by_id = dict((entity['id'], entity) for entity in entities
+                          if 'id' in entity)
+        self.by_uri_tag = dict((entity['uriTag'], entity)
+                               for entity in entities if 'uriTag' in entity)
+        self.loaded = loaded
+
+
+class Registry(object):
+    """Lookup tables of reference entities, loaded on first use.
+
+    Attributes:
+      classes (tuple): reference classes of the registry.
+      ttl (int): seconds after which a table is loaded again; None keeps \
+                 tables until refresh() is called.
+      stats (dict): number of 'hits' answered from memory and of 'loads'.
+
+    """
+
+    def __init__(self, classes=REFERENCE_CLASSES, ttl=None):
+        """Build an empty registry.
+
+        Args:
+          classes (iterable, optional): reference classes with \
+                                        request_all(). Defaults to \
+                                        REFERENCE_CLASSES.
+          ttl (int, optional): seconds after which a table is loaded again. \
+                               Defaults to None, i.e. no expiry.
+
+        """
+        self.classes = tuple(classes)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.stats = {'hits': 0, 'loads': 0}
+
+    def load(self, cls):
+        """Request every entity of a class and replace its table.
+
+        Returns:
+          table (Table): the new table.
+
+        Raises:
+          ValueError: cls is not a class of the registry.
+
+        """
+        if cls not in self.classes:
+            raise ValueError('Not a reference class: ' + cls.__name__)
+        table = Table(cls.request_all(), time.time())
+        with self.lock:
+            self.tables[cls] = table
+            self.stats['loads'] += 1
+        return table
+
+    def table(self, cls):
+        """Table of a class, loaded if missing or expired."""
+        with self.lock:
+            table = self.tables.get(cls)
+        if table is None or (self.ttl is not None and
+                             time.time() - table.loaded >= self.ttl):
+            table = self.load(cls)
+        else:
+            with self.lock:
+                self.stats['hits'] += 1
+        return table
+
+    def get(self, cls, key):
+        """Look up an entity by id or uri_tag.
+
+        Args:
+          cls (class): reference class, e.g. pyicane.NodeType.
+          key (int or str): id (int) or uri_tag (str) of the entity.
+
+        Returns:
+          Python object of the entity class.
+
+        Raises:
+          KeyError: there is no such entity.
+
+        """
+        table = self.table(cls)
+        if isinstance(key, (int, long)):
+            return table.by_id[key]
+        return table.by_uri_tag[key]
+
+    def find_all(self, cls):
+        """List every entity of a class.
+
+        Args:
+          cls (class): reference class, e.g. pyicane.NodeType.
+
+        Returns:
+          Python list of objects of the entity class.
+
+        """
+        return list(self.table(cls).entities)
+
+    def refresh(self, cls=None):
+        """Load the table of a class again, or those of every class \
+           already loaded.
+
+        Args:
+          cls (class, optional): reference class. Defaults to None.
+
+        """
+        with self.lock:
+            classes = [cls] if cls is not None else list(self.tables)
+        for loaded in classes:
+            self.load(loaded)
+
+    def warm_up(self, max_workers=8):
+        """Load every table concurrently, e.g. at process startup.
+
+        Args:
+          max_workers (int, optional): number of concurrent requests. \
+                                       Defaults to 8.
+
+        Returns:
+          Python list of Result objects of the classes that could not be \
+          loaded (see pyicane.fetch_many()).
+
+        """
+        return [result for result in pyicane.fetch_many(
+            self.load, self.classes, max_workers) if not result.ok]
+
+
+_REGISTRY = None
+
+
+def get_registry():
+    """Return the module registry, building it on first use.
+
+    Returns:
+      registry (Registry): the module registry.
+
+    """
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = Registry()
+    return _REGISTRY
+
+
+def set_registry(registry):
+    """Replace the module registry.
+
+    Args:
+      registry (Registry): the new module registry. If None, a default one \
+                           will be built on next use.
+
+    """
+    global _REGISTRY
+    _REGISTRY = registry
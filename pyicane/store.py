@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""Memory-mapped local store of ICANE's time-series data.
+
+The values of every stored time series are appended to a single float64 \
+file and its dimension codes to a single int32 file; both are memory-mapped \
+for reading, so opening a series only touches the pages of its own arrays. \
+A SQLite sidecar indexes the offsets of every series by uriTag and id and \
+holds its headers and dimension labels. Writes are append-only: replaced \
+series leave garbage behind, which compaction reclaims by copying the live \
+arrays to a new generation of files. Files of older generations that cannot \
+be removed yet (e.g. on Windows, while arrays read from them are still \
+mapped) are removed by a later open or compaction.
+
+"""
+from __future__ import absolute_import
+
+import json
+import mmap
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from pyicane import pyicane
+
+SERIES_STORE_PATH = os.path.join(os.path.expanduser('~'), '.pyicane',
+                                 'series')
+
+VALUES_DTYPE = np.dtype(np.float64)
+CODES_DTYPE = np.dtype(np.int32)
+
+
+class SeriesStore(object):
+    """Append-only, memory-mapped store of time-series data.
+
+    Attributes:
+      path (str): store directory.
+      compact_ratio (float): fraction of garbage bytes above which writes \
+                             trigger a compaction.
+
+    """
+
+    def __init__(self, path=SERIES_STORE_PATH, compact_ratio=0.5):
+        """Open (or create) a store.
+
+        Args:
+          path (str, optional): store directory. Defaults to \
+                                SERIES_STORE_PATH.
+          compact_ratio (float, optional): fraction of garbage bytes above \
+                                           which writes trigger a \
+                                           compaction; None disables it. \
+                                           Defaults to 0.5.
+
+        """
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.lock = threading.RLock()
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.connection = sqlite3.connect(os.path.join(path, 'index.sqlite'),
+                                          check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS series ('
+                'uri_tag TEXT PRIMARY KEY, id INTEGER UNIQUE, '
+                'values_offset INTEGER, codes_offset INTEGER, '
+                'rows INTEGER, dimensions INTEGER, headers TEXT, '
+                'labels TEXT)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS state ('
+                'name TEXT PRIMARY KEY, value INTEGER)')
+            self.connection.execute(
+                'INSERT OR IGNORE INTO state VALUES (?, ?)', ('generation', 0))
+        self.maps = {}
+        self.remove_old_files()
+
+    @property
+    def generation(self):
+        """Generation of the data files, increased by every compaction."""
+        return self.connection.execute(
+            'SELECT value FROM state WHERE name = ?',
+            ('generation',)).fetchone()[0]
+
+    def file_path(self, kind, generation=None):
+        """Path of the 'values' or 'codes' file of a generation."""
+        if generation is None:
+            generation = self.generation
+        return os.path.join(self.path, '%s.%d.bin' % (kind, generation))
+
+    def mapped(self, kind, end):
+        """Memory map of a data file covering at least end bytes. Files \
+           only grow until compacted, so maps are renewed as they grow."""
+        path = self.file_path(kind)
+        current = self.maps.get(kind)
+        if current is None or current[0] != path or len(current[1]) < end:
+            with open(path, 'rb') as data:
+                if os.fstat(data.fileno()).st_size == 0:
+                    return b''  # empty files cannot be mapped
+                current = (path, mmap.mmap(data.fileno(), 0,
+                                           access=mmap.ACCESS_READ))
+            self.maps[kind] = current
+        return current[1]
+
+    def unmap(self):
+        """Release every memory map. Maps are not closed explicitly, since \
+           arrays read from them may still be in use: each one is closed \
+           when its last array is released."""
+        self.maps = {}
+
+    def remove_old_files(self):
+        """Remove the data files of previous generations. Files still \
+           mapped cannot be removed on Windows: they are left behind until \
+           a later open or compaction."""
+        generation = self.generation
+        for name in os.listdir(self.path):
+            parts = name.split('.')
+            if len(parts) == 3 and parts[0] in ('values', 'codes') and \
+                    parts[1].isdigit() and parts[2] == 'bin' and \
+                    int(parts[1]) < generation:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+    def append(self, kind, array):
+        """Append an array to a data file.
+
+        Returns:
+          offset (int): byte offset of the array in the file.
+
+        """
+        with open(self.file_path(kind), 'ab') as data:
+            data.seek(0, os.SEEK_END)
+            offset = data.tell()
+            data.write(array.tobytes())
+        return offset
+
+    def write(self, uri_tag, resource, id_=None):
+        """Write (or replace) the data of a time series.
+
+        Args:
+          uri_tag (str): uri_tag (ie, label) of the time series.
+          resource (dict): ICANE data resource, e.g. from \
+                           pyicane.request(time_series.apiUris[3].uri).
+          id_ (int, optional): id of the time series, so that it can be \
+                               read by id too. Defaults to None.
+
+        Raises:
+          ValueError: the data contains non numeric values.
+
+        """
+        headers = list(resource['headers'])
+        dimensions, values = pyicane.data_columns(resource)
+        if values.dtype != VALUES_DTYPE:
+            raise ValueError('Only numeric data can be stored: ' + uri_tag)
+        codes = np.array([dimension.codes for dimension in dimensions],
+                         dtype=CODES_DTYPE)
+        labels = [list(dimension.categories) for dimension in dimensions]
+        with self.lock:
+            values_offset = self.append('values', values)
+            codes_offset = self.append('codes', codes)
+            with self.connection:
+                if id_ is not None:
+                    self.connection.execute(
+                        'DELETE FROM series WHERE id = ? AND uri_tag != ?',
+                        (id_, uri_tag))
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO series VALUES '
+                    '(?, ?, ?, ?, ?, ?, ?, ?)',
+                    (uri_tag, id_, values_offset, codes_offset, len(values),
+                     len(headers), json.dumps(headers), json.dumps(labels)))
+            if self.compact_ratio is not None and \
+                    self.garbage() > self.compact_ratio:
+                self.compact()
+
+    def write_series(self, time_series):
+        """Download and write the data of a TimeSeries.
+
+        Args:
+          time_series (TimeSeries): time series to be stored.
+
+        """
+        self.write(time_series.uriTag,
+                   pyicane.request(time_series.apiUris[3].uri),
+                   time_series.id)
+
+    def row(self, key):
+        """Index row of a time series given by its uri_tag or id."""
+        column = 'id' if isinstance(key, (int, long)) else 'uri_tag'
+        row = self.connection.execute(
+            'SELECT values_offset, codes_offset, rows, headers, labels '
+            'FROM series WHERE ' + column + ' = ?', (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row
+
+    def read_array(self, kind, dtype, offset, count):
+        """Read an array from the memory map of a data file, without \
+           copying it."""
+        if count == 0:
+            return np.empty(0, dtype)
+        end = offset + count * dtype.itemsize
+        return np.frombuffer(self.mapped(kind, end), dtype, count, offset)
+
+    def read_columns(self, key):
+        """Read the data columns of a time series.
+
+        Args:
+          key (str or int): uri_tag or id of the time series.
+
+        Returns:
+          (headers, dimensions, values) tuple: list of dimension names, \
+                                               list of pandas.Categorical \
+                                               objects and numpy array of \
+                                               values backed by the \
+                                               memory map.
+
+        Raises:
+          KeyError: the time series is not in the store.
+
+        """
+        with self.lock:
+            values_offset, codes_offset, rows, headers, labels = self.row(key)
+            headers = json.loads(headers)
+            labels = json.loads(labels)
+            values = self.read_array('values', VALUES_DTYPE, values_offset,
+                                     rows)
+            codes = self.read_array('codes', CODES_DTYPE, codes_offset,
+                                    rows * len(headers)).reshape(
+                                        len(headers), rows)
+        dimensions = [pd.Categorical.from_codes(codes[i], labels[i])
+                      for i in range(len(headers))]
+        return headers, dimensions, values
+
+    def read_data(self, key, multi_index=False):
+        """Read the data of a time series as a pandas.DataFrame object (see \
+           pyicane.data_frame()).
+
+        Args:
+          key (str or int): uri_tag or id of the time series.
+          multi_index (boolean, optional): if True, every dimension is a \
+                                           level of a MultiIndex. Defaults \
+                                           to False.
+
+        Returns:
+          Python Pandas Dataframe.
+
+        Raises:
+          KeyError: the time series is not in the store.
+
+        """
+        headers, dimensions, values = self.read_columns(key)
+        return pyicane.columns_data_frame(headers, dimensions, values,
+                                          multi_index)
+
+    def remove(self, key):
+        """Remove a time series given by its uri_tag or id. Its arrays are \
+           reclaimed by the next compaction."""
+        column = 'id' if isinstance(key, (int, long)) else 'uri_tag'
+        with self.lock:
+            with self.connection:
+                self.connection.execute(
+                    'DELETE FROM series WHERE ' + column + ' = ?', (key,))
+
+    def __contains__(self, key):
+        try:
+            with self.lock:
+                self.row(key)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COUNT(*) FROM series').fetchone()[0]
+
+    def uri_tags(self):
+        """List the uri_tags of the stored time series."""
+        with self.lock:
+            return [row[0] for row in self.connection.execute(
+                'SELECT uri_tag FROM series ORDER BY uri_tag')]
+
+    def sizes(self):
+        """Bytes of the data files and of the live arrays in them.
+
+        Returns:
+          (total, live) tuple of ints.
+
+        """
+        with self.lock:
+            total = sum(os.path.getsize(self.file_path(kind))
+                        for kind in ('values', 'codes')
+                        if os.path.exists(self.file_path(kind)))
+            live = self.connection.execute(
+                'SELECT SUM(rows * (? + ? * dimensions)) FROM series',
+                (VALUES_DTYPE.itemsize, CODES_DTYPE.itemsize)).fetchone()[0]
+        return total, live or 0
+
+    def garbage(self):
+        """Fraction of the data files taken by replaced or removed arrays."""
+        total, live = self.sizes()
+        return 1 - float(live) / total if total else 0.0
+
+    def compact(self):
+        """Copy the live arrays to a new generation of data files and remove \
+           the old ones (see remove_old_files()). The index switches to the \
+           new files atomically."""
+        with self.lock:
+            generation = self.generation
+            rows = self.connection.execute(
+                'SELECT uri_tag, values_offset, codes_offset, rows, '
+                'dimensions FROM series').fetchall()
+            offsets = {'values': 0, 'codes': 0}
+            updates = []
+            files = dict((kind, open(self.file_path(kind, generation + 1),
+                                     'wb'))
+                         for kind in ('values', 'codes'))
+            try:
+                for uri_tag, values_offset, codes_offset, count, dimensions \
+                        in rows:
+                    sizes = {'values': count * VALUES_DTYPE.itemsize,
+                             'codes': (count * dimensions *
+                                       CODES_DTYPE.itemsize)}
+                    starts = {'values': values_offset,
+                              'codes': codes_offset}
+                    for kind in ('values', 'codes'):
+                        if sizes[kind]:
+                            end = starts[kind] + sizes[kind]
+                            files[kind].write(
+                                self.mapped(kind, end)[starts[kind]:end])
+                    updates.append((offsets['values'], offsets['codes'],
+                                    uri_tag))
+                    for kind in ('values', 'codes'):
+                        offsets[kind] += sizes[kind]
+            finally:
+                for data in files.values():
+                    data.close()
+            with self.connection:
+                self.connection.executemany(
+                    'UPDATE series SET values_offset = ?, codes_offset = ? '
+                    'WHERE uri_tag = ?', updates)
+                self.connection.execute(
+                    'UPDATE state SET value = ? WHERE name = ?',
+                    (generation + 1, 'generation'))
+            self.unmap()
+            self.remove_old_files()
+
+    def close(self):
+        """Release the memory maps and close the index."""
+        with self.lock:
+            self.unmap()
+            self.connection.close()
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""Incremental synchronization of a local snapshot of ICANE's catalog.
+
+A snapshot is a directory holding a metadata index (see pyicane.index), the \
+data frames of the tracked time series and the data and metadata \
+last-updated watermarks of the last sync. Syncs check the global \
+last-updated dates first, so that nothing else is requested on a quiet day, \
+and otherwise fetch only the time series updated since the watermarks, day \
+by day, through TimeSeries.find_all_by_last_updated(). The new data of \
+tracked time series is merged into their stored data frames (see \
+pyicane.merge_data_frame()), which are only written again if it changed.
+
+"""
+from __future__ import absolute_import
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import requests
+
+from pyicane import pyicane
+from pyicane.catalog import Catalog
+from pyicane.index import MetadataIndex
+
+LOGGER = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.path.join(os.path.expanduser('~'), '.pyicane', 'snapshot')
+
+
+def update_dates(since, until):
+    """List the update dates queried for a period, in the dd/mm/YYYY format \
+       of DataMixin.get_last_updated().
+
+    Args:
+      since (int): start of the period, in milliseconds.
+      until (int): end of the period, in milliseconds.
+
+    Returns:
+      Python list of strings, one per day, both ends included.
+
+    """
+    day = datetime.fromtimestamp(since // 1000).date()
+    last = datetime.fromtimestamp(until // 1000).date()
+    dates = []
+    while day <= last:
+        dates.append(day.strftime('%d/%m/%Y'))
+        day += timedelta(days=1)
+    return dates
+
+
+class SyncReport(object):
+    """Changes applied by a sync.
+
+    Attributes:
+      data (list): uri_tags of the time series whose data changed.
+      metadata (list): uri_tags of the nodes whose metadata changed.
+      refreshed (list): uri_tags of the tracked data frames whose data \
+                        changed and was merged into them.
+      deltas (dict): DataDelta objects of the refreshed data frames, by \
+                     uri_tag.
+      errors (list): (uri_tag, exception) tuples of failed downloads.
+      crawl_errors (list): (work item, exception) tuples of the failed \
+                           listings of a full crawl (see \
+                           pyicane.catalog.Catalog).
+      full (boolean): True if the whole catalog was crawled.
+      watermarks (dict): 'data' and 'metadata' watermarks after the sync, \
+                         in milliseconds.
+
+    """
+
+    def __init__(self, watermarks, full=False):
+        self.data = []
+        self.metadata = []
+        self.refreshed = []
+        self.deltas = {}
+        self.errors = []
+        self.crawl_errors = []
+        self.full = full
+        self.watermarks = watermarks
+
+    @property
+    def changed(self):
+        """True if anything changed since the previous sync."""
+        return bool(self.full or self.data or self.metadata)
+
+    def __repr__(self):
+        return ('SyncReport(full=%r, data=%d, metadata=%d, refreshed=%d, '
+                'errors=%d)' % (self.full, len(self.data), len(self.metadata),
+                                len(self.refreshed),
+                                len(self.errors) + len(self.crawl_errors)))
+
+
+class Snapshot(object):
+    """Local snapshot of the catalog, kept up to date by sync().
+
+    Attributes:
+      path (str): snapshot directory.
+      index (MetadataIndex): metadata of every node.
+      frames (dict): data frames of the tracked time series, by uri_tag. \
+                     Loaded on first access.
+      watermarks (dict): 'data' and 'metadata' watermarks of the last sync, \
+                         in milliseconds; empty before the first sync.
+
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, max_workers=8):
+        """Open (or create) a snapshot.
+
+        Args:
+          path (str, optional): snapshot directory. Defaults to SNAPSHOT_PATH.
+          max_workers (int, optional): number of concurrent requests. \
+                                       Defaults to 8.
+
+        """
+        self.path = path
+        self.max_workers = max_workers
+        for directory in (path, os.path.join(path, 'data')):
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        self.index = MetadataIndex(os.path.join(path, 'index.sqlite'))
+        self.watermarks = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as state:
+                self.watermarks = json.load(state)['watermarks']
+        self._frames = None
+
+    @property
+    def state_path(self):
+        """Path of the file holding the watermarks."""
+        return os.path.join(self.path, 'state.json')
+
+    def frame_path(self, uri_tag):
+        """Path of the pickled data frame of a time series."""
+        return os.path.join(self.path, 'data', uri_tag + '.pickle')
+
+    @property
+    def frames(self):
+        """Data frames of the tracked time series, by uri_tag."""
+        if self._frames is None:
+            self._frames = {}
+            for name in os.listdir(os.path.join(self.path, 'data')):
+                if name.endswith('.pickle'):
+                    self._frames[name[:-len('.pickle')]] = pd.read_pickle(
+                        os.path.join(self.path, 'data', name))
+        return self._frames
+
+    def save(self):
+        """Atomically save the watermarks."""
+        temporary = self.state_path + '.tmp'
+        with open(temporary, 'w') as state:
+            json.dump({'watermarks': self.watermarks}, state)
+        pyicane.replace_file(temporary, self.state_path)
+
+    def store(self, uri_tag, frame):
+        """Replace the data frame of a tracked time series."""
+        frame.to_pickle(self.frame_path(uri_tag))
+        self.frames[uri_tag] = frame
+
+    def time_series(self, uri_tag):
+        """TimeSeries of a uri_tag, from its indexed metadata if possible."""
+        time_series = self.index.get_by_uri_tag(uri_tag)
+        if time_series is None:
+            time_series = pyicane.TimeSeries.get(uri_tag)
+            self.index.add([time_series])
+        return time_series
+
+    def download(self, uri_tag):
+        """Download the data frame of a time series."""
+        return self.time_series(uri_tag).data_as_dataframe()
+
+    def refresh(self, uri_tag):
+        """Download the data of a tracked time series again and merge it \
+           into its data frame, which is stored again only if it changed.
+
+        Returns:
+          DataDelta object (see pyicane.merge_data_frame()).
+
+        """
+        delta = self.time_series(uri_tag).update_dataframe(
+            self.frames[uri_tag])
+        if not delta.empty:
+            self.store(uri_tag, delta.frame)
+        return delta
+
+    def track(self, uri_tags):
+        """Download the data frames of some time series and keep them up to \
+           date in later syncs.
+
+        Args:
+          uri_tags (iterable): uri_tags (ie, labels) of the time series.
+
+        Returns:
+          Python list of Result objects (see pyicane.fetch_many()).
+
+        """
+        results = list(pyicane.fetch_many(self.download, uri_tags,
+                                          self.max_workers))
+        for result in results:
+            if result.ok:
+                self.store(result.item, result.value)
+        return results
+
+    def untrack(self, uri_tag):
+        """Forget the data frame of a time series."""
+        self.frames.pop(uri_tag, None)
+        if os.path.exists(self.frame_path(uri_tag)):
+            os.remove(self.frame_path(uri_tag))
+
+    def changes(self, since, until, data=True):
+        """Request the nodes updated in a period.
+
+        Args:
+          since (int): watermark of the previous sync, in milliseconds.
+          until (int): current watermark, in milliseconds.
+          data (boolean, optional): if True, nodes whose data changed are \
+                                    requested; otherwise, nodes whose \
+                                    metadata changed. Defaults to True.
+
+        Returns:
+          Python list of TimeSeries objects updated after since.
+
+        """
+        field = 'dataUpdate' if data else 'lastUpdated'
+        argument = 'data_updated' if data else 'metadata_updated'
+
+        def updated_on(date):
+            """Request the nodes updated on a date; none if not found."""
+            try:
+                return pyicane.TimeSeries.find_all_by_last_updated(
+                    **{argument: date})
+            except requests.exceptions.HTTPError, exception:
+                if exception.response.status_code != 404:
+                    raise
+                return []
+
+        nodes = {}
+        for result in pyicane.fetch_many(updated_on,
+                                         update_dates(since, until),
+                                         self.max_workers):
+            if not result.ok:
+                raise result.error
+            for node in result.value:
+                if field not in node or node[field] is None or \
+                        node[field] > since:
+                    nodes[node['id']] = node
+        return [nodes[node_id] for node_id in sorted(nodes)]
+
+    def sync(self):
+        """Bring the snapshot up to date. The first sync crawls the whole \
+           catalog; later ones request the global last-updated dates and, if \
+           they moved past the watermarks, the nodes updated since then. \
+           Changed nodes are indexed again and the new data of tracked \
+           time series whose data changed is merged into their data \
+           frames. Watermarks only advance when every download succeeds, so \
+           failed changes are retried by the next sync.
+
+        Returns:
+          SyncReport object.
+
+        """
+        watermarks = {'data': pyicane.Data.get_last_updated_millis(),
+                      'metadata': pyicane.Metadata.get_last_updated_millis()}
+        if not self.watermarks:
+            report = SyncReport(watermarks, full=True)
+            crawl = Catalog(max_workers=self.max_workers)
+            nodes = list(crawl.crawl())
+            self.index.add(nodes)
+            report.metadata = [node.uriTag for node in nodes]
+            report.crawl_errors.extend(crawl.errors)
+            changed_data = list(self.frames)
+        else:
+            report = SyncReport(watermarks)
+            changed_data = []
+            if watermarks['metadata'] > self.watermarks['metadata']:
+                nodes = self.changes(self.watermarks['metadata'],
+                                     watermarks['metadata'], data=False)
+                self.index.add(nodes)
+                report.metadata = [node.uriTag for node in nodes]
+            if watermarks['data'] > self.watermarks['data']:
+                nodes = self.changes(self.watermarks['data'],
+                                     watermarks['data'])
+                report.data = [node.uriTag for node in nodes]
+                changed_data = [uri_tag for uri_tag in report.data
+                                if uri_tag in self.frames]
+        for result in pyicane.fetch_many(self.refresh, changed_data,
+                                         self.max_workers):
+            if not result.ok:
+                report.errors.append((result.item, result.error))
+            elif not result.value.empty:
+                report.refreshed.append(result.item)
+                report.deltas[result.item] = result.value
+        if report.errors or report.crawl_errors:
+            LOGGER.warning('sync: ' + str(len(report.errors) +
+                                          len(report.crawl_errors)) +
+                           ' errors, watermarks kept')
+            report.watermarks = dict(self.watermarks)
+        else:
+            self.watermarks = watermarks
+            self.save()
+        return report
+
+    def close(self):
+        """Close the metadata index."""
+        self.index.close()
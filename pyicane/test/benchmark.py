@@ -0,0 +1,589 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for pyicane data pipelines, run on synthetic fixtures of \
+configurable size or on recorded ICANE JSON responses, served by a local \
+HTTP stand-in. Results can be saved as JSON and compared with a baseline, \
+in which case the exit status is 1 if any timing regressed::
+
+    python -m pyicane.test.benchmark --save baseline.json
+    python -m pyicane.test.benchmark --baseline baseline.json
+
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from pyicane import pyicane
+from pyicane.batch import build_frames
+from pyicane.decoders import DECODERS, available, get_decoder
+from pyicane.export import ArrowStore, pa
+from pyicane.store import SeriesStore
+from pyicane.test.fixtures import cube_fixture, time_series_fixture, \
+    tree_fixture
+from pyicane.test.server import FixtureServer
+
+# Metrics of the results that are timings, compared with baselines.
+TIMINGS = ('seconds', 'first_row', 'all_rows')
+
+
+def recursive_flatten_data(data, record=None):
+    """Recursive flatten_data() of pyicane 0.1, kept as a reference."""
+    if data.get('data'):  # first level
+        record = []
+        for j in list(recursive_flatten_data(data['data'], record)):
+            yield j
+    else:  # other levels
+        for k in list(data):
+            if isinstance(data[k], dict):
+                record.append(k)
+                for i in list(recursive_flatten_data(data[k], record)):
+                    yield i
+            else:  # last level
+                row = list(record)
+                row.append(k)
+                row.append(data[k])
+                yield row
+        if len(record) != 0:
+            record.pop()
+
+
+def list_data_frame(resource):
+    """Row-wise data_frame() of pyicane 0.1, kept as a reference."""
+    data = pd.DataFrame(list(recursive_flatten_data(resource)))
+    headers = list(resource['headers'])
+    headers.append(unicode('Valor'))
+    data.columns = headers
+    time_series = pd.DataFrame()
+    for element in headers:
+        if element.encode('utf-8') in ['Año', 'Trimestre', 'Mes']:
+            time_series = data.set_index([unicode(element)])
+        elif element == 'Municipios':
+            index = 'Municipios'
+    if time_series.empty:
+        time_series = data.set_index(index)
+    return time_series
+
+
+def timed(function, *args):
+    """Time a function call.
+
+    Returns:
+      (seconds, result) tuple.
+
+    """
+    start = time.time()
+    result = function(*args)
+    return time.time() - start, result
+
+
+def first_row(flatten, resource):
+    """Consume the first row only."""
+    return next(flatten(resource))
+
+
+def all_rows(flatten, resource):
+    """Consume every row without keeping them."""
+    count = 0
+    for _ in flatten(resource):
+        count += 1
+    return count
+
+
+def bench_flatten_data(shape=(50, 40, 20, 30)):
+    """Compare the streaming flatten_data() with the recursive one.
+
+    Returns:
+      results (dict): seconds to the first row and to the last one.
+
+    """
+    resource = cube_fixture(shape)
+    results = {}
+    for name, flatten in (('recursive', recursive_flatten_data),
+                          ('streaming', pyicane.flatten_data)):
+        first, _ = timed(first_row, flatten, resource)
+        total, rows = timed(all_rows, flatten, resource)
+        results[name] = {'first_row': first, 'all_rows': total, 'rows': rows}
+    return results
+
+
+def bench_data_frame(shape=(50, 40, 20, 30)):
+    """Compare the columnar data_frame() with the row-wise one.
+
+    Returns:
+      results (dict): seconds and bytes of the built frames.
+
+    """
+    resource = cube_fixture(shape)
+    results = {}
+    for name, build in (('rows', list_data_frame),
+                        ('columnar', pyicane.data_frame)):
+        seconds, frame = timed(build, resource)
+        results[name] = {'seconds': seconds,
+                         'bytes': int(frame.memory_usage(deep=True).sum() +
+                                      frame.index.memory_usage(deep=True))}
+    return results
+
+
+def count_entities():
+    """Number of live BaseEntity objects."""
+    gc.collect()
+    return sum(1 for obj in gc.get_objects()
+               if isinstance(obj, pyicane.BaseEntity))
+
+
+def bench_entities(depth=4, breadth=8):
+    """Compare eager and lazy conversion of a TimeSeries.find_all() \
+       response when only the uriTag of every top-level node is read.
+
+    Returns:
+      results (dict): seconds and number of entities allocated.
+
+    """
+    results = {}
+    for name, lazy in (('eager', False), ('lazy', True)):
+        response = tree_fixture(depth, breadth)
+        before = count_entities()
+        start = time.time()
+        nodes = map(lambda node: pyicane.TimeSeries(node, lazy=lazy),
+                    response)
+        uri_tags = map(lambda node: node.uriTag, nodes)
+        seconds = time.time() - start
+        results[name] = {'seconds': seconds,
+                         'entities': count_entities() - before,
+                         'nodes': len(uri_tags)}
+        del nodes, response
+    return results
+
+
+def bench_slice(shape=(50, 40, 20, 30), repeat=3):
+    """Compare filtering a whole data frame in pandas with slicing the data \
+       before it is flattened, for one label of the outermost dimension.
+
+    Returns:
+      results (dict): seconds and rows of the resulting data frame.
+
+    """
+    resource = cube_fixture(shape)
+    header = resource['headers'][0]
+    label = next(iter(resource['data']))
+
+    def pandas_filter():
+        """Flatten every row, then filter them."""
+        data_frame = pyicane.data_frame(resource)
+        return data_frame[data_frame[header] == label]
+
+    slicers = (('pandas', pandas_filter),
+               ('where', lambda: pyicane.data_frame(
+                   resource, where={header: label})))
+    return dict((name, {'seconds': best(repeat, slicer),
+                        'rows': len(slicer())})
+                for name, slicer in slicers)
+
+
+def bench_merge(shape=(50, 40, 20, 30), repeat=3, min_rows=100000):
+    """Compare rebuilding a data frame after a new year of data with \
+       merging the new data into the previous data frame, which must be \
+       faster for large data frames. Both start from the same flattened \
+       data columns, whose parsing is timed apart.
+
+    Args:
+      shape (tuple, optional): labels per dimension of the synthetic cube.
+      repeat (int, optional): runs per builder; the fastest one is kept.
+      min_rows (int, optional): rows of the data frame from which merging \
+                                must beat rebuilding; fixed pandas costs \
+                                dominate smaller ones. Defaults to 100000.
+
+    Returns:
+      results (dict): seconds, and rows changed by the merge.
+
+    Raises:
+      AssertionError: merging a large data frame is slower than \
+                      rebuilding it.
+
+    """
+    resource = cube_fixture(shape)
+    frame = pyicane.data_frame(resource)
+    stack = [resource['data']]
+    while stack:  # add a year to every innermost dict
+        node = stack.pop()
+        if isinstance(next(node.itervalues()), dict):
+            stack.extend(node.itervalues())
+        else:
+            node[unicode(1900 + shape[-1])] = 0.0
+    headers = list(resource['headers'])
+    dimensions, values = pyicane.data_columns(resource)
+    builders = (('parse', lambda: pyicane.data_columns(resource)),
+                ('rebuild', lambda: pyicane.columns_data_frame(
+                    headers, dimensions, values)),
+                ('merge', lambda: pyicane.merge_columns(
+                    frame, headers, dimensions, values)))
+    results = dict((name, {'seconds': best(repeat, builder)})
+                   for name, builder in builders)
+    results['merge']['rows'] = len(builders[2][1]().changed)
+    if len(frame) >= min_rows:
+        assert results['merge']['seconds'] < \
+            results['rebuild']['seconds'], 'merging is slower than rebuilding'
+    return results
+
+
+def bench_metadata_frame(depth=4, breadth=8, repeat=3):
+    """Compare building a metadata data frame from node digests, with dates \
+       formatted node by node, with the bulk metadata_frame().
+
+    Returns:
+      results (dict): seconds and rows of the data frame.
+
+    """
+    nodes = [pyicane.TimeSeries(node) for node in tree_fixture(depth,
+                                                               breadth)]
+    builders = (('digests', lambda: pyicane.digests_to_dataframe(
+                    pyicane.flatten_metadata(nodes))),
+                ('bulk', lambda: pyicane.metadata_frame(nodes)),
+                ('bulk_strings', lambda: pyicane.metadata_frame(
+                    nodes, parse_dates=False)))
+    return dict((name, {'seconds': best(repeat, builder),
+                        'rows': len(builder())})
+                for name, builder in builders)
+
+
+def bench_store(shape=(50, 40, 20, 30)):
+    """Compare parsing a JSON data resource, as a refetch without network \
+       time would, with reading the data frame back from a SeriesStore and, \
+       if pyarrow is installed, from an ArrowStore.
+
+    Returns:
+      results (dict): seconds to get the data frame.
+
+    """
+    resource = cube_fixture(shape)
+    body = json.dumps(resource)
+    path = tempfile.mkdtemp()
+    results = {}
+    try:
+        seconds, _ = timed(lambda: pyicane.data_frame(
+            json.loads(body, object_pairs_hook=OrderedDict)))
+        results['json'] = {'seconds': seconds}
+        store = SeriesStore(os.path.join(path, 'series'))
+        store.write('cube', resource)
+        seconds, _ = timed(store.read_data, 'cube')
+        results['mmap'] = {'seconds': seconds}
+        store.close()
+        if pa is not None:
+            store = ArrowStore(os.path.join(path, 'arrow'))
+            store.write_data('cube', pyicane.data_frame(resource))
+            seconds, _ = timed(store.read_data, 'cube')
+            results['arrow'] = {'seconds': seconds}
+    finally:
+        shutil.rmtree(path)
+    return results
+
+
+def bench_batch(workers=(1, 2, 4, 8), count=16, shape=(20, 20, 10, 30)):
+    """Compare converting many JSON data resources into data frames in \
+       this process with build_frames() at several numbers of workers.
+
+    Args:
+      workers (tuple, optional): numbers of worker processes.
+      count (int, optional): number of data resources.
+      shape (tuple, optional): labels per dimension of every resource.
+
+    Returns:
+      results (dict): seconds, and speedup over this process, by run.
+
+    """
+    bodies = [(str(i), json.dumps(cube_fixture(shape))) for i in range(count)]
+    loads = get_decoder('auto').loads
+    serial, _ = timed(lambda: [pyicane.data_frame(loads(body))
+                               for _, body in bodies])
+    results = {'serial': {'seconds': serial, 'speedup': 1.0}}
+    if pa is None:
+        return results
+    for max_workers in workers:
+        seconds, _ = timed(lambda: list(build_frames(bodies, max_workers)))
+        results['workers_%d' % max_workers] = {'seconds': seconds,
+                                               'speedup': serial / seconds}
+    return results
+
+
+def best(repeat, function, setup=None):
+    """Time the fastest of several runs of a function.
+
+    Args:
+      repeat (int): number of runs.
+      function (callable): function to be timed.
+      setup (callable, optional): function returning the arguments of \
+                                  every run, which is not timed.
+
+    Returns:
+      seconds (float): duration of the fastest run.
+
+    """
+    runs = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        runs.append(timed(function, *args)[0])
+    return min(runs)
+
+
+def load_fixture(path):
+    """Load a recorded ICANE JSON response, keeping its key order."""
+    with open(path) as fixture:
+        return json.load(fixture, object_pairs_hook=OrderedDict)
+
+
+def bench_pipeline(depth=4, breadth=6, shape=(50, 40, 20, 30), repeat=3,
+                   metadata=None, data=None):
+    """Time every stage of the metadata and data pipelines, with responses \
+       served by a local HTTP stand-in.
+
+    Args:
+      depth (int, optional): levels of the synthetic metadata tree.
+      breadth (int, optional): children per node of the metadata tree.
+      shape (tuple, optional): labels per dimension of the synthetic cube.
+      repeat (int, optional): runs per stage; the fastest one is kept.
+      metadata (list, optional): recorded TimeSeries.find_all() response, \
+                                 used instead of the synthetic tree.
+      data (dict, optional): recorded data resource, used instead of the \
+                             synthetic cube.
+
+    Returns:
+      results (dict): seconds of every stage.
+
+    """
+    server = FixtureServer().start()
+    if metadata is None:
+        metadata = tree_fixture(depth, breadth, server.url + 'data/')
+    if data is None:
+        data = cube_fixture(shape)
+    root = time_series_fixture(0, 'root', server.url + 'data/cube', 'folder',
+                               metadata)
+    bodies = {'data': json.dumps(data), 'metadata': json.dumps(metadata),
+              'root': json.dumps(root)}
+    server.fixtures.update({'/data/cube.json': bodies['data'],
+                            '/time-series-list': bodies['metadata']})
+    default_client = pyicane.get_client()
+    client = pyicane.Client(server.url, single_flight=False)
+    pyicane.set_client(client)
+
+    def parsed(name):
+        """Setup returning a freshly parsed body, since entities convert \
+           nested dicts in place."""
+        return lambda: (json.loads(bodies[name],
+                                   object_pairs_hook=OrderedDict),)
+
+    resource = parsed('data')()[0]
+    time_series = pyicane.TimeSeries(parsed('root')()[0])
+    stages = [
+        ('request_data', lambda: client.request('data/cube.json'), None),
+        ('request_metadata', lambda: client.request('time-series-list'),
+         None),
+        ('parse_data', parsed('data'), None),
+        ('parse_metadata', parsed('metadata'), None),
+        ('entity', lambda nodes: map(pyicane.TimeSeries, nodes),
+         parsed('metadata')),
+        ('flatten_metadata',
+         lambda root: list(pyicane.flatten_metadata(root)),
+         lambda: (pyicane.TimeSeries(parsed('root')()[0]),)),
+        ('flatten_data', lambda: all_rows(pyicane.flatten_data, resource),
+         None),
+        ('data_as_dataframe', time_series.data_as_dataframe, None),
+        ('metadata_as_dataframe', time_series.metadata_as_dataframe, None)]
+    try:
+        return dict((name, {'seconds': best(repeat, function, setup)})
+                    for name, function, setup in stages)
+    finally:
+        pyicane.set_client(default_client)
+        client.close()
+        server.stop()
+
+
+def bench_decoders(depth=4, breadth=6, shape=(50, 40, 20, 30), repeat=3,
+                   metadata=None, data=None):
+    """Time every installed JSON decoder on a data resource and a metadata \
+       tree, checking that every decoder builds the same data frame as the \
+       stdlib one.
+
+    Args:
+      depth (int, optional): levels of the synthetic metadata tree.
+      breadth (int, optional): children per node of the metadata tree.
+      shape (tuple, optional): labels per dimension of the synthetic cube.
+      repeat (int, optional): runs per decoder; the fastest one is kept.
+      metadata (list, optional): recorded TimeSeries.find_all() response, \
+                                 used instead of the synthetic tree.
+      data (dict, optional): recorded data resource, used instead of the \
+                             synthetic cube.
+
+    Returns:
+      results (dict): seconds to decode the 'data' and 'metadata' bodies \
+                      and their bytes, by decoder.
+
+    Raises:
+      AssertionError: a decoder builds a different data frame.
+
+    """
+    if metadata is None:
+        metadata = tree_fixture(depth, breadth, 'http://localhost/data/')
+    if data is None:
+        data = cube_fixture(shape)
+    bodies = {'data': json.dumps(data), 'metadata': json.dumps(metadata)}
+    expected = pyicane.data_frame(DECODERS['json'].loads(bodies['data']))
+    results = {}
+    for name in available():
+        decoder = DECODERS[name]
+        result = {'bytes': len(bodies['data']) + len(bodies['metadata'])}
+        for body in ('data', 'metadata'):
+            result[body] = {'seconds': best(repeat, decoder.loads,
+                                            lambda: (bodies[body],))}
+        frame = pyicane.data_frame(decoder.loads(bodies['data']))
+        assert frame.equals(expected), name + ' lost the key order'
+        results[name] = result
+    return results
+
+
+def flatten_results(results, prefix=''):
+    """Flatten nested results into a dict of values by dotted name."""
+    flat = {}
+    for name, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten_results(value, prefix + name + '.'))
+        else:
+            flat[prefix + name] = value
+    return flat
+
+
+def compare(results, baseline, tolerance=0.25, min_seconds=0.001):
+    """Compare timings with a baseline.
+
+    Args:
+      results (dict): benchmark results.
+      baseline (dict): baseline results, e.g. saved by a previous run.
+      tolerance (float, optional): allowed slowdown, as a fraction of the \
+                                   baseline. Defaults to 0.25.
+      min_seconds (float, optional): baseline timings shorter than this \
+                                     are too noisy to be compared. \
+                                     Defaults to 0.001.
+
+    Returns:
+      Python list of (name, baseline seconds, seconds) tuples of the \
+      timings that regressed, by name.
+
+    """
+    current = flatten_results(results)
+    regressions = []
+    for name, before in sorted(flatten_results(baseline).items()):
+        if name.rsplit('.', 1)[-1] not in TIMINGS or name not in current:
+            continue
+        if before >= min_seconds and current[name] > before * (1 + tolerance):
+            regressions.append((name, before, current[name]))
+    return regressions
+
+
+def run(quick=False, repeat=3, metadata=None, data=None):
+    """Run every benchmark.
+
+    Args:
+      quick (boolean, optional): if True, fixtures are small.
+      repeat (int, optional): runs per pipeline stage.
+      metadata (list, optional): recorded TimeSeries.find_all() response.
+      data (dict, optional): recorded data resource.
+
+    Returns:
+      results (dict): results by benchmark.
+
+    """
+    shape = (10, 10, 10, 12) if quick else (50, 40, 20, 30)
+    depth, breadth = (3, 4) if quick else (4, 6)
+    return {'flatten_data': bench_flatten_data(shape),
+            'data_frame': bench_data_frame(shape),
+            'entities': bench_entities(depth, breadth),
+            'metadata_frame': bench_metadata_frame(depth, breadth, repeat),
+            'slice': bench_slice(shape, repeat),
+            'merge': bench_merge(shape, repeat),
+            'batch': bench_batch(count=4 if quick else 16,
+                                 shape=shape[1:] if quick else
+                                 (20, 20, 10, 30)),
+            'store': bench_store(shape),
+            'decoders': bench_decoders(depth, breadth, shape, repeat,
+                                       metadata, data),
+            'pipeline': bench_pipeline(depth, breadth, shape, repeat,
+                                       metadata, data)}
+
+
+def report(results):
+    """Print benchmark results."""
+    for name, result in sorted(results['flatten_data'].items()):
+        print '%-10s first row %8.4fs  all %8d rows %8.4fs' % (
+            name, result['first_row'], result['rows'], result['all_rows'])
+    for name, result in sorted(results['data_frame'].items()):
+        print '%-10s data frame %8.4fs %12d bytes' % (
+            name, result['seconds'], result['bytes'])
+    for name, result in sorted(results['entities'].items()):
+        print '%-10s entities   %8.4fs %12d objects' % (
+            name, result['seconds'], result['entities'])
+    for name, result in sorted(results['metadata_frame'].items()):
+        print '%-12s metadata %8.4fs %8d rows' % (
+            name, result['seconds'], result['rows'])
+    for name, result in sorted(results['slice'].items()):
+        print '%-10s slice      %8.4fs %12d rows' % (
+            name, result['seconds'], result['rows'])
+    for name, result in sorted(results['merge'].items()):
+        print '%-10s merge      %8.4fs' % (name, result['seconds'])
+    for name, result in sorted(results['batch'].items()):
+        print '%-10s batch      %8.4fs  speedup %5.2fx' % (
+            name, result['seconds'], result['speedup'])
+    for name, result in sorted(results['store'].items()):
+        print '%-10s store read %8.4fs' % (name, result['seconds'])
+    for name, result in sorted(results['decoders'].items()):
+        print '%-10s decode data %8.4fs  metadata %8.4fs' % (
+            name, result['data']['seconds'], result['metadata']['seconds'])
+    for name, result in sorted(results['pipeline'].items()):
+        print '%-21s %8.4fs' % (name, result['seconds'])
+
+
+def main(argv=None):
+    """Run every benchmark, print its results and optionally save them and \
+       compare them with a baseline.
+
+    Returns:
+      status (int): 1 if any timing regressed, 0 otherwise.
+
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--quick', action='store_true',
+                        help='use small fixtures')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per pipeline stage')
+    parser.add_argument('--metadata', help='recorded time-series list JSON')
+    parser.add_argument('--data', help='recorded data resource JSON')
+    parser.add_argument('--save', help='save results to this JSON file')
+    parser.add_argument('--baseline', help='compare with this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown over the baseline')
+    args = parser.parse_args(argv)
+    results = run(args.quick, args.repeat,
+                  load_fixture(args.metadata) if args.metadata else None,
+                  load_fixture(args.data) if args.data else None)
+    report(results)
+    if args.save:
+        with open(args.save, 'w') as saved:
+            json.dump({'python': sys.version.split()[0],
+                       'results': results}, saved, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as saved:
+            baseline = json.load(saved)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print 'REGRESSION %s: %.4fs -> %.4fs' % (name, before, after)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Synthetic ICANE JSON fixtures for offline tests.
+
+"""
+from collections import OrderedDict
+
+
+def data_fixture(municipalities=3, years=4):
+    """Build a data resource with 'Municipios' and 'Año' dimensions.
+
+    Args:
+      municipalities (int, optional): number of municipalities.
+      years (int, optional): number of years.
+
+    Returns:
+      resource (OrderedDict): deserialized ICANE data resource.
+
+    """
+    data = OrderedDict()
+    for municipality in range(municipalities):
+        label = u' 390%02d - Municipio %d' % (municipality, municipality)
+        data[label] = OrderedDict()
+        for year in range(years):
+            data[label][unicode(1900 + year)] = float(municipality * 1000 +
+                                                      year)
+    return OrderedDict([('headers', [u'Municipios', u'Año']),
+                        ('data', data)])
+
+
+def entity_fixture(id_, uri_tag, title, **fields):
+    """Build a catalog entity such as a NodeType or a Periodicity.
+
+    Returns:
+      entity (OrderedDict): deserialized ICANE entity.
+
+    """
+    entity = OrderedDict([('id', id_), ('uriTag', uri_tag),
+                          ('title', title)])
+    entity.update(sorted(fields.items()))
+    return entity
+
+
+def time_series_fixture(id_, uri_tag, data_url, node_type='time-series',
+                        children=None):
+    """Build a TimeSeries node with every field used by node digests.
+
+    Args:
+      id_ (int): node id.
+      uri_tag (str): node uri_tag.
+      data_url (str): URL of the node data resource.
+      node_type (str, optional): node type uri_tag.
+      children (list, optional): children nodes.
+
+    Returns:
+      node (OrderedDict): deserialized ICANE TimeSeries node.
+
+    """
+    section = entity_fixture(2, 'economy', u'Economía')
+    return OrderedDict([
+        ('id', id_), ('uriTag', uri_tag), ('uriTagEs', uri_tag + '-es'),
+        ('title', u'Serie %d' % id_),
+        ('nodeType', entity_fixture(4, node_type, node_type)),
+        ('active', True),
+        ('dataSet', entity_fixture(7, 'data-set', u'Estadística',
+                                   acronym='EST')),
+        ('uri', 'http://www.icane.es/data/' + uri_tag),
+        ('metadataUri', 'http://www.icane.es/metadata/' + uri_tag),
+        ('resourceUri', 'http://www.icane.es/resource/' + uri_tag),
+        ('documentation', u'Documentación'), ('methodology', u'Metodología'),
+        ('mapScope', None), ('referenceResources', None),
+        ('description', u'Descripción de la serie %d' % id_),
+        ('theme', u'Tema'), ('language', 'es'), ('publisher', 'ICANE'),
+        ('license', 'CC-BY'), ('topics', u'empleo,paro'),
+        ('automatizedTopics', u'trimestre,sector'),
+        ('initialPeriodDescription', u'1900'),
+        ('finalPeriodDescription', u'2001'),
+        ('dataUpdate', 1400000000000 + id_ * 86400000),
+        ('dateCreated', 1300000000000),
+        ('lastUpdated', 1400000000000 + id_ * 86400000),
+        ('category', entity_fixture(1, 'regional-data', u'Datos regionales')),
+        ('subsection', entity_fixture(5, 'labour-market',
+                                      u'Mercado de Trabajo',
+                                      section=section)),
+        ('periodicity', entity_fixture(3, 'quarterly', u'Trimestral')),
+        ('referenceArea', entity_fixture(1, 'regional', u'Regional')),
+        ('sources', [entity_fixture(45, '45', u'Fuente', label=u'INE')]),
+        ('measures', [entity_fixture(1, '1', u'Parados', unit=u'Personas'),
+                      entity_fixture(2, '2', u'Ocupados',
+                                     unit=u'Personas')]),
+        ('apiUris', [OrderedDict([('uri', data_url + '.' + extension)])
+                     for extension in ('csv', 'xlsx', 'html', 'json')]),
+        ('children', children if children is not None else [])])
+
+
+def tree_fixture(depth, breadth, data_url='http://localhost/data/series'):
+    """Build a list of nested nodes like those returned by \
+       TimeSeries.find_all(): nodes at the last level are time series and \
+       the others are folders with breadth children each.
+
+    Args:
+      depth (int): number of levels.
+      breadth (int): number of nodes per level and parent.
+      data_url (str, optional): data URL prefix of the time series.
+
+    Returns:
+      nodes (list): deserialized ICANE TimeSeries nodes.
+
+    """
+    counter = [0]
+
+    def level(remaining):
+        """Build the nodes of a given level."""
+        nodes = []
+        for _ in range(breadth):
+            counter[0] += 1
+            id_ = counter[0]
+            uri_tag = 'node-%d' % id_
+            if remaining == 1:
+                nodes.append(time_series_fixture(id_, uri_tag,
+                                                 data_url + str(id_)))
+            else:
+                nodes.append(time_series_fixture(id_, uri_tag,
+                                                 data_url + str(id_),
+                                                 'folder',
+                                                 level(remaining - 1)))
+        return nodes
+
+    return level(depth)
+
+
+def cube_fixture(shape):
+    """Build a data resource with as many dimensions as shape has elements. \
+       Labels of the last dimension are years, so the resulting data frame \
+       is indexed by 'Año'.
+
+    Args:
+      shape (tuple): number of labels of every dimension, outermost first.
+
+    Returns:
+      resource (OrderedDict): deserialized ICANE data resource.
+
+    """
+    headers = [u'Dimensión %d' % i for i in range(len(shape) - 1)] + [u'Año']
+    counter = [0]
+
+    def level(depth):
+        """Build the nested dict of a given dimension."""
+        node = OrderedDict()
+        for i in range(shape[depth]):
+            if depth == len(shape) - 1:
+                counter[0] += 1
+                node[unicode(1900 + i)] = float(counter[0])
+            else:
+                node[u'%s - %d' % (headers[depth], i)] = level(depth + 1)
+        return node
+
+    return OrderedDict([('headers', headers), ('data', level(0))])
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Local HTTP stand-in for ICANE's API, serving JSON fixtures so that \
+pyicane can be tested offline.
+
+"""
+import hashlib
+import json
+import threading
+import BaseHTTPServer
+import SocketServer
+
+
+class FixtureHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serve the fixture registered for the requested path, or 404. \
+       Responses carry an ETag and conditional requests are answered with \
+       304 Not Modified when the fixture has not changed."""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_GET(self):  # pylint: disable=C0103
+        """Handle GET requests."""
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            failures = server.failures.get(self.path)
+            failure = failures.pop(0) if failures else None
+        if failure is not None:
+            status, headers = failure
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        fixture = server.fixtures.get(self.path)
+        if fixture is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = fixture if isinstance(fixture, str) else json.dumps(fixture)
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FixtureServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Threaded HTTP server bound to a free local port.
+
+    Attributes:
+      fixtures (dict): JSON serializable objects (or raw strings) keyed by \
+                       request path, e.g. '/section/economy'.
+      hits (dict): number of requests received per path.
+      failures (dict): lists of (status, headers) tuples per path; each \
+                       request to the path is answered with the next one \
+                       until the list is empty.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, fixtures=None, handler=FixtureHandler):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), handler)
+        self.fixtures = fixtures if fixtures is not None else {}
+        self.hits = {}
+        self.failures = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        """Base URL of the server, ending with a slash."""
+        return 'http://127.0.0.1:%d/' % self.server_address[1]
+
+    def start(self):
+        """Serve requests in a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       args=(0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        self.shutdown()
+        self.server_close()
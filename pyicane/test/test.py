@@ -3,8 +3,36 @@
 
 """
 from pyicane import pyicane
+from StringIO import StringIO
+import json
+from pyicane import batch
+from pyicane.batch import build_frames, cache_bodies
+from pyicane.bulk import AsyncClient
+from pyicane.cache import ResponseCache
+from pyicane.catalog import Catalog, DATA_SET_DEPTH
+from pyicane.decoders import OrderedObject, available, get_decoder
+from pyicane.export import ArrowStore, frame_table, table_frame, pa
+from pyicane import instrumentation
+from pyicane.index import MetadataIndex
+from pyicane.registry import Registry, set_registry
+from pyicane.store import SeriesStore
+from pyicane.sync import Snapshot, update_dates
+from pyicane.transport import RetryPolicy, TokenBucket, retry_after
+from pyicane.test.benchmark import bench_decoders, bench_merge, \
+    bench_pipeline, compare, list_data_frame, recursive_flatten_data
+from pyicane.test.fixtures import cube_fixture, data_fixture, \
+    entity_fixture, time_series_fixture, tree_fixture
+import os
+import shutil
+import tempfile
+from pyicane.test.server import FixtureServer
+import threading
+import time
 import unittest
+import gc
+import weakref
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from datetime import datetime
 import pandas as pd
@@ -61,6 +89,181 @@ class TestGenericMethods(unittest.TestCase):
         self.assertTrue(data[-1][3] == -0.55)
         self.assertTrue(data[0][3] == 2646.0)
 
+    def test_replace_file(self):
+        """ Test pyicane.replace_file() replaces existing files"""
+        path = tempfile.mkdtemp()
+        name = os.name
+        try:
+            for os.name in ('posix', 'nt'):
+                destination = os.path.join(path, os.name)
+                for content in ('first', 'second'):
+                    with open(destination + '.tmp', 'w') as temporary:
+                        temporary.write(content)
+                    pyicane.replace_file(destination + '.tmp', destination)
+                    with open(destination) as replaced:
+                        self.assertEqual(replaced.read(), content)
+            self.assertEqual(sorted(os.listdir(path)), ['nt', 'posix'])
+        finally:
+            os.name = name
+            shutil.rmtree(path)
+
+    def test_flatten_data_streaming(self):
+        """ Test pyicane.flatten_data() matches the recursive version """
+        resource = cube_fixture((3, 4, 5))
+        resource['data'][u'Total'] = 1.0  # mixed depths
+        rows = list(pyicane.flatten_data(resource))
+        self.assertEqual(rows, list(recursive_flatten_data(resource)))
+        self.assertEqual(len(rows), 61)
+        self.assertEqual(rows[0], [u'Dimensión 0 - 0', u'Dimensión 1 - 0',
+                                   u'1900', 1.0])
+        self.assertEqual(rows[-1], [u'Total', 1.0])
+
+    def test_data_frame(self):
+        """ Test pyicane.data_frame() matches the row-wise version """
+        resource = cube_fixture((3, 4, 5))
+        data_frame = pyicane.data_frame(resource)
+        expected = list_data_frame(resource)
+        self.assertEqual(list(data_frame.columns), list(expected.columns))
+        self.assertEqual(list(data_frame.index), list(expected.index))
+        self.assertEqual(data_frame.index.name, u'Año')
+        for column in expected.columns:
+            self.assertEqual(list(data_frame[column]), list(expected[column]))
+        self.assertEqual(data_frame[u'Valor'].dtype, 'float64')
+        self.assertEqual(data_frame[u'Dimensión 0'].dtype, 'category')
+        multi_index = pyicane.data_frame(resource, multi_index=True)
+        self.assertEqual(list(multi_index.index.names),
+                         list(resource['headers']))
+        self.assertEqual(multi_index.loc[(u'Dimensión 0 - 1',
+                                          u'Dimensión 1 - 2', u'1903'),
+                                         u'Valor'], 34.0)
+        resource = cube_fixture((2, 2, 2))
+        resource['data'][u'Total'] = 9.0  # mixed depths
+        multi_index = pyicane.data_frame(resource, multi_index=True)
+        self.assertEqual(len(multi_index), 9)
+        self.assertEqual(multi_index.index[-1][0], u'Total')
+        self.assertEqual(multi_index[u'Valor'].iloc[-1], 9.0)
+        resource = data_fixture()
+        resource['data'][u' 39000 - Municipio 0'][u'1901'] = '..'
+        data_frame = pyicane.data_frame(resource)
+        self.assertEqual(data_frame.index.name, u'Año')
+        self.assertEqual(list(data_frame[u'Valor'])[:3], [0.0, '..', 2.0])
+        resource['data'][u' 39000 - Municipio 0'][u'1901'] = u'12'
+        resource['data'][u' 39001 - Municipio 1'][u'1900'] = True
+        values = list(pyicane.data_frame(resource)[u'Valor'])
+        self.assertTrue(isinstance(values[1], unicode))
+        self.assertTrue(values[4] is True)
+        resource['data'][u' 39000 - Municipio 0'][u'1901'] = None
+        resource['data'][u' 39001 - Municipio 1'][u'1900'] = 3
+        self.assertEqual(pyicane.data_frame(resource)[u'Valor'].dtype,
+                         'float64')
+
+    def test_stream_data_frame(self):
+        """ Test pyicane.stream_data_frame() matches pyicane.data_frame() """
+        resource = cube_fixture((3, 4, 5))
+        resource['data'][u'Dimensión 0 - 1'][u'Dimensión 1 - 1'][u'1900'] = \
+            None
+        data_frame = pyicane.stream_data_frame(StringIO(json.dumps(resource)))
+        expected = pyicane.data_frame(resource)
+        self.assertTrue(data_frame.equals(expected))
+        self.assertEqual(data_frame.index.name, u'Año')
+        resource['data'][u'Total'] = 'n/a'  # mixed depths and types
+        data_frame = pyicane.stream_data_frame(StringIO(json.dumps(resource)),
+                                               multi_index=True)
+        self.assertTrue(data_frame.equals(pyicane.data_frame(
+            resource, multi_index=True)))
+        self.assertEqual(data_frame[u'Valor'].iloc[-1], 'n/a')
+
+    def test_slice_data(self):
+        """ Test pyicane.slice_data() selects matching branches only"""
+        resource = cube_fixture((3, 4, 5))
+        resource['data'][u'Total'] = 9.0  # mixed depths
+        headers = resource['headers']
+        where = {headers[0]: [u'Dimensión 0 - 1', u'Dimensión 0 - 2'],
+                 u'Año': slice(1901, 1903)}
+        sliced = pyicane.slice_data(resource, where)
+        self.assertEqual(list(sliced['data']),
+                         [u'Dimensión 0 - 1', u'Dimensión 0 - 2'])
+        self.assertEqual(len(resource['data']), 4)  # left untouched
+        full = pyicane.data_frame(resource, multi_index=True)
+        mask = full.index.get_level_values(0).isin(where[headers[0]]) & \
+            full.index.get_level_values(2).isin([u'1901', u'1902', u'1903'])
+        data_frame = pyicane.data_frame(resource, multi_index=True,
+                                        where=where)
+        self.assertEqual(len(data_frame), 24)
+        self.assertEqual(list(data_frame.index), list(full[mask].index))
+        self.assertEqual(list(data_frame[u'Valor']),
+                         list(full[mask][u'Valor']))
+        self.assertEqual(list(data_frame.index.levels[0]), where[headers[0]])
+        sliced = pyicane.slice_data(resource, {headers[1]: u'Dimensión 1 - 3'})
+        self.assertTrue(sliced['data'][u'Dimensión 0 - 0'][
+            u'Dimensión 1 - 3'] is resource['data'][u'Dimensión 0 - 0'][
+                u'Dimensión 1 - 3'])  # shared, not copied
+        self.assertEqual(pyicane.count_data_rows(sliced['data']), 15)
+        self.assertEqual(len(pyicane.data_frame(resource, where={
+            u'Año': slice(u'1903', None)})), 24)
+        self.assertEqual(len(pyicane.data_frame(resource, where={
+            u'Año': [1900], headers[0]: lambda label: label.endswith('0')})),
+                         4)
+        self.assertEqual(pyicane.data_frame(resource, multi_index=True, where={
+            headers[0]: u'Total'})[u'Valor'].tolist(), [9.0])
+        self.assertRaises(ValueError, pyicane.slice_data, resource,
+                          {u'Missing': u'x'})
+        self.assertRaises(ValueError, pyicane.slice_data, resource,
+                          {u'Año': slice(1900, 1910, 2)})
+
+    def test_merge_data_frame(self):
+        """ Test pyicane.merge_data_frame() applies only the delta"""
+        resource = data_fixture()
+        frame = pyicane.data_frame(resource)
+        data = resource['data']
+        data[u' 39000 - Municipio 0'][u'1901'] = 7.0  # updated
+        data[u' 39000 - Municipio 0'][u'1904'] = 8.0  # added
+        data[u' 39003 - Municipio 3'] = OrderedDict([(u'1900', 9.0)])
+        del data[u' 39002 - Municipio 2'][u'1903']  # removed
+        delta = pyicane.merge_data_frame(frame, resource)
+        self.assertEqual(len(frame), 12)  # left untouched
+        self.assertEqual(len(delta.changed), 3)
+        self.assertEqual(list(delta.changed[u'Valor']), [7.0, 8.0, 9.0])
+        self.assertEqual(list(delta.removed),
+                         [(u' 39002 - Municipio 2', u'1903')])
+        self.assertEqual(repr(delta), 'DataDelta(3 changed, 1 removed)')
+        expected = pyicane.data_frame(resource)
+
+        def rows(data_frame):
+            """Sorted (label, year, value) rows."""
+            return sorted(zip(data_frame[u'Municipios'], data_frame.index,
+                              data_frame[u'Valor']))
+
+        self.assertEqual(rows(delta.frame), rows(expected))
+        self.assertEqual(delta.frame[u'Municipios'].dtype, 'category')
+        multi_index = pyicane.merge_data_frame(
+            pyicane.data_frame(data_fixture(), multi_index=True), resource)
+        self.assertEqual(sorted(multi_index.frame.index),
+                         sorted(pyicane.data_frame(resource,
+                                                   multi_index=True).index))
+        self.assertEqual(multi_index.frame.loc[
+            (u' 39000 - Municipio 0', u'1901'), u'Valor'], 7.0)
+        unchanged = pyicane.merge_data_frame(expected, resource)
+        self.assertTrue(unchanged.empty)
+        self.assertTrue(unchanged.frame is expected)
+        sliced = pyicane.merge_data_frame(
+            pyicane.data_frame(data_fixture(), where={u'Año': u'1901'}),
+            resource, where={u'Año': u'1901'})
+        self.assertEqual(list(sliced.changed[u'Valor']), [7.0])
+        self.assertEqual(len(sliced.removed), 0)
+        plain = pyicane.data_frame(data_fixture())
+        plain[u'Municipios'] = plain[u'Municipios'].astype(object)
+        rebuilt = pyicane.merge_data_frame(plain, resource)
+        self.assertEqual(rows(rebuilt.frame), rows(expected))
+        self.assertEqual(list(rebuilt.changed[u'Valor']), [7.0, 8.0, 9.0])
+        resource['headers'] = [u'Comarcas', u'Año']
+        resource['data'] = OrderedDict(
+            [(u'Comarca 0', OrderedDict([(u'1900', 1.0)]))])
+        renamed = pyicane.merge_data_frame(frame, resource)
+        self.assertEqual(list(renamed.frame.columns), [u'Comarcas', u'Valor'])
+        self.assertEqual(len(renamed.changed), 1)
+        self.assertEqual(len(renamed.removed), 12)
+
     def test_add_query_string_params(self):
         """ Test pyicane.add_query_string_params() """
         self.assertTrue(pyicane.add_query_string_params('non-olap-native') ==
@@ -84,6 +287,1422 @@ class TestGenericMethods(unittest.TestCase):
                         'survey-bases')
 
 
+class TestBaseEntity(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.BaseEntity class """
+    def setUp(self):
+        self.response = tree_fixture(3, 3)
+
+    def test_lazy(self):
+        """ Test lazy conversion of nested dicts"""
+        eager = [pyicane.TimeSeries(node) for node in tree_fixture(3, 3)]
+        lazy = [pyicane.TimeSeries(node, lazy=True) for node in self.response]
+        self.assertEqual(eager, lazy)
+        self.assertFalse(isinstance(dict.__getitem__(lazy[0], 'nodeType'),
+                                    pyicane.TimeSeries))
+        self.assertEqual(lazy[0].nodeType.uriTag, 'folder')
+        self.assertTrue(lazy[0]['nodeType'] is lazy[0].nodeType)
+        child = lazy[0].children[1]
+        self.assertTrue(isinstance(child, pyicane.TimeSeries))
+        self.assertTrue(isinstance(child.children[0].subsection.section,
+                                   pyicane.TimeSeries))
+        self.assertTrue(all(isinstance(value, pyicane.TimeSeries)
+                            for value in lazy[1].values()
+                            if isinstance(value, dict)))
+        self.assertEqual(list(pyicane.flatten_metadata(lazy)),
+                         list(pyicane.flatten_metadata(eager)))
+        self.assertRaises(KeyError, getattr, lazy[0], 'missing')
+
+    def test_lazy_dict_methods(self):
+        """ Test dict methods of lazy entities match eager ones"""
+        eager = pyicane.TimeSeries(tree_fixture(3, 3)[0])
+        lazy = pyicane.TimeSeries(self.response[0], lazy=True)
+        self.assertEqual(eager.get('nodeType').uriTag, 'folder')
+        self.assertEqual(lazy.get('nodeType').uriTag, 'folder')
+        self.assertTrue(lazy.get('nodeType') is lazy.nodeType)
+        self.assertEqual(lazy.get('missing', 1), eager.get('missing', 1))
+        self.assertTrue(isinstance(lazy.get('children')[0],
+                                   pyicane.TimeSeries))
+        self.assertEqual(lazy.setdefault('category').uriTag,
+                         eager.setdefault('category').uriTag)
+        self.assertTrue(isinstance(lazy.copy()['dataSet'],
+                                   pyicane.TimeSeries))
+        self.assertEqual(lazy.copy(), eager.copy())
+        periodicity = lazy.pop('periodicity')
+        self.assertEqual(periodicity.title, eager.pop('periodicity').title)
+        self.assertFalse('periodicity' in lazy)
+        self.assertEqual(lazy.pop('periodicity', None), None)
+        self.assertRaises(KeyError, lazy.pop, 'periodicity')
+        lazy.setdefault('periodicity', periodicity)
+        self.assertTrue(lazy.periodicity is periodicity)
+        for cls in (pyicane.TimeSeries, pyicane.Category, pyicane.Class):
+            self.assertTrue(cls.get.__self__ is cls)  # API lookups
+
+    def test_eager_get(self):
+        """ Test get() on eager entities reads their keys"""
+        node = pyicane.TimeSeries(self.response[0])
+        self.assertTrue(node.get('nodeType') is node.nodeType)
+        self.assertEqual(node.get('nodeType').uriTag, 'folder')
+        self.assertEqual(node.get('missing'), None)
+        self.assertEqual(node.get('missing', u'default'), u'default')
+        self.assertEqual(pyicane.Category(entity_fixture(
+            1, 'regional-data', 'Regional')).get('uriTag'), 'regional-data')
+
+    def test_lazy_threads(self):
+        """ Test lazy values are converted once by concurrent readers"""
+        for _ in range(20):
+            node = pyicane.TimeSeries(tree_fixture(2, 8)[0], lazy=True)
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                children = list(executor.map(lambda _: node.children,
+                                             range(8)))
+                nodes = list(executor.map(lambda _: node.nodeType,
+                                          range(8)))
+            self.assertTrue(all(value is node.children for value in children))
+            self.assertTrue(all(value is node.nodeType for value in nodes))
+            self.assertTrue(all(isinstance(child, pyicane.TimeSeries)
+                                for child in node.children))
+
+    def test_lazy_class(self):
+        """ Test pyicane.BaseEntity.lazy_"""
+        pyicane.TimeSeries.lazy_ = True
+        try:
+            node = pyicane.TimeSeries(self.response[0])
+        finally:
+            pyicane.TimeSeries.lazy_ = False
+        self.assertFalse(isinstance(dict.__getitem__(node, 'category'),
+                                    pyicane.TimeSeries))
+        self.assertEqual(node.category.title, 'Datos regionales')
+
+
+class TestNodeDigest(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.NodeDigest class """
+    def setUp(self):
+        self.nodes = [pyicane.TimeSeries(node) for node in tree_fixture(2, 3)]
+
+    def test_node_digest(self):
+        """ Test pyicane.node_digest_model() records"""
+        digest = pyicane.node_digest_model(self.nodes[0])
+        self.assertEqual(len(digest), len(pyicane.NODE_DIGEST_COLUMNS))
+        self.assertEqual(digest[30], 'Trimestral')
+        self.assertEqual(digest.periodicty, 'Trimestral')
+        self.assertEqual(digest.uriTag, digest[19])
+        self.assertEqual(pyicane.NodeDigest.__slots__, ())
+
+    def test_digests_to_dataframe(self):
+        """ Test pyicane.digests_to_dataframe()"""
+        digests = list(pyicane.flatten_metadata(self.nodes))
+        data_frame = pyicane.digests_to_dataframe(digests)
+        self.assertEqual(list(data_frame.columns),
+                         list(pyicane.NODE_DIGEST_COLUMNS))
+        self.assertEqual(len(data_frame), 12)
+        self.assertEqual(list(data_frame.iloc[1]), list(digests[1]))
+        self.assertTrue(data_frame.equals(pd.DataFrame(
+            [list(digest) for digest in digests],
+            columns=pyicane.NODE_DIGEST_COLUMNS)))
+        self.assertTrue(self.nodes[0].metadata_as_dataframe(
+            parse_dates=False).equals(data_frame.iloc[:4]))
+        self.assertEqual(len(pyicane.digests_to_dataframe([]).columns), 35)
+
+    def test_flatten_metadata(self):
+        """ Test pyicane.flatten_metadata() filters and column selection"""
+        ids = [digest.id for digest in pyicane.flatten_metadata(self.nodes)]
+        self.assertEqual(ids, range(1, 13))
+        self.assertEqual([digest.id for digest in pyicane.flatten_metadata(
+            self.nodes[2])], [9, 10, 11, 12])
+        leaves = pyicane.node_filter(node_types=['time-series'])
+        self.assertEqual(list(pyicane.flatten_metadata(
+            self.nodes, where=leaves, columns=['id'])),
+                         [(2,), (3,), (4,), (6,), (7,), (8,), (10,), (11,),
+                          (12,)])
+        self.nodes[1]['active'] = False
+        self.nodes[0].children[0]['periodicity'] = None
+        day = 86400000
+        self.assertEqual(list(pyicane.flatten_metadata(
+            self.nodes, where=pyicane.node_filter(
+                periodicities=['quarterly'], since=1400000000000 + 2 * day,
+                until=1400000000000 + 10 * day),
+            prune=pyicane.node_filter(active=False),
+            columns=['uriTag', 'id'])),
+                         [('node-3', 3), ('node-4', 4), ('node-9', 9)])
+        self.assertRaises(ValueError, list, pyicane.flatten_metadata(
+            self.nodes, columns=['missing']))
+        self.assertRaises(ValueError, pyicane.node_filter, date='missing')
+        data_frame = pyicane.metadata_frame(
+            self.nodes, where=leaves, prune=pyicane.node_filter(active=False),
+            columns=['uriTag', 'lastUpdated'])
+        self.assertEqual(list(data_frame.columns), ['uriTag', 'lastUpdated'])
+        self.assertEqual(len(data_frame), 6)
+        self.assertEqual(data_frame['lastUpdated'].dtype.kind, 'M')
+        self.assertRaises(ValueError, pyicane.metadata_frame, self.nodes,
+                          columns=[])
+        self.assertRaises(ValueError, pyicane.metadata_frame, self.nodes,
+                          columns=['missing'])
+
+    def test_metadata_frame(self):
+        """ Test pyicane.metadata_frame() date columns"""
+        self.nodes[1]['dataUpdate'] = None
+        digests = pyicane.digests_to_dataframe(
+            pyicane.flatten_metadata(self.nodes))
+        strings = pyicane.metadata_frame(self.nodes, parse_dates=False)
+        self.assertTrue(strings.equals(digests))
+        data_frame = pyicane.metadata_frame(self.nodes)
+        self.assertEqual(list(data_frame.columns),
+                         list(pyicane.NODE_DIGEST_COLUMNS))
+        for column in pyicane.DATE_COLUMNS:
+            self.assertEqual(data_frame[column].dtype.kind, 'M')
+        self.assertEqual(data_frame['dateCreated'][0],
+                         pd.Timestamp(1300000000000, unit='ms'))
+        millis = [digest.lastUpdated for digest in
+                  pyicane.flatten_metadata(self.nodes, timestamps=True)]
+        self.assertEqual(list(data_frame['lastUpdated']),
+                         list(pd.to_datetime(millis, unit='ms')))
+        missing = data_frame['id'] == self.nodes[1].id
+        self.assertTrue(data_frame['dataUpdate'][missing].isnull().all())
+        self.assertEqual(data_frame['dataUpdate'].isnull().sum(), 1)
+        self.assertTrue(data_frame.drop(list(pyicane.DATE_COLUMNS), 1).equals(
+            digests.drop(list(pyicane.DATE_COLUMNS), 1)))
+        self.assertEqual(len(pyicane.metadata_frame([])), 0)
+
+
+class TestClient(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.Client class """
+    def setUp(self):
+        self.server = FixtureServer({
+            '/section/economy': OrderedDict([('id', 2),
+                                             ('title', u'Economía'),
+                                             ('uriTag', 'economy')])}).start()
+        self.client = pyicane.Client(self.server.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_request(self):
+        """ Test pyicane.Client.request()"""
+        section = pyicane.Section(self.client.request('section/economy'))
+        self.assertEqual(section.uriTag, 'economy')
+        self.assertRaises(requests.exceptions.HTTPError,
+                          self.client.request, 'section/economic')
+
+    def test_pool_stats(self):
+        """ Test pyicane.Client.pool_stats()"""
+        for _ in range(5):
+            self.client.request('section/economy')
+        stats = self.client.pool_stats()
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['reused'], 4)
+
+    def test_stream(self):
+        """ Test pyicane.Client.stream()"""
+        self.server.fixtures['/data/series.json'] = json.dumps(data_fixture())
+        time_series = pyicane.TimeSeries(time_series_fixture(
+            1, 'series', self.server.url + 'data/series'))
+        default_client = pyicane.get_client()
+        pyicane.set_client(self.client)
+        try:
+            data_frame = time_series.data_as_dataframe(stream=True)
+            self.assertTrue(data_frame.equals(
+                time_series.data_as_dataframe()))
+        finally:
+            pyicane.set_client(default_client)
+        self.assertEqual(self.client.pool_stats()['connections'], 1)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.client.stream('data/missing.json')
+
+    def test_slice(self):
+        """ Test pyicane.TimeSeries.slice()"""
+        self.server.fixtures['/data/series.json'] = json.dumps(data_fixture())
+        time_series = pyicane.TimeSeries(time_series_fixture(
+            1, 'series', self.server.url + 'data/series'))
+        default_client = pyicane.get_client()
+        pyicane.set_client(self.client)
+        try:
+            data_frame = time_series.slice({u'Municipios':
+                                            u' 39001 - Municipio 1',
+                                            u'Año': slice(1902, None)})
+            self.assertTrue(data_frame.equals(time_series.data_as_dataframe(
+                where={u'Municipios': [u' 39001 - Municipio 1'],
+                       u'Año': [u'1902', u'1903']})))
+            self.assertRaises(ValueError, time_series.data_as_dataframe,
+                              stream=True, where={u'Año': u'1900'})
+        finally:
+            pyicane.set_client(default_client)
+        self.assertEqual(list(data_frame.index), [u'1902', u'1903'])
+        self.assertEqual(list(data_frame[u'Valor']), [1002.0, 1003.0])
+
+    def test_single_flight(self):
+        """ Test concurrent requests for the same URL are coalesced"""
+        started = threading.Event()
+        release = threading.Event()
+        download = self.client.download
+
+        def slow_download(url):
+            """Hold the first download until every caller is waiting."""
+            started.set()
+            release.wait(5)
+            return download(url)
+
+        self.client.download = slow_download
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(self.client.request,
+                                       'section/economy')]
+            started.wait(5)
+            futures.extend(executor.submit(self.client.request,
+                                           'section/economy')
+                           for _ in range(3))
+            while self.client.flights.stats['calls'] < 4:
+                time.sleep(0.01)
+            release.set()
+            responses = [future.result() for future in futures]
+        self.assertEqual(self.server.hits['/section/economy'], 1)
+        self.assertTrue(all(response == responses[0]
+                            for response in responses))
+        self.assertEqual(len(set(map(id, responses))), 4)  # not shared
+        self.assertEqual(self.client.flights.stats,
+                         {'calls': 4, 'flights': 1, 'coalesced': 3})
+        self.client.request('section/economy')  # results are not kept
+        self.assertEqual(self.server.hits['/section/economy'], 2)
+        client = pyicane.Client(self.server.url, single_flight=False)
+        self.assertEqual(client.flights, None)
+        self.assertEqual(client.request('section/economy')['id'], 2)
+        client.close()
+
+    def test_single_flight_entities(self):
+        """ Test entities built from a coalesced flight share no objects"""
+        self.server.fixtures['/time-series/folder'] = tree_fixture(2, 2)[0]
+        started = threading.Event()
+        release = threading.Event()
+        download = self.client.download
+
+        def slow_download(url):
+            """Hold the download until both callers are waiting."""
+            started.set()
+            release.wait(5)
+            return download(url)
+
+        def build():
+            """Build a TimeSeries, converting its children."""
+            return pyicane.TimeSeries(self.client.request(
+                'time-series/folder'))
+
+        self.client.download = slow_download
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(build)]
+            started.wait(5)
+            futures.append(executor.submit(build))
+            while self.client.flights.stats['calls'] < 2:
+                time.sleep(0.01)
+            release.set()
+            first, second = [future.result() for future in futures]
+        self.assertEqual(self.client.flights.stats['coalesced'], 1)
+        self.assertEqual(first, second)
+        self.assertFalse(first.children is second.children)
+        self.assertFalse(first.children[0] is second.children[0])
+        self.assertFalse(first.measures is second.measures)
+
+    def test_decoder(self):
+        """ Test responses are decoded by the client decoder"""
+        self.server.fixtures['/data/series.json'] = json.dumps(data_fixture())
+        expected = pyicane.data_frame(self.client.request('data/series.json'))
+        for name in available():
+            client = pyicane.Client(self.server.url, decoder=name)
+            self.assertEqual(client.decoder.name, name)
+            resource = client.request('data/series.json')
+            self.assertTrue(pyicane.data_frame(resource).equals(expected))
+            client.close()
+        self.assertRaises(ValueError, pyicane.Client, self.server.url,
+                          decoder='missing')
+
+    def test_module_client(self):
+        """ Test pyicane.set_client()"""
+        default_client = pyicane.get_client()
+        pyicane.set_client(self.client)
+        try:
+            self.assertEqual(pyicane.Section.get('economy').id, 2)
+        finally:
+            pyicane.set_client(default_client)
+
+
+class TestDecoders(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.decoders module """
+    def test_ordered_object(self):
+        """ Test OrderedObject keeps the order of keys"""
+        keys = ['z', 'b', 'y', 'a', 'x']
+        mapping = OrderedObject([(key, i) for i, key in enumerate(keys)])
+        self.assertEqual(list(mapping), keys)
+        self.assertEqual(mapping.keys(), keys)
+        self.assertEqual(list(OrderedObject(iter(mapping.items()))), keys)
+        self.assertEqual(list(OrderedObject(
+            (key, i) for i, key in enumerate(keys))), keys)
+        self.assertEqual(mapping.values(), range(5))
+        self.assertEqual(list(mapping.iteritems()), zip(keys, range(5)))
+        mapping['c'] = 5
+        mapping['z'] = 6
+        del mapping['b']
+        self.assertEqual(mapping.pop('y'), 2)
+        self.assertEqual(mapping.items(), [('z', 6), ('a', 3), ('x', 4),
+                                           ('c', 5)])
+        self.assertEqual(mapping.popitem(), ('c', 5))
+        mapping.update([('d', 7)], e=8)
+        self.assertEqual(mapping.setdefault('d', 0), 7)
+        self.assertEqual(list(mapping), ['z', 'a', 'x', 'd', 'e'])
+        self.assertEqual(mapping, {'z': 6, 'a': 3, 'x': 4, 'd': 7, 'e': 8})
+        self.assertEqual(list(mapping.copy()), list(mapping))
+        self.assertEqual(list(OrderedObject([('a', 1), ('b', 2),
+                                             ('a', 3)]).items()),
+                         [('a', 3), ('b', 2)])
+
+    def test_get_decoder(self):
+        """ Test decoders keep the order of keys of decoded objects"""
+        body = json.dumps(OrderedDict(
+            (str(i), OrderedDict([('b', i), ('a', [i])]))
+            for i in range(100, 0, -1)))
+        expected = get_decoder().loads(body)
+        self.assertTrue(isinstance(expected, OrderedDict))
+        self.assertEqual(available()[-1], 'json')
+        self.assertEqual(get_decoder('auto').name, available()[0])
+        for name in available():
+            decoded = get_decoder(name).loads(body)
+            self.assertEqual(decoded, expected)
+            self.assertEqual(list(decoded), list(expected))
+            self.assertEqual(list(decoded['1']), ['b', 'a'])
+        self.assertRaises(ValueError, get_decoder, 'missing')
+
+
+class TestSingleFlight(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.SingleFlight class """
+    def test_run(self):
+        """ Test values and exceptions are shared by waiting callers"""
+        flights = pyicane.SingleFlight()
+        release = threading.Event()
+
+        def fail():
+            """Fail once every caller is waiting."""
+            release.wait(5)
+            raise ValueError('failed')
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(flights.run, 'key', fail)
+                       for _ in range(3)]
+            while flights.stats['calls'] < 3:
+                time.sleep(0.01)
+            release.set()
+            errors = [future.exception() for future in futures]
+        self.assertTrue(all(isinstance(error, ValueError)
+                            for error in errors))
+        self.assertEqual(flights.stats['flights'], 1)
+        self.assertEqual(flights.run('key', lambda: 1), 1)
+        self.assertEqual(flights.flights, {})
+
+
+class TestTransport(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.transport module """
+    def setUp(self):
+        self.server = FixtureServer({
+            '/section/economy': entity_fixture(2, 'economy', u'Economía')
+        }).start()
+        self.delays = []
+        self.retry = RetryPolicy(max_retries=3, sleep=self.delays.append)
+        self.client = pyicane.Client(self.server.url, retry=self.retry)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_retry(self):
+        """ Test transient failures are retried"""
+        self.server.failures['/section/economy'] = [
+            (503, {}), (500, {}), (429, {'Retry-After': '2'})]
+        self.assertEqual(self.client.request('section/economy')['id'], 2)
+        self.assertEqual(self.server.hits['/section/economy'], 4)
+        self.assertEqual(len(self.delays), 3)
+        self.assertTrue(0 <= self.delays[0] <= 0.5)
+        self.assertTrue(0 <= self.delays[1] <= 1)
+        self.assertEqual(self.delays[2], 2)
+        self.assertEqual(self.retry.stats['attempts'], 4)
+        self.assertEqual(self.retry.stats['retries'], 3)
+        self.assertEqual(self.retry.stats['gave_up'], 0)
+
+    def test_give_up(self):
+        """ Test permanent and persistent failures are raised"""
+        self.server.failures['/section/economy'] = [(503, {})] * 5
+        self.assertRaises(requests.exceptions.HTTPError,
+                          self.client.request, 'section/economy')
+        self.assertEqual(self.server.hits['/section/economy'], 4)
+        self.assertEqual(self.retry.stats['gave_up'], 1)
+        self.assertRaises(requests.exceptions.HTTPError,
+                          self.client.request, 'section/economic')
+        self.assertEqual(self.server.hits['/section/economic'], 1)
+        client = pyicane.Client('http://127.0.0.1:1/', retry=self.retry)
+        self.assertRaises(requests.exceptions.ConnectionError,
+                          client.request, 'section/economy')
+        self.assertEqual(self.retry.stats['gave_up'], 2)
+        client.close()
+
+    def test_backoff(self):
+        """ Test delays grow exponentially up to max_backoff"""
+        retry = RetryPolicy(backoff=1, max_backoff=5, jitter=False)
+        self.assertEqual([retry.delay(attempt) for attempt in range(5)],
+                         [1, 2, 4, 5, 5])
+        response = requests.Response()
+        response.headers['Retry-After'] = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        self.assertEqual(retry_after(response, now=1445412470), 10)
+        self.assertEqual(retry.delay(0, response), 0)
+
+    def test_token_bucket(self):
+        """ Test requests are spaced out past the bucket capacity"""
+        clock = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            """Advance the fake clock."""
+            waits.append(seconds)
+            clock[0] += seconds
+
+        bucket = TokenBucket(2, capacity=3, clock=lambda: clock[0],
+                             sleep=sleep)
+        for _ in range(5):
+            bucket.acquire()
+        self.assertEqual(waits, [0.5, 0.5])
+        self.assertEqual(bucket.stats, {'acquired': 5, 'throttled': 2,
+                                        'waited': 1.0})
+        clock[0] += 10
+        self.assertEqual(bucket.acquire(), 0)
+        client = pyicane.Client(self.server.url, rate_limiter=bucket)
+        client.request('section/economy')
+        self.assertEqual(bucket.stats['acquired'], 7)
+        client.close()
+
+
+class TestInstrumentation(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.instrumentation module """
+    def setUp(self):
+        self.metrics = instrumentation.add_hook(instrumentation.Metrics())
+        self.events = []
+        self.callbacks = instrumentation.add_hook(
+            instrumentation.CallbackHook(
+                lambda stage, info: self.events.append(('before', stage)),
+                lambda stage, info, seconds, error: self.events.append(
+                    ('after', stage))))
+
+    def tearDown(self):
+        instrumentation.remove_hook(self.metrics)
+        instrumentation.remove_hook(self.callbacks)
+
+    def test_stages(self):
+        """ Test every stage is reported with its bytes and rows"""
+        server = FixtureServer({'/data/series.json': data_fixture()}).start()
+        client = pyicane.Client(server.url)
+        try:
+            resource = client.request('data/series.json')
+        finally:
+            client.close()
+            server.stop()
+        pyicane.data_frame(resource)
+        pyicane.TimeSeries(time_series_fixture(1, 'series', server.url))
+        self.assertEqual(self.events, [
+            ('before', 'request'), ('after', 'request'),
+            ('before', 'parse'), ('after', 'parse'),
+            ('before', 'flatten'), ('after', 'flatten'),
+            ('before', 'dataframe'), ('after', 'dataframe'),
+            ('before', 'entity'), ('after', 'entity')])
+        stats = self.metrics.snapshot()
+        body = len(json.dumps(data_fixture()))
+        self.assertEqual(stats['request']['bytes'], body)
+        self.assertEqual(stats['parse']['bytes'], body)
+        self.assertEqual(stats['flatten']['rows'], 12)
+        self.assertEqual(stats['dataframe']['rows'], 12)
+        self.assertEqual(stats['entity']['count'], 1)
+        text = self.metrics.prometheus()
+        self.assertTrue('pyicane_stage_seconds_count{stage="parse"} 1\n'
+                        in text)
+        self.assertTrue('pyicane_stage_rows_total{stage="flatten"} 12\n'
+                        in text)
+        self.assertTrue('pyicane_stage_seconds_bucket{stage="entity",'
+                        'le="+Inf"} 1\n' in text)
+
+    def test_errors(self):
+        """ Test failed stages and failing hooks"""
+        instrumentation.add_hook(instrumentation.CallbackHook(
+            lambda stage, info: 1 / 0))
+        try:
+            self.assertRaises(ValueError, pyicane.data_frame, OrderedDict(
+                [('headers', [u'Año']), ('data', {'1900': {'a': 1}})]))
+        finally:
+            instrumentation.remove_hook(instrumentation.HOOKS[-1])
+        self.assertEqual(self.metrics.snapshot()['flatten']['errors'], 1)
+
+    def test_disabled(self):
+        """ Test spans do nothing without hooks"""
+        instrumentation.remove_hook(self.metrics)
+        instrumentation.remove_hook(self.callbacks)
+        self.assertEqual(instrumentation.HOOKS, ())
+        self.assertTrue(instrumentation.span('parse') is
+                        instrumentation.NULL_SPAN)
+        pyicane.data_frame(data_fixture())
+        self.assertEqual(self.events, [])
+
+
+class TestBenchmark(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.test.benchmark module """
+    def test_bench_pipeline(self):
+        """ Test every pipeline stage is timed"""
+        results = bench_pipeline(depth=2, breadth=2, shape=(2, 3), repeat=1)
+        self.assertEqual(sorted(results), [
+            'data_as_dataframe', 'entity', 'flatten_data',
+            'flatten_metadata', 'metadata_as_dataframe', 'parse_data',
+            'parse_metadata', 'request_data', 'request_metadata'])
+        self.assertTrue(all(result['seconds'] >= 0
+                            for result in results.values()))
+
+    def test_bench_merge(self):
+        """ Test merging is timed against rebuilding"""
+        results = bench_merge(shape=(2, 3, 4), repeat=1)
+        self.assertEqual(sorted(results), ['merge', 'parse', 'rebuild'])
+        self.assertEqual(results['merge']['rows'], 6)
+
+    def test_bench_decoders(self):
+        """ Test every installed decoder is timed"""
+        results = bench_decoders(depth=2, breadth=2, shape=(2, 3), repeat=1)
+        self.assertEqual(sorted(results), sorted(available()))
+        self.assertTrue(all(result['data']['seconds'] >= 0 and
+                            result['metadata']['seconds'] >= 0
+                            for result in results.values()))
+
+    def test_compare(self):
+        """ Test regressions are detected beyond the tolerance"""
+        baseline = {'pipeline': {'parse': {'seconds': 1.0},
+                                 'flatten': {'seconds': 1.0},
+                                 'noise': {'seconds': 0.0001}},
+                    'data_frame': {'rows': {'seconds': 1.0,
+                                            'bytes': 100}}}
+        results = {'pipeline': {'parse': {'seconds': 1.2},
+                                'flatten': {'seconds': 1.5},
+                                'noise': {'seconds': 0.01}},
+                   'data_frame': {'rows': {'seconds': 0.5, 'bytes': 900}}}
+        self.assertEqual(compare(results, baseline),
+                         [('pipeline.flatten.seconds', 1.0, 1.5)])
+        self.assertEqual(compare(results, baseline, tolerance=0.1), [
+            ('pipeline.flatten.seconds', 1.0, 1.5),
+            ('pipeline.parse.seconds', 1.0, 1.2)])
+
+
+class TestResponseCache(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.cache.ResponseCache class """
+    def setUp(self):
+        self.server = FixtureServer({
+            '/node-type/document': {'id': 5, 'title': 'Documento'},
+            '/section/economy': {'id': 2, 'uriTag': 'economy'},
+            '/data/last-updated': 1400000000000,
+            '/metadata/last-updated': 1400000000000}).start()
+        self.cache = ResponseCache(':memory:', ttl={'section': 0})
+        self.client = pyicane.Client(self.server.url, cache=self.cache)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_ttl(self):
+        """ Test fresh responses are served from the cache"""
+        for _ in range(3):
+            self.assertEqual(self.client.request('node-type/document')['id'],
+                             5)
+            self.client.request('section/economy')
+        self.assertEqual(self.server.hits['/node-type/document'], 1)
+        self.assertEqual(self.server.hits['/section/economy'], 3)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_revalidation(self):
+        """ Test stale responses are revalidated"""
+        self.client.request('node-type/document')
+        self.cache.invalidate()
+        self.assertEqual(self.client.request('node-type/document')['title'],
+                         'Documento')
+        self.assertEqual(self.server.hits['/node-type/document'], 2)
+        self.assertEqual(self.cache.stats['revalidated'], 1)
+        self.server.fixtures['/node-type/document']['title'] = 'Doc'
+        self.cache.invalidate()
+        self.assertEqual(self.client.request('node-type/document')['title'],
+                         'Doc')
+
+    def test_eviction(self):
+        """ Test least recently used responses are evicted"""
+        self.cache.put('a', 'x' * 40, ttl=60)
+        self.cache.put('b', 'x' * 40, ttl=60)
+        self.cache.get('a')
+        self.cache.max_size = 100
+        self.cache.put('c', 'x' * 40, ttl=60)
+        self.assertTrue(self.cache.get('b') is None)
+        self.assertEqual(self.cache.get('a').body, 'x' * 40)
+        self.assertEqual(self.cache.size(), 80)
+
+    def test_validate_cache(self):
+        """ Test pyicane.Client.validate_cache()"""
+        self.client.request('node-type/document')
+        self.assertFalse(self.client.validate_cache())
+        self.assertFalse(self.client.validate_cache())
+        self.server.fixtures['/data/last-updated'] = 1500000000000
+        self.assertTrue(self.client.validate_cache())
+        self.assertFalse(self.cache.get('%snode-type/document' %
+                                        self.server.url).is_fresh())
+        self.assertEqual(self.cache.watermark('data'), 1500000000000)
+
+
+class TestAsyncClient(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.bulk.AsyncClient class """
+    def setUp(self):
+        self.server = FixtureServer().start()
+        self.uri_tags = ['series-%d' % i for i in range(10)]
+        for i, uri_tag in enumerate(self.uri_tags):
+            data_url = self.server.url + 'data/' + uri_tag
+            self.server.fixtures['/time-series/' + uri_tag] = \
+                time_series_fixture(i, uri_tag, data_url)
+            self.server.fixtures['/data/' + uri_tag + '.json'] = \
+                data_fixture(municipalities=i + 1)
+        self.client = pyicane.Client(self.server.url)
+        self.async_client = AsyncClient(self.client, max_in_flight=4)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_get_many(self):
+        """ Test pyicane.bulk.AsyncClient.get_many()"""
+        results = dict((result.item, result.value) for result in
+                       self.async_client.get_many(self.uri_tags))
+        self.assertEqual(sorted(results), sorted(self.uri_tags))
+        self.assertTrue(isinstance(results['series-3'], pyicane.TimeSeries))
+        self.assertEqual(results['series-3'].nodeType.uriTag, 'time-series')
+        self.assertTrue(self.client.pool_stats()['connections'] <= 4)
+
+    def test_data_frames(self):
+        """ Test pyicane.bulk.AsyncClient.data_frames()"""
+        results = dict((result.item, result.value) for result in
+                       self.async_client.data_frames(self.uri_tags))
+        self.assertEqual(len(results['series-2']), 12)
+        self.assertEqual(results['series-2'].index.name, u'Año')
+
+    def test_error(self):
+        """ Test errors are captured per item"""
+        results = dict((result.item, result) for result in
+                       self.async_client.get_many(['series-1', 'missing']))
+        self.assertTrue(results['series-1'].ok)
+        self.assertFalse(results['missing'].ok)
+        self.assertTrue(isinstance(results['missing'].error,
+                                   requests.exceptions.HTTPError))
+
+
+class TestFetchMany(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.fetch_many() """
+    def setUp(self):
+        self.server = FixtureServer().start()
+        self.uri_tags = ['series-%d' % i for i in range(6)]
+        for i, uri_tag in enumerate(self.uri_tags):
+            data_url = self.server.url + 'data/' + uri_tag
+            self.server.fixtures['/time-series/' + uri_tag] = \
+                time_series_fixture(i, uri_tag, data_url)
+            self.server.fixtures['/time-series/' + uri_tag + '/parents'] = \
+                [time_series_fixture(100, 'parent', data_url, 'data-set')]
+            self.server.fixtures['/data/' + uri_tag + '.json'] = \
+                data_fixture()
+        self.default_client = pyicane.get_client()
+        pyicane.set_client(pyicane.Client(self.server.url))
+
+    def tearDown(self):
+        pyicane.get_client().close()
+        pyicane.set_client(self.default_client)
+        self.server.stop()
+
+    def test_get_many(self):
+        """ Test pyicane.TimeSeries.get_many()"""
+        results = list(pyicane.TimeSeries.get_many(
+            ['series-1', 'missing', 'series-2'], max_workers=2))
+        self.assertEqual([result.item for result in results],
+                         ['series-1', 'missing', 'series-2'])
+        self.assertEqual(results[0].value.id, 1)
+        self.assertFalse(results[1].ok)
+        self.assertTrue(isinstance(results[1].error,
+                                   requests.exceptions.HTTPError))
+        self.assertEqual(results[2].value.uriTag, 'series-2')
+
+    def test_as_completed(self):
+        """ Test pyicane.fetch_many() in as-completed mode"""
+        results = list(pyicane.fetch_many(pyicane.TimeSeries.get_parents,
+                                          self.uri_tags, ordered=False))
+        self.assertEqual(sorted(result.item for result in results),
+                         self.uri_tags)
+        self.assertTrue(all(result.value[0].uriTag == 'parent'
+                            for result in results))
+
+    def test_window(self):
+        """ Test pyicane.fetch_many() keeps a bounded window of results"""
+        values = []
+
+        def build(item):
+            """Build a value that can be weakly referenced."""
+            value = set([item])
+            values.append(weakref.ref(value))
+            return value
+
+        for ordered in (True, False):
+            del values[:]
+            results = pyicane.fetch_many(build, range(20), max_workers=2,
+                                         ordered=ordered)
+            for _ in range(16):
+                next(results)
+            gc.collect()
+            self.assertTrue(sum(1 for value in values
+                                if value() is not None) <= 4)
+            self.assertEqual(len(list(results)), 4)
+
+        def slow(item):
+            """Take a while."""
+            time.sleep(0.05)
+            return item
+
+        start = time.time()
+        results = pyicane.fetch_many(slow, range(200), max_workers=4)
+        self.assertEqual(next(results).item, 0)
+        results.close()
+        self.assertTrue(time.time() - start < 1)
+
+    def test_data_as_dataframe(self):
+        """ Test pyicane.fetch_many() of data frames"""
+        nodes = [result.value for result in
+                 pyicane.TimeSeries.get_many(self.uri_tags)]
+        frames = [result.value for result in
+                  pyicane.fetch_many(lambda node: node.data_as_dataframe(),
+                                     nodes, max_workers=3)]
+        self.assertEqual([len(frame) for frame in frames], [12] * 6)
+
+
+def catalog_fixtures(url):
+    """Fixtures of a catalog with a category, two sections, a subsection \
+       and two data sets sharing part of their time series trees."""
+    path = '/regional-data/economy/labour-market/'
+    shared = time_series_fixture(99, 'shared', url + 'data/shared')
+    return {
+        '/categories': [entity_fixture(1, 'regional-data', 'Regional')],
+        '/sections': [entity_fixture(2, 'economy', u'Economía'),
+                      entity_fixture(3, 'society', 'Sociedad')],
+        '/section/economy': entity_fixture(2, 'economy', u'Economía'),
+        '/section/economy/subsections': [
+            entity_fixture(5, 'labour-market', 'Mercado de Trabajo')],
+        path + 'data-sets': [
+            time_series_fixture(10, 'ds1', url + 'data/ds1', 'data-set'),
+            time_series_fixture(20, 'ds2', url + 'data/ds2', 'data-set')],
+        path + 'ds1/time-series-list': [
+            time_series_fixture(11, 'folder1', url + 'data/folder1',
+                                'folder', [time_series_fixture(
+                                    12, 'series12', url + 'data/12'),
+                                    shared])],
+        path + 'ds2/time-series-list': [shared]}
+
+
+class TestCatalog(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.catalog.Catalog class """
+    def setUp(self):
+        self.server = FixtureServer().start()
+        self.server.fixtures.update(catalog_fixtures(self.server.url))
+        self.default_client = pyicane.get_client()
+        pyicane.set_client(pyicane.Client(self.server.url))
+
+    def tearDown(self):
+        pyicane.get_client().close()
+        pyicane.set_client(self.default_client)
+        self.server.stop()
+
+    def test_crawl(self):
+        """ Test pyicane.catalog.Catalog.crawl()"""
+        catalog = Catalog(max_workers=4)
+        nodes = list(catalog.crawl())
+        self.assertEqual(sorted(node.id for node in nodes),
+                         [10, 11, 12, 20, 99])
+        self.assertTrue(all(isinstance(node, pyicane.TimeSeries)
+                            for node in nodes))
+        self.assertEqual(catalog.errors, [])
+        time_series = Catalog(node_types=['time-series']).crawl()
+        self.assertEqual(sorted(node.uriTag for node in time_series),
+                         ['series12', 'shared'])
+
+    def test_max_depth(self):
+        """ Test crawl depth limits"""
+        nodes = list(Catalog(max_depth=DATA_SET_DEPTH).crawl())
+        self.assertEqual(sorted(node.uriTag for node in nodes),
+                         ['ds1', 'ds2'])
+        self.assertFalse(any(path.endswith('time-series-list')
+                             for path in self.server.hits))
+        nodes = list(Catalog(max_depth=DATA_SET_DEPTH + 1).crawl())
+        self.assertEqual(sorted(node.id for node in nodes),
+                         [10, 11, 20, 99])
+
+    def test_checkpoint(self):
+        """ Test crawls resume from their checkpoint"""
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'crawl.json')
+        crawl = Catalog(max_workers=1, checkpoint=checkpoint,
+                        checkpoint_every=1).crawl()
+        first = [next(crawl).id for _ in range(2)]
+        crawl.close()
+        self.assertTrue(os.path.exists(checkpoint))
+        hits = dict(self.server.hits)
+        rest = [node.id for node in Catalog(checkpoint=checkpoint).crawl()]
+        self.assertEqual(sorted(set(first + rest)), [10, 11, 12, 20, 99])
+        self.assertEqual(len(rest), len(set(rest)))
+        self.assertEqual(self.server.hits['/categories'], hits['/categories'])
+        self.assertFalse(os.path.exists(checkpoint))
+
+
+class TestMetadataIndex(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.index.MetadataIndex class """
+    def setUp(self):
+        self.index = MetadataIndex(':memory:')
+        nodes = []
+        stack = [pyicane.TimeSeries(node) for node in tree_fixture(2, 2)]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(node.children)
+        nodes[0]['title'] = u'Paro registrado por municipios'
+        nodes[0]['measures'][0]['title'] = u'Demandantes'
+        self.nodes = dict((node.id, node) for node in nodes)
+        self.assertEqual(self.index.add(nodes), 6)
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_get(self):
+        """ Test lookups by id and uri_tag"""
+        self.assertEqual(len(self.index), 6)
+        node = self.index.get(3)
+        self.assertTrue(isinstance(node, pyicane.TimeSeries))
+        self.assertEqual(node.uriTag, 'node-3')
+        self.assertEqual(node.measures[1].title, u'Ocupados')
+        self.assertFalse('children' in node)
+        self.assertEqual(self.index.get_by_uri_tag('node-3').id, 3)
+        self.assertEqual(self.index.get(100), None)
+        self.assertEqual(self.index.get_by_uri_tag('missing'), None)
+
+    def test_search(self):
+        """ Test full-text search"""
+        paro = self.index.search(u'paro', field='title')
+        self.assertEqual([node.title for node in paro],
+                         [u'Paro registrado por municipios'])
+        self.assertEqual(len(self.index.search(u'paro')), 6)  # topics
+        self.assertEqual(len(self.index.search(u'demandantes',
+                                               field='measures')), 1)
+        self.assertEqual(len(self.index.search(u'descripcion')), 6)
+        self.assertEqual(
+            [node.id for node in self.index.search(
+                u'sector', node_type='time-series')], [2, 3, 5, 6])
+        self.assertEqual(len(self.index.search(u'serie*', limit=2)), 2)
+        self.assertRaises(ValueError, self.index.search, u'paro', 'uri')
+
+    def test_replace(self):
+        """ Test nodes are replaced by id"""
+        node = self.index.get(2)
+        node['title'] = u'Ocupados por sector'
+        self.index.add([node])
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual([found.id for found in self.index.search(
+            u'ocupados', field='title')], [2])
+        self.index.remove(2)
+        self.assertEqual(self.index.search(u'ocupados', field='title'), [])
+        self.assertEqual(len(self.index), 5)
+
+    def test_moved_uri_tag(self):
+        """ Test nodes whose uriTag moves to a new id leave no stale text"""
+        node = self.index.get(3)
+        node['id'] = 30
+        node['title'] = u'Afiliados a la seguridad social'
+        self.index.add([node])
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(self.index.get(3), None)
+        self.assertEqual(self.index.get_by_uri_tag('node-3').id, 30)
+        self.assertEqual(self.index.connection.execute(
+            'SELECT COUNT(*) FROM node_text').fetchone()[0], 6)
+        self.assertEqual([found.id for found in self.index.search(
+            u'serie', field='title')], [1, 2, 5, 6])
+        self.assertEqual([found.id for found in self.index.search(
+            u'afiliados')], [30])
+
+    def test_time_series_search(self):
+        """ Test pyicane.TimeSeries.search() answers without requests"""
+        server = FixtureServer().start()
+        server.fixtures.update(catalog_fixtures(server.url))
+        default_client = pyicane.get_client()
+        pyicane.set_client(pyicane.Client(server.url))
+        try:
+            index = MetadataIndex(':memory:')
+            index.add(Catalog().crawl())
+            hits = sum(server.hits.values())
+            found = pyicane.TimeSeries.search(u'serie*', index=index,
+                                              node_type='time-series')
+            self.assertEqual(sorted(node.uriTag for node in found),
+                             ['series12', 'shared'])
+            self.assertEqual(sum(server.hits.values()), hits)
+        finally:
+            pyicane.get_client().close()
+            pyicane.set_client(default_client)
+            server.stop()
+
+
+class TestSnapshot(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.sync.Snapshot class """
+    def setUp(self):
+        self.server = FixtureServer().start()
+        self.server.fixtures.update(catalog_fixtures(self.server.url))
+        self.server.fixtures.update({
+            '/data/last-updated': 1400000000000,
+            '/metadata/last-updated': 1400000000000,
+            '/data/12.json': data_fixture(2, 3)})
+        self.default_client = pyicane.get_client()
+        pyicane.set_client(pyicane.Client(self.server.url))
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        pyicane.get_client().close()
+        pyicane.set_client(self.default_client)
+        self.server.stop()
+
+    def test_update_dates(self):
+        """ Test pyicane.sync.update_dates()"""
+        dates = update_dates(1400000000000, 1400000000000 + 2 * 86400000)
+        self.assertEqual(len(dates), 3)
+        self.assertEqual(dates[0], datetime.fromtimestamp(1400000000).
+                         strftime('%d/%m/%Y'))
+
+    def test_sync(self):
+        """ Test full and incremental syncs"""
+        snapshot = Snapshot(self.path, max_workers=2)
+        report = snapshot.sync()
+        self.assertTrue(report.full)
+        self.assertEqual(sorted(report.metadata),
+                         ['ds1', 'ds2', 'folder1', 'series12', 'shared'])
+        self.assertEqual(snapshot.watermarks['data'], 1400000000000)
+        self.assertEqual(snapshot.track(['series12'])[0].ok, True)
+        self.assertEqual(snapshot.frames['series12'].shape, (6, 2))
+        snapshot.close()
+
+        hits = sum(self.server.hits.values())
+        snapshot = Snapshot(self.path)
+        report = snapshot.sync()  # quiet day
+        self.assertFalse(report.changed)
+        self.assertEqual(sum(self.server.hits.values()), hits + 2)
+
+        series12 = self.server.fixtures['/regional-data/economy/'
+                                        'labour-market/ds1/'
+                                        'time-series-list'][0]['children'][0]
+        data_update = series12['dataUpdate']
+        self.server.fixtures['/data/last-updated'] = data_update
+        stale = time_series_fixture(11, 'folder1', self.server.url)
+        stale['dataUpdate'] = 1400000000000  # not after the watermark
+        self.server.fixtures['/time-series-list?data_updated=' +
+                             update_dates(data_update, data_update)[0]] = [
+                                 series12, stale]
+        self.server.fixtures['/data/12.json'] = data_fixture(2, 5)
+        report = snapshot.sync()
+        self.assertEqual(report.data, ['series12'])
+        self.assertEqual(report.refreshed, ['series12'])
+        self.assertEqual(len(report.deltas['series12'].changed), 4)
+        self.assertEqual(len(report.deltas['series12'].removed), 0)
+        self.assertEqual(report.metadata, [])
+        self.assertEqual(snapshot.frames['series12'].shape, (10, 2))
+        self.assertEqual(snapshot.watermarks['data'], data_update)
+        snapshot.close()
+        self.assertEqual(Snapshot(self.path).frames['series12'].shape,
+                         (10, 2))
+
+    def test_sync_unchanged_data(self):
+        """ Test frames whose data did not change are not stored again"""
+        snapshot = Snapshot(self.path)
+        snapshot.sync()
+        snapshot.track(['series12'])
+        frame = snapshot.frames['series12']
+        os.remove(snapshot.frame_path('series12'))
+        data_update = 1400000000000 + 3 * 86400000
+        series12 = time_series_fixture(12, 'series12',
+                                       self.server.url + 'data/12')
+        series12['dataUpdate'] = data_update
+        self.server.fixtures['/data/last-updated'] = data_update
+        self.server.fixtures['/time-series-list?data_updated=' +
+                             update_dates(data_update, data_update)[0]] = [
+                                 series12]
+        report = snapshot.sync()
+        self.assertEqual(report.data, ['series12'])
+        self.assertEqual(report.refreshed, [])
+        self.assertTrue(snapshot.frames['series12'] is frame)
+        self.assertFalse(os.path.exists(snapshot.frame_path('series12')))
+        self.assertEqual(snapshot.watermarks['data'], data_update)
+        snapshot.close()
+
+    def test_crawl_errors(self):
+        """ Test failed listings of a full sync are reported apart"""
+        self.server.failures['/sections'] = [(503, {})]
+        snapshot = Snapshot(self.path)
+        report = snapshot.sync()
+        self.assertEqual(report.errors, [])
+        self.assertEqual([item for item, _ in report.crawl_errors],
+                         [['categories', None]])
+        self.assertEqual(snapshot.watermarks, {})
+        snapshot.close()
+
+    def test_errors_keep_watermarks(self):
+        """ Test failed downloads are retried by the next sync"""
+        snapshot = Snapshot(self.path)
+        snapshot.sync()
+        snapshot.track(['series12'])
+        del self.server.fixtures['/data/12.json']
+        data_update = 1400000000000 + 3 * 86400000
+        series12 = time_series_fixture(12, 'series12',
+                                       self.server.url + 'data/12')
+        series12['dataUpdate'] = data_update
+        self.server.fixtures['/data/last-updated'] = data_update
+        self.server.fixtures['/time-series-list?data_updated=' +
+                             update_dates(data_update, data_update)[0]] = [
+                                 series12]
+        report = snapshot.sync()
+        self.assertEqual(report.data, ['series12'])
+        self.assertEqual([uri_tag for uri_tag, _ in report.errors],
+                         ['series12'])
+        self.assertEqual(snapshot.watermarks['data'], 1400000000000)
+        snapshot.close()
+
+
+@unittest.skipIf(pa is None, 'pyarrow is not installed')
+class TestArrowStore(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.export.ArrowStore class """
+    def setUp(self):
+        self.store = ArrowStore(tempfile.mkdtemp())
+
+    def test_frame_table(self):
+        """ Test data frames round-trip through Arrow tables"""
+        for frame in (pyicane.data_frame(data_fixture()),
+                      pyicane.data_frame(cube_fixture((2, 3, 4))),
+                      pyicane.data_frame(cube_fixture((2, 3)), True)):
+            table = frame_table(frame)
+            self.assertTrue(all(pa.types.is_dictionary(field.type)
+                                for field in table.schema
+                                if field.name != 'Valor'))
+            self.assertTrue(table_frame(table).equals(frame))
+            self.assertTrue(table_frame(table).index.equals(frame.index))
+
+    def test_write_data(self):
+        """ Test data is read back from the store"""
+        frame = pyicane.data_frame(cube_fixture((2, 3, 4)))
+        self.store.write_data('cube', frame)
+        self.assertEqual(self.store.uri_tags(), ['cube'])
+        self.assertTrue(pyicane.TimeSeries.from_store(
+            'cube', self.store).equals(frame))
+        self.assertRaises(KeyError, self.store.read_data, 'missing')
+        self.store.write_data('cube', pyicane.data_frame(
+            cube_fixture((2, 3, 2))))
+        self.assertEqual(len(self.store.read_data('cube')), 12)
+
+    def test_parquet_dataset(self):
+        """ Test data partitions form a Parquet dataset"""
+        self.store.write_data('a', pyicane.data_frame(data_fixture(2, 2)))
+        self.store.write_data('b', pyicane.data_frame(data_fixture(3, 2)))
+        table = pa.parquet.ParquetDataset(os.path.join(self.store.path,
+                                                       'data')).read()
+        self.assertEqual(list(table.to_pandas().uriTag), ['a'] * 4 +
+                         ['b'] * 6)
+
+    def test_export(self):
+        """ Test bulk export of data and metadata"""
+        server = FixtureServer().start()
+        default_client = pyicane.get_client()
+        pyicane.set_client(pyicane.Client(server.url))
+        try:
+            nodes = [pyicane.TimeSeries(node) for node in
+                     tree_fixture(1, 3, server.url + 'data/')]
+            nodes[0]['nodeType']['uriTag'] = 'folder'
+            server.fixtures.update({'/data/2.json': data_fixture(),
+                                    '/data/3.json': data_fixture(2, 2)})
+            results = self.store.export(nodes, max_workers=2)
+        finally:
+            pyicane.get_client().close()
+            pyicane.set_client(default_client)
+            server.stop()
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(self.store.uri_tags(), ['node-2', 'node-3'])
+        self.assertEqual(len(self.store.read_data('node-3')), 4)
+        metadata = self.store.read_metadata()
+        self.assertEqual(list(metadata.columns),
+                         list(pyicane.NODE_DIGEST_COLUMNS))
+        self.assertEqual(list(metadata.uriTag),
+                         ['node-1', 'node-2', 'node-3'])
+        for name in pyicane.DATE_COLUMNS:
+            self.assertEqual(metadata[name].dtype.kind, 'M')
+        self.assertEqual(list(metadata.lastUpdated),
+                         list(pd.to_datetime([node.lastUpdated
+                                              for node in nodes], unit='ms')))
+
+
+@unittest.skipIf(pa is None, 'pyarrow is not installed')
+class TestBatch(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.batch module """
+    def setUp(self):
+        self.resources = [data_fixture(), cube_fixture((3, 4, 5)),
+                          cube_fixture((2, 3))]
+        self.bodies = [('http://localhost/data/%d.json' % i,
+                        json.dumps(resource))
+                       for i, resource in enumerate(self.resources)]
+
+    def test_build_frames(self):
+        """ Test frames are built by worker processes, in order"""
+        bodies = self.bodies + [('http://localhost/data/bad.json', '{')]
+        results = list(build_frames(bodies, max_workers=2))
+        self.assertEqual([result.item for result in results],
+                         [key for key, _ in bodies])
+        for result, resource in zip(results, self.resources):
+            self.assertTrue(result.ok)
+            self.assertTrue(result.value.equals(pyicane.data_frame(resource)))
+            self.assertTrue(result.value.index.equals(
+                pyicane.data_frame(resource).index))
+        self.assertFalse(results[-1].ok)
+        self.assertTrue(isinstance(results[-1].error, ValueError))
+        self.assertRaises(ValueError, list, build_frames(bodies,
+                                                         decoder='missing'))
+
+    def test_spool(self):
+        """ Test frames are exchanged through memory-mapped spool files"""
+        spool = tempfile.mkdtemp()
+        cache = ResponseCache(':memory:')
+        try:
+            for url, body in self.bodies[:2]:
+                cache.put(url, body, ttl=3600)
+            urls = [url for url, _ in self.bodies]
+            results = list(build_frames(cache_bodies(cache, urls), 1,
+                                        multi_index=True, spool=spool))
+            self.assertEqual([result.item for result in results], urls[:2])
+            for result, resource in zip(results, self.resources):
+                self.assertTrue(result.value.equals(pyicane.data_frame(
+                    resource, multi_index=True)))
+            self.assertEqual(os.listdir(spool), [])
+        finally:
+            cache.close()
+            shutil.rmtree(spool)
+
+    def test_spool_cleanup(self):
+        """ Test spool files are removed when frames are not read"""
+        spool = tempfile.mkdtemp()
+        writer = pa.RecordBatchStreamWriter
+        try:
+            frames = build_frames(self.bodies * 3, 1, spool=spool)
+            self.assertTrue(next(frames).ok)
+            frames.close()  # the consumer stops early
+            self.assertEqual(os.listdir(spool), [])
+
+            def fail(*_):
+                """Fail once the spool file has been created."""
+                raise IOError('failed')
+
+            pa.RecordBatchStreamWriter = fail
+            self.assertRaises(IOError, batch.frame_stream,
+                              self.bodies[0][1], spool=spool)
+            self.assertEqual(os.listdir(spool), [])
+        finally:
+            pa.RecordBatchStreamWriter = writer
+            shutil.rmtree(spool)
+
+
+class TestSeriesStore(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.store.SeriesStore class """
+    def setUp(self):
+        self.store = SeriesStore(tempfile.mkdtemp(), compact_ratio=None)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_write(self):
+        """ Test series are read back by uri_tag and id"""
+        cube = cube_fixture((2, 3, 4))
+        self.store.write('cube', cube, 7)
+        self.store.write('municipalities', data_fixture())
+        self.assertEqual(len(self.store), 2)
+        self.assertTrue(self.store.read_data('cube').equals(
+            pyicane.data_frame(cube)))
+        self.assertTrue(self.store.read_data(7, multi_index=True).equals(
+            pyicane.data_frame(cube, multi_index=True)))
+        self.assertTrue(pyicane.TimeSeries.from_store(
+            'municipalities', self.store).equals(
+                pyicane.data_frame(data_fixture())))
+        self.assertTrue(7 in self.store)
+        self.assertFalse('missing' in self.store)
+        self.assertRaises(KeyError, self.store.read_data, 'missing')
+        self.assertRaises(ValueError, self.store.write, 'text', OrderedDict(
+            [('headers', ['Año']), ('data', {'2000': 'n/a'})]))
+
+    def test_reopen(self):
+        """ Test series survive the store"""
+        self.store.write('cube', cube_fixture((3, 5)))
+        self.store.close()
+        self.store = SeriesStore(self.store.path)
+        headers, dimensions, values = self.store.read_columns('cube')
+        self.assertEqual(headers, [u'Dimensión 0', u'Año'])
+        self.assertEqual(list(dimensions[0].codes), [0] * 5 + [1] * 5 +
+                         [2] * 5)
+        self.assertEqual(list(values), [float(i) for i in range(1, 16)])
+
+    def test_compact(self):
+        """ Test compaction reclaims replaced and removed series"""
+        self.store.write('a', cube_fixture((2, 3)))
+        self.store.write('b', cube_fixture((4, 5)))
+        self.store.write('a', cube_fixture((2, 2)))
+        self.store.remove('b')
+        values = self.store.read_columns('a')[2]
+        self.assertTrue(self.store.garbage() > 0.5)
+        self.store.compact()
+        self.assertEqual(self.store.garbage(), 0)
+        self.assertEqual(self.store.sizes(), (4 * 8 + 2 * 4 * 4,) * 2)
+        self.assertTrue(self.store.read_data('a').equals(
+            pyicane.data_frame(cube_fixture((2, 2)))))
+        self.assertEqual(list(values), [1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(self.store.uri_tags(), ['a'])
+        self.assertEqual(len(os.listdir(self.store.path)), 3)
+        self.store.remove('a')
+        self.store.compact()
+        self.assertEqual(self.store.sizes(), (0, 0))
+        self.assertEqual(len(self.store.mapped('values', 0)), 0)
+        self.store.write('a', cube_fixture((2, 2)))
+        self.assertEqual(list(self.store.read_data('a')[u'Valor']),
+                         [1.0, 2.0, 3.0, 4.0])
+
+    def test_compact_mapped_files(self):
+        """ Test compaction leaves files that cannot be removed yet"""
+        self.store.write('a', cube_fixture((2, 3)))
+        self.store.write('a', cube_fixture((2, 2)))
+        values = self.store.read_columns('a')[2]
+        remove = os.remove
+
+        def locked(path):
+            """Fail like Windows does with mapped files."""
+            raise OSError(13, 'Permission denied', path)
+        os.remove = locked
+        try:
+            self.store.compact()
+        finally:
+            os.remove = remove
+        self.assertEqual(sorted(os.listdir(self.store.path)),
+                         ['codes.0.bin', 'codes.1.bin', 'index.sqlite',
+                          'values.0.bin', 'values.1.bin'])
+        self.assertEqual(list(values), [1.0, 2.0, 3.0, 4.0])
+        self.assertTrue(self.store.read_data('a').equals(
+            pyicane.data_frame(cube_fixture((2, 2)))))
+        self.store.close()
+        self.store = SeriesStore(self.store.path, compact_ratio=None)
+        self.assertEqual(sorted(os.listdir(self.store.path)),
+                         ['codes.1.bin', 'index.sqlite', 'values.1.bin'])
+
+    def test_automatic_compaction(self):
+        """ Test writes compact the store when garbage grows"""
+        self.store.compact_ratio = 0.5
+        for _ in range(5):
+            self.store.write('a', cube_fixture((2, 3)))
+        self.assertTrue(self.store.garbage() <= 0.5)
+        self.assertTrue(self.store.generation > 0)
+
+
+class TestRegistry(unittest.TestCase):
+    # pylint: disable=R0904
+    """ Test Case for pyicane.registry.Registry class """
+    def setUp(self):
+        self.server = FixtureServer({
+            '/node-types': [entity_fixture(1, 'time-series', 'Serie'),
+                            entity_fixture(2, 'folder', 'Carpeta')],
+            '/periodicities': [entity_fixture(3, 'quarterly',
+                                              'Trimestral')]}).start()
+        self.default_client = pyicane.get_client()
+        pyicane.set_client(pyicane.Client(self.server.url))
+
+    def tearDown(self):
+        pyicane.get_client().close()
+        pyicane.set_client(self.default_client)
+        self.server.stop()
+
+    def test_get(self):
+        """ Test lookups are answered from memory"""
+        registry = Registry()
+        node_type = registry.get(pyicane.NodeType, 'folder')
+        self.assertTrue(isinstance(node_type, pyicane.NodeType))
+        self.assertEqual(node_type.id, 2)
+        self.assertTrue(registry.get(pyicane.NodeType, 1) is
+                        registry.get(pyicane.NodeType, 'time-series'))
+        self.assertEqual(len(registry.find_all(pyicane.NodeType)), 2)
+        self.assertRaises(KeyError, registry.get, pyicane.NodeType, 3)
+        self.assertRaises(ValueError, registry.get, pyicane.Category, 1)
+        self.assertEqual(self.server.hits['/node-types'], 1)
+        self.assertEqual(registry.stats, {'hits': 4, 'loads': 1})
+
+    def test_refresh(self):
+        """ Test explicit and time to live refreshes"""
+        registry = Registry(ttl=60)
+        registry.get(pyicane.NodeType, 1)
+        self.server.fixtures['/node-types'].append(
+            entity_fixture(3, 'data-set', 'Conjunto'))
+        self.assertRaises(KeyError, registry.get, pyicane.NodeType, 3)
+        registry.refresh()
+        self.assertEqual(registry.get(pyicane.NodeType, 3).uriTag,
+                         'data-set')
+        registry.tables[pyicane.NodeType].loaded -= 60
+        registry.get(pyicane.NodeType, 3)
+        self.assertEqual(self.server.hits['/node-types'], 3)
+        self.assertEqual(registry.stats['loads'], 3)
+
+    def test_warm_up(self):
+        """ Test every table is loaded at once"""
+        registry = Registry((pyicane.NodeType, pyicane.Periodicity,
+                             pyicane.Source))
+        failed = registry.warm_up()
+        self.assertEqual([result.item for result in failed],
+                         [pyicane.Source])
+        self.assertEqual(registry.get(pyicane.Periodicity, 3).uriTag,
+                         'quarterly')
+        self.assertEqual(registry.stats['loads'], 2)
+
+    def test_class_lookups(self):
+        """ Test reference classes look entities up in the module registry"""
+        registry = Registry()
+        set_registry(registry)
+        self.server.fixtures['/node-type/1'] = entity_fixture(
+            1, 'time-series', 'Serie')
+        try:
+            node_type = pyicane.NodeType.get('folder')
+            self.assertEqual(node_type.id, 2)
+            self.assertTrue(pyicane.NodeType.get('folder') is node_type)
+            self.assertTrue(pyicane.NodeType.get(2) is node_type)
+            self.assertTrue(node_type in pyicane.NodeType.find_all())
+            self.assertRaises(requests.exceptions.HTTPError,
+                              pyicane.NodeType.get, 'data-set')
+            pyicane.get_client().close()
+            pyicane.set_client(pyicane.Client(self.server.url,
+                                              registry=False))
+            self.assertEqual(pyicane.NodeType.get(1).uriTag, 'time-series')
+        finally:
+            set_registry(None)
+        self.assertEqual(self.server.hits, {'/node-types': 1,
+                                            '/node-type/data-set': 1,
+                                            '/node-type/1': 1})
+        self.assertEqual(registry.stats, {'hits': 4, 'loads': 1})
+
+
 class TestCategory(unittest.TestCase):
     # pylint: disable=R0904
     """ Test Case for pyicane.Category class """
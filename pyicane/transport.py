@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""Retry and rate limiting policies of pyicane.Client requests.
+
+Under bulk load ICANE's API may answer with 5xx errors or drop connections. \
+A RetryPolicy retries such transient failures with bounded exponential \
+backoff and full jitter, honoring Retry-After headers, and a TokenBucket \
+spaces requests out on the client side so that they are not throttled in \
+the first place. Both keep counters of their retries and waits::
+
+    client = pyicane.Client(retry=RetryPolicy(), rate_limiter=TokenBucket(10))
+
+"""
+from __future__ import absolute_import
+
+import logging
+import random
+import threading
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+import requests
+
+LOGGER = logging.getLogger(__name__)
+
+# Statuses worth retrying: throttling and transient server errors.
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+# Exceptions worth retrying: failures to connect or to read a response.
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError)
+
+
+def retry_after(response, now=None):
+    """Seconds to wait according to the Retry-After header of a response.
+
+    Args:
+      response (requests.Response): HTTP response.
+      now (float, optional): current time. Defaults to time.time().
+
+    Returns:
+      seconds (float): seconds to wait, or None if there is no valid header.
+
+    """
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(mktime_tz(date) - now, 0.0)
+
+
+class RetryPolicy(object):
+    """Bounded exponential backoff with full jitter.
+
+    Attributes:
+      max_retries (int): retries after the first attempt.
+      backoff (float): base delay, in seconds, doubled on every retry.
+      max_backoff (float): maximum delay, in seconds, Retry-After included.
+      jitter (boolean): if True, delays are drawn uniformly from zero to \
+                        the backoff ("full jitter").
+      statuses (frozenset): HTTP statuses to be retried.
+      exceptions (tuple): exception classes to be retried.
+      stats (dict): number of 'attempts', 'retries' and requests that \
+                    'gave_up', and seconds 'waited'.
+
+    """
+
+    def __init__(self, max_retries=5, backoff=0.5, max_backoff=30.0,
+                 jitter=True, statuses=RETRY_STATUSES,
+                 exceptions=RETRY_EXCEPTIONS, sleep=time.sleep):
+        """Configure a retry policy.
+
+        Args:
+          max_retries (int, optional): retries after the first attempt. \
+                                       Defaults to 5.
+          backoff (float, optional): base delay in seconds. Defaults to 0.5.
+          max_backoff (float, optional): maximum delay in seconds. \
+                                         Defaults to 30.
+          jitter (boolean, optional): if True, delays are randomized. \
+                                      Defaults to True.
+          statuses (iterable, optional): HTTP statuses to be retried. \
+                                         Defaults to RETRY_STATUSES.
+          exceptions (tuple, optional): exception classes to be retried. \
+                                        Defaults to RETRY_EXCEPTIONS.
+          sleep (callable, optional): function waiting for a number of \
+                                      seconds. Defaults to time.sleep.
+
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = frozenset(statuses)
+        self.exceptions = exceptions
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.stats = {'attempts': 0, 'retries': 0, 'gave_up': 0,
+                      'waited': 0.0}
+
+    def count(self, name, value=1):
+        """Add value to a counter."""
+        with self.lock:
+            self.stats[name] += value
+
+    def delay(self, attempt, response=None):
+        """Seconds to wait before retrying a failed attempt.
+
+        Args:
+          attempt (int): number of the failed attempt, starting at 0.
+          response (requests.Response, optional): failed response, whose \
+                                                  Retry-After header takes \
+                                                  precedence.
+
+        Returns:
+          seconds (float): delay, at most max_backoff.
+
+        """
+        after = retry_after(response) if response is not None else None
+        if after is not None:
+            return min(after, self.max_backoff)
+        delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def run(self, send):
+        """Send a request until it succeeds, fails permanently or runs out \
+           of retries.
+
+        Args:
+          send (callable): function without arguments returning a \
+                           requests.Response.
+
+        Returns:
+          response (requests.Response): last response; it may still have a \
+                                        retryable status if retries ran out.
+
+        Raises:
+          RequestException: a non retryable exception, or the last one if \
+                            retries ran out.
+
+        """
+        attempt = 0
+        while True:
+            self.count('attempts')
+            try:
+                response = send()
+            except self.exceptions, exception:
+                if attempt >= self.max_retries:
+                    self.count('gave_up')
+                    raise
+                reason = repr(exception)
+                delay = self.delay(attempt)
+            else:
+                if response.status_code not in self.statuses:
+                    return response
+                if attempt >= self.max_retries:
+                    self.count('gave_up')
+                    return response
+                reason = str(response.status_code)
+                delay = self.delay(attempt, response)
+                response.close()
+            LOGGER.warning('retry: ' + reason + ', attempt ' +
+                           str(attempt + 1) + ' in ' + '%.2f' % delay + 's')
+            self.count('retries')
+            self.count('waited', delay)
+            self.sleep(delay)
+            attempt += 1
+
+
+class TokenBucket(object):
+    """Client-side rate limiter: requests take a token from a bucket that \
+       is refilled at a constant rate, so bursts up to its capacity go \
+       through at once and sustained load is spaced out.
+
+    Attributes:
+      rate (float): tokens added per second.
+      capacity (float): maximum number of tokens.
+      stats (dict): number of 'acquired' tokens, requests 'throttled' and \
+                    seconds 'waited'.
+
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.time,
+                 sleep=time.sleep):
+        """Build a full bucket.
+
+        Args:
+          rate (float): requests per second.
+          capacity (float, optional): maximum burst. Defaults to rate, \
+                                      i.e. one second of requests.
+          clock (callable, optional): current time in seconds. Defaults to \
+                                      time.time.
+          sleep (callable, optional): function waiting for a number of \
+                                      seconds. Defaults to time.sleep.
+
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.stats = {'acquired': 0, 'throttled': 0, 'waited': 0.0}
+
+    def acquire(self, tokens=1):
+        """Take tokens from the bucket, waiting for them if needed.
+
+        Args:
+          tokens (float, optional): tokens to be taken. Defaults to 1.
+
+        Returns:
+          waited (float): seconds waited.
+
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens  # reserved, even if not refilled yet
+            wait = max(-self.tokens / self.rate, 0.0)
+            self.stats['acquired'] += tokens
+            if wait > 0:
+                self.stats['throttled'] += 1
+                self.stats['waited'] += wait
+        if wait > 0:
+            self.sleep(wait)
+        return wait
@@ -11,7 +11,9 @@ setup(
     license='Apache License 2.0',
     description='Python wrapper for ICANE Statistical Data and Metadata API',
     long_description=open('README.rst').read(),
-    install_requires=['pandas', 'requests'],
+    install_requires=['futures', 'pandas', 'requests'],
+    extras_require={'streaming': ['ijson<3'], 'arrow': ['pyarrow'],
+                    'fast-json': ['simplejson']},
     test_suite='pyicane.test',
     keywords=['restful', 'json', 'statistics', 'dataframe', 'wrapper'],
     classifiers=[